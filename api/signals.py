@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.trees.models import Tree
+
+from .tree_map import invalidate_tree_map
+
+
+@receiver([post_save, post_delete], sender=Tree)
+def invalidate_tree_map_on_change(sender, **kwargs):
+    invalidate_tree_map()
@@ -1,3 +1,137 @@
-from django.test import TestCase
+import gzip
+import json
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.trees.models import Tree
+from shop.models import Product, ProductCategory
+
+
+@override_settings(CATALOG_FEED_SAFETY_LAG=0)
+class CatalogFeedTest(TestCase):
+    def setUp(self):
+        self.url = reverse('api:catalog_feed')
+        self.coffee = ProductCategory.objects.create(name='Coffee')
+        self.blend = Product.objects.create(name='House Blend', category=self.coffee, price=Decimal('5000.00'))
+        self.mug = Product.objects.create(name='Mug', price=Decimal('12.00'), currency='USD', stock_quantity=0)
+        Product.objects.create(name='Retired Roast', price=Decimal('4000.00'), is_active=False)
+
+    def get(self, **params):
+        return self.client.get(self.url, params)
+
+    def test_full_sync_then_deltas(self):
+        data = self.get().json()
+        self.assertTrue(data['full'])
+        self.assertEqual([p['name'] for p in data['products']], ['House Blend', 'Mug'])
+        self.assertEqual(data['categories'], [{'id': self.coffee.pk, 'slug': 'coffee', 'name': 'Coffee'}])
+        self.assertEqual(data['products'][1]['price'], '12.00')
+        self.assertFalse(data['products'][1]['in_stock'])
+
+        since = data['next_since']
+        self.assertEqual(self.get(since=since).json()['products'], [])
+
+        self.blend.price = Decimal('5500.00')
+        self.blend.save()
+        self.mug.is_active = False
+        self.mug.save()
+        delta = self.get(since=since).json()
+        self.assertFalse(delta['full'])
+        self.assertEqual(
+            [(p['name'], p['price'], p['active']) for p in delta['products']],
+            [('House Blend', '5500.00', True), ('Mug', '12.00', False)],
+        )
+
+        # Pages of a delta continue from next_since
+        first = self.get(since=since, limit=1).json()
+        self.assertTrue(first['has_more'])
+        second = self.get(since=first['next_since'], limit=1).json()
+        self.assertEqual([p['name'] for p in first['products'] + second['products']], ['House Blend', 'Mug'])
+        self.assertTrue(self.get(since='not-a-cursor').json()['full'])
+
+    @override_settings(CATALOG_FEED_SAFETY_LAG=60)
+    def test_recent_changes_wait_for_the_safety_lag(self):
+        Product.objects.update(updated_at=timezone.now() - timedelta(minutes=10))
+        since = self.get().json()['next_since']
+        self.assertEqual(self.get(since=since).json()['products'], [])
+
+        # Saved now, but could still be behind a transaction that commits later
+        self.mug.price = Decimal('13.00')
+        self.mug.save()
+        delta = self.get(since=since).json()
+        self.assertEqual(delta['products'], [])
+        self.assertEqual(delta['next_since'], since)
+        self.assertNotIn('Mug', [p['name'] for p in self.get().json()['products']])
+
+        Product.objects.filter(pk=self.mug.pk).update(updated_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual([p['price'] for p in self.get(since=since).json()['products']], ['13.00'])
+
+    def test_gzip_and_conditional_requests(self):
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['products']), 2)
+
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        # Cursors carry no timestamp, so an unchanged catalog keeps its ETag
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + 5):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.blend.name = 'House Blend No. 2'
+        self.blend.save()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+@override_settings(TREE_MAP_MAX_CLUSTER_ZOOM=12)
+class TreeMapTest(TestCase):
+    # Around Huye, in south Rwanda
+    BBOX = '29.5,-2.8,29.9,-2.4'
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('api:tree_map')
+        for n, (lat, lng) in enumerate([('-2.6000', '29.7400'), ('-2.6001', '29.7401'), ('-2.6002', '29.7402'), ('-2.5000', '29.6000')]):
+            Tree.objects.create(
+                tree_id=f'T-{n}', species='coffee', planted_date=date(2024, 3, 1),
+                latitude=Decimal(lat), longitude=Decimal(lng),
+            )
+        # Unplaced trees sit at (0, 0) and are left off the map
+        Tree.objects.create(tree_id='T-unplaced', species='coffee', planted_date=date(2024, 3, 1))
+
+    def features(self, zoom, **headers):
+        response = self.client.get(self.url, {'bbox': self.BBOX, 'zoom': zoom}, **headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()['features']
+
+    def test_clusters_then_single_trees(self):
+        clusters = self.features(9)
+        self.assertEqual(sorted(f['properties']['count'] for f in clusters), [1, 3])
+        trees = self.features(12)
+        self.assertEqual(sorted(f['properties']['tree_id'] for f in trees), ['T-0', 'T-1', 'T-2', 'T-3'])
+        self.assertEqual(trees[0]['geometry']['type'], 'Point')
+
+    def test_tiles_are_cached_until_trees_change(self):
+        self.features(9)
+        with self.assertNumQueries(0):
+            self.features(9)
+        Tree.objects.create(tree_id='T-new', species='avocado', planted_date=date(2024, 3, 2), latitude=Decimal('-2.7'), longitude=Decimal('29.8'))
+        self.assertEqual(sum(f['properties']['count'] for f in self.features(9)), 5)
+
+    def test_conditional_requests_and_bad_input(self):
+        response = self.client.get(self.url, {'bbox': self.BBOX, 'zoom': 9})
+        self.assertEqual(response['Content-Type'], 'application/geo+json')
+        response = self.client.get(self.url, {'bbox': self.BBOX, 'zoom': 9}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+        self.assertEqual(self.client.get(self.url, {'bbox': '29.9,-2.8,29.5,-2.4', 'zoom': 9}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'bbox': '-180,-90,180,90', 'zoom': 20}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'zoom': 9}).status_code, 400)
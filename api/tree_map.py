@@ -0,0 +1,159 @@
+"""
+Planted trees for the map, clustered on the server.
+
+The world is cut into cache tiles of (lng, lat) degrees, TILE_ZOOM_OFFSET
+levels coarser than the map zoom, so a viewport spans a handful of them. Each
+tile holds GRID_SIZE x GRID_SIZE cells, a few screen pixels across at the
+map zoom; below TREE_MAP_MAX_CLUSTER_ZOOM every cell with trees becomes one
+cluster (count and mean position), computed by one grouped query per tile.
+From that zoom on a tile lists its trees individually, unless it has more
+than MAX_TILE_TREES, in which case it stays clustered. Either way a tile
+costs at most GRID_SIZE² features, however many trees are planted.
+
+Tiles are cached under a version that any tree change replaces (see
+api.signals), and for TREE_MAP_CACHE_TIMEOUT seconds at most.
+"""
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Avg, Count, FloatField, Q
+from django.db.models.functions import Cast, Floor
+
+from apps.trees.models import Tree
+
+
+TILE_ZOOM_OFFSET = 3
+
+GRID_SIZE = 64
+
+MAX_TILE_TREES = 500
+
+MAX_ZOOM = 22
+
+# A viewport spans a few tiles; more means the bounding box does not match the zoom
+MAX_TILES = 64
+
+TREE_MAP_VERSION_KEY = 'api:tree_map_version'
+
+
+class InvalidBoundingBox(ValueError):
+    pass
+
+
+def _new_version():
+    # Time based, so a version lost from the cache never matches old tiles again
+    return time.time_ns()
+
+
+def invalidate_tree_map():
+    cache.set(TREE_MAP_VERSION_KEY, _new_version(), None)
+
+
+def _tree_map_version():
+    version = cache.get(TREE_MAP_VERSION_KEY)
+    if version is None:
+        version = _new_version()
+        cache.set(TREE_MAP_VERSION_KEY, version, None)
+    return version
+
+
+def max_cluster_zoom():
+    return getattr(settings, 'TREE_MAP_MAX_CLUSTER_ZOOM', 15)
+
+
+def tile_zoom(zoom):
+    return max(zoom - TILE_ZOOM_OFFSET, 0)
+
+
+def tile_size(tz):
+    """
+    (width, height) of a tile at tile zoom tz, in degrees of longitude and latitude
+    """
+    return 360 / 2 ** tz, 180 / 2 ** tz
+
+
+def tiles_for(bbox, zoom):
+    """
+    (x, y) of the tiles covering bbox = (west, south, east, north) at zoom.
+    Tiles are numbered from longitude -180 eastwards and latitude 90 southwards.
+    Raises InvalidBoundingBox for a malformed box or one spanning over MAX_TILES tiles.
+    """
+    west, south, east, north = bbox
+    if not (-180 <= west < east <= 180 and -90 <= south < north <= 90):
+        raise InvalidBoundingBox(bbox)
+    tz = tile_zoom(zoom)
+    width, height = tile_size(tz)
+    last = 2 ** tz - 1
+    xs = range(min(int((west + 180) // width), last), min(int(math.ceil((east + 180) / width)), last + 1))
+    ys = range(min(int((90 - north) // height), last), min(int(math.ceil((90 - south) / height)), last + 1))
+    if len(xs) * len(ys) > MAX_TILES:
+        raise InvalidBoundingBox(bbox)
+    return [(x, y) for y in ys for x in xs]
+
+
+def _tile_trees(tz, x, y):
+    width, height = tile_size(tz)
+    west, north = -180 + x * width, 90 - y * height
+    return Tree.objects.filter(
+        is_active=True,
+        longitude__gte=west, longitude__lt=west + width,
+        latitude__gt=north - height, latitude__lte=north,
+    ).exclude(Q(latitude=0) & Q(longitude=0))
+
+
+def _point(lng, lat, properties):
+    return {
+        'type': 'Feature',
+        'geometry': {'type': 'Point', 'coordinates': [round(float(lng), 5), round(float(lat), 5)]},
+        'properties': properties,
+    }
+
+
+def _clusters(trees, tz):
+    width, height = tile_size(tz)
+    cells = trees.annotate(
+        cell_x=Floor((Cast('longitude', FloatField()) + 180) / (width / GRID_SIZE)),
+        cell_y=Floor((90 - Cast('latitude', FloatField())) / (height / GRID_SIZE)),
+    ).values('cell_x', 'cell_y').annotate(
+        count=Count('id'), lat=Avg('latitude'), lng=Avg('longitude'),
+    ).order_by('cell_y', 'cell_x')
+    return [_point(cell['lng'], cell['lat'], {'count': cell['count']}) for cell in cells]
+
+
+def _tile_features(zoom, x, y):
+    tz = tile_zoom(zoom)
+    trees = _tile_trees(tz, x, y)
+    if zoom >= max_cluster_zoom():
+        rows = list(
+            trees.values('pk', 'tree_id', 'species', 'planted_date', 'latitude', 'longitude')
+            .order_by('pk')[:MAX_TILE_TREES + 1]
+        )
+        if len(rows) <= MAX_TILE_TREES:
+            return [
+                _point(row['longitude'], row['latitude'], {
+                    'id': row['pk'], 'tree_id': row['tree_id'], 'species': row['species'],
+                    'planted': row['planted_date'].isoformat(),
+                })
+                for row in rows
+            ]
+    return _clusters(trees, tz)
+
+
+def tree_map_features(bbox, zoom):
+    """
+    GeoJSON features of the tiles covering bbox at zoom, read from the tile
+    cache where possible. Raises InvalidBoundingBox.
+    """
+    zoom = min(max(zoom, 0), MAX_ZOOM)
+    tiles = tiles_for(bbox, zoom)
+    mode = 'trees' if zoom >= max_cluster_zoom() else 'clusters'
+    version = _tree_map_version()
+    keys = {f'api:tree_map:{version}:{mode}:{tile_zoom(zoom)}:{x}:{y}': (x, y) for x, y in tiles}
+    cached = cache.get_many(keys)
+    missing = {key: _tile_features(zoom, *tile) for key, tile in keys.items() if key not in cached}
+    if missing:
+        cache.set_many(missing, getattr(settings, 'TREE_MAP_CACHE_TIMEOUT', 3600))
+        cached.update(missing)
+    return [feature for key in keys for feature in cached[key]]
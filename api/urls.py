@@ -1,7 +1,10 @@
 from django.urls import path
 
+from .views import catalog_feed, tree_map
+
 app_name = 'api'
 
 urlpatterns = [
-    # URLs will be added here
+    path('catalog/', catalog_feed, name='catalog_feed'),
+    path('trees/map/', tree_map, name='tree_map'),
 ]
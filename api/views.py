@@ -1,3 +1,148 @@
-from django.shortcuts import render
+"""
+Read-only JSON API for partner cafés and the mobile app.
 
-# Create your views here.
+The catalog feed returns active categories and products ordered by
+updated_at. Clients store next_since and send it back as ?since= to receive
+only products changed since then, deactivated ones included with
+"active": false so they can be dropped. Without since (or with an expired
+one) the response is a full sync of active products. Responses are gzipped
+and carry an ETag, so an unchanged catalog costs one 304.
+
+updated_at is stamped when a product is saved, not when its transaction
+commits, so a slow transaction can commit a row older than ones already
+served. The feed therefore only serves products last changed at least
+CATALOG_FEED_SAFETY_LAG seconds ago, and next_since never moves past that
+point: a change appears in deltas once it is that old, and is never skipped
+as long as no transaction saving products runs longer than the lag.
+
+Deltas report changed rows only, so products must be retired by clearing
+is_active rather than deleted: a deleted product never reaches clients that
+already hold it.
+
+The tree map returns the planted trees inside ?bbox=west,south,east,north
+at ?zoom= as GeoJSON, clustered with counts until the map is zoomed in far
+enough to show single trees (see api.tree_map).
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.gzip import gzip_page
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+
+from core.pagination import InvalidCursor, KeysetPaginator
+from shop.models import Product, ProductCategory
+
+from .tree_map import InvalidBoundingBox, tree_map_features
+
+
+FEED_PAGE_SIZE = 500
+FEED_MAX_PAGE_SIZE = 1000
+
+# Oldest change first; the primary key breaks ties
+FEED_ORDERING = ['updated_at']
+
+PRODUCT_FEED_FIELDS = (
+    'id', 'slug', 'name', 'description', 'category_id', 'price', 'compare_price',
+    'currency', 'stock_state', 'is_active', 'image', 'updated_at',
+)
+
+
+def _product_row(product):
+    return {
+        'id': product.id,
+        'slug': product.slug,
+        'name': product.name,
+        'description': product.description,
+        'category': product.category_id,
+        'price': str(product.price),
+        'compare_price': str(product.compare_price) if product.compare_price is not None else None,
+        'currency': product.currency,
+        'in_stock': product.is_in_stock,
+        'active': product.is_active,
+        'image': product.image.url if product.image else None,
+        'updated_at': product.updated_at.isoformat(),
+    }
+
+
+def _etag_matches(request, etag):
+    candidates = request.headers.get('If-None-Match', '')
+    # gzip_page weakens the ETag it sends, so compare weakly
+    return any(value.strip().removeprefix('W/') == etag for value in candidates.split(','))
+
+
+def _conditional_json(request, body, content_type='application/json'):
+    """
+    Response for body tagged with its hash, or 304 when the client already has it
+    """
+    etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+    if _etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type=content_type)
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
+
+
+@require_GET
+@gzip_page
+def catalog_feed(request):
+    try:
+        limit = min(int(request.GET.get('limit', FEED_PAGE_SIZE)), FEED_MAX_PAGE_SIZE)
+    except ValueError:
+        limit = FEED_PAGE_SIZE
+    limit = max(limit, 1)
+
+    # Rows newer than the lag may still have older ones committing behind them
+    settled = Product.objects.filter(
+        updated_at__lte=timezone.now() - timedelta(seconds=getattr(settings, 'CATALOG_FEED_SAFETY_LAG', 60)),
+    )
+    products = settled.only(*PRODUCT_FEED_FIELDS)
+    since = request.GET.get('since')
+    full = True
+    if since:
+        try:
+            KeysetPaginator(products, limit, FEED_ORDERING).decode_cursor(since)
+            full = False
+        except InvalidCursor:
+            since = None
+    if full:
+        # A full sync only needs what is for sale
+        products = products.filter(is_active=True)
+    paginator = KeysetPaginator(products, limit, FEED_ORDERING)
+    page = paginator.page(since)
+
+    last = page.object_list[-1] if page.object_list else None
+    if full and not page.has_next():
+        # Inactive products changed before a full sync are not news to its client
+        last = settled.only('updated_at').order_by('-updated_at', '-pk').first()
+    next_since = paginator.encode_cursor(last, 'next') if last else since
+    payload = {
+        'full': full,
+        'has_more': page.has_next(),
+        'next_since': next_since,
+        'categories': list(
+            ProductCategory.objects.filter(is_active=True).values('id', 'slug', 'name').order_by('ordering', 'name')
+        ),
+        'products': [_product_row(product) for product in page],
+    }
+    return _conditional_json(request, json.dumps(payload, separators=(',', ':')))
+
+
+@require_GET
+@gzip_page
+def tree_map(request):
+    try:
+        bbox = tuple(float(value) for value in request.GET['bbox'].split(','))
+        zoom = int(request.GET['zoom'])
+        features = tree_map_features(bbox, zoom)
+    except (KeyError, ValueError, InvalidBoundingBox):
+        return JsonResponse({'error': 'bbox=west,south,east,north and zoom are required'}, status=400)
+    payload = {'type': 'FeatureCollection', 'features': features}
+    return _conditional_json(request, json.dumps(payload, separators=(',', ':')), 'application/geo+json')
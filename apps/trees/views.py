@@ -29,6 +29,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.utils.translation import gettext_lazy as _
 from django.views.generic import ListView, DetailView
+from core.pagination import KeysetPaginationMixin
 from apps.trees.models import Tree
 from .forms import TreeTrackingForm, PlantTreeForm, TreePlantingInitiativeForm
 
@@ -79,11 +80,12 @@ def plant_tree(request):
         form = TreePlantingInitiativeForm()
     return render(request, 'trees/plant.html', {'form': form})
 
-class TreeListView(ListView):
+class TreeListView(KeysetPaginationMixin, ListView):
     model = Tree
     template_name = 'trees/list.html'
     context_object_name = 'trees'
     paginate_by = 10
+    keyset_ordering = ['-planted_date']
     
     def get_queryset(self):
         return Tree.objects.filter(is_active=True).order_by('-planted_date')
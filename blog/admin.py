@@ -3,8 +3,7 @@ from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.db.models import Count
 from .models import BlogPost, BlogCategory
-import csv
-from django.http import HttpResponse
+from core.admin_export import StreamingExportMixin
 
 @admin.register(BlogCategory)
 class BlogCategoryAdmin(admin.ModelAdmin):
@@ -21,7 +20,7 @@ class BlogCategoryAdmin(admin.ModelAdmin):
     posts_count.short_description = "Posts"
 
 @admin.register(BlogPost)
-class BlogPostAdmin(admin.ModelAdmin):
+class BlogPostAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = (
         'title', 'author_name', 'category', 'publication_status', 
         'pinned_status', 'media_preview', 'views_count', 'created_at',
@@ -146,7 +145,7 @@ class BlogPostAdmin(admin.ModelAdmin):
         return "Will be auto-generated"
     slug_preview.short_description = "URL Preview"
     
-    actions = ['publish_posts', 'unpublish_posts', 'pin_posts', 'unpin_posts', 'export_as_csv']
+    actions = ['publish_posts', 'unpublish_posts', 'pin_posts', 'unpin_posts', 'export_as_csv', 'export_as_csv_gzip', 'export_as_jsonl']
     
     def publish_posts(self, request, queryset):
         updated = queryset.update(is_published=True)
@@ -168,34 +167,30 @@ class BlogPostAdmin(admin.ModelAdmin):
         self.message_user(request, f'{updated} posts unpinned.')
     unpin_posts.short_description = "Unpin selected posts"
     
-    def export_as_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=blog_posts_{queryset.count()}_items.csv'
-        writer = csv.writer(response)
-        
-        headers = [
-            'Title', 'Author', 'Category', 'Description', 'Published', 'Pinned',
-            'Created Date', 'Updated Date', 'Word Count', 'Has Image', 'Has Video'
+    export_name = 'blog_posts'
+    export_headers = [
+        'Title', 'Author', 'Category', 'Description', 'Published', 'Pinned',
+        'Created Date', 'Updated Date', 'Word Count', 'Has Image', 'Has Video'
+    ]
+    
+    def get_export_queryset(self, queryset):
+        return queryset.select_related('author', 'category')
+    
+    def export_row(self, obj):
+        word_count = len(obj.content.split()) if obj.content else 0
+        return [
+            obj.title,
+            obj.author.get_full_name() if obj.author else '',
+            obj.category.name if obj.category else '',
+            obj.description,
+            'Yes' if obj.is_published else 'No',
+            'Yes' if obj.pinned else 'No',
+            obj.created_at.strftime('%Y-%m-%d %H:%M'),
+            obj.updated_at.strftime('%Y-%m-%d %H:%M'),
+            word_count,
+            'Yes' if obj.featured_image else 'No',
+            'Yes' if obj.video else 'No'
         ]
-        writer.writerow(headers)
-        
-        for obj in queryset:
-            word_count = len(obj.content.split()) if obj.content else 0
-            writer.writerow([
-                obj.title,
-                obj.author.get_full_name() if obj.author else '',
-                obj.category.name if obj.category else '',
-                obj.description,
-                'Yes' if obj.is_published else 'No',
-                'Yes' if obj.pinned else 'No',
-                obj.created_at.strftime('%Y-%m-%d %H:%M'),
-                obj.updated_at.strftime('%Y-%m-%d %H:%M'),
-                word_count,
-                'Yes' if obj.featured_image else 'No',
-                'Yes' if obj.video else 'No'
-            ])
-        return response
-    export_as_csv.short_description = "Export selected posts as CSV"
     
     class Media:
         css = {
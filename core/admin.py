@@ -4,8 +4,7 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.db.models import Sum, Count
 from .models import Contact, Donation, TeamMember
-import csv
-from django.http import HttpResponse
+from .admin_export import StreamingExportMixin
 
 @admin.register(TeamMember)
 class TeamMemberAdmin(admin.ModelAdmin):
@@ -56,7 +55,7 @@ class TeamMemberAdmin(admin.ModelAdmin):
     social_links.short_description = "Social Media"
 
 @admin.register(Contact)
-class ContactAdmin(admin.ModelAdmin):
+class ContactAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = ('name', 'email', 'subject', 'created_at', 'status_badge')
     list_filter = ('created_at',)
     search_fields = ('name', 'email', 'subject', 'message')
@@ -93,22 +92,12 @@ class ContactAdmin(admin.ModelAdmin):
         return "No message"
     message_preview.short_description = "Message Preview"
     
-    actions = ['export_as_csv']
-    
-    def export_as_csv(self, request, queryset):
-        meta = self.model._meta
-        field_names = [field.name for field in meta.fields]
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=contacts_{queryset.count()}_items.csv'
-        writer = csv.writer(response)
-        writer.writerow(field_names)
-        for obj in queryset:
-            writer.writerow([getattr(obj, field) for field in field_names])
-        return response
-    export_as_csv.short_description = "Export selected contacts as CSV"
+    actions = ['export_as_csv', 'export_as_csv_gzip', 'export_as_jsonl']
+    
+    export_name = 'contacts'
 
 @admin.register(Donation)
-class DonationAdmin(admin.ModelAdmin):
+class DonationAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = ('donor_name', 'donor_email', 'amount_display', 'donation_type', 'payment_status_badge', 'purpose', 'created_at')
     list_filter = (
         'donation_type', 
@@ -197,19 +186,9 @@ class DonationAdmin(admin.ModelAdmin):
         )
     total_stats.short_description = "Platform Statistics"
     
-    actions = ['export_as_csv', 'mark_as_completed', 'send_receipts']
-    
-    def export_as_csv(self, request, queryset):
-        meta = self.model._meta
-        field_names = [field.name for field in meta.fields]
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=donations_{queryset.count()}_items.csv'
-        writer = csv.writer(response)
-        writer.writerow(field_names)
-        for obj in queryset:
-            writer.writerow([getattr(obj, field) for field in field_names])
-        return response
-    export_as_csv.short_description = "Export selected donations as CSV"
+    actions = ['export_as_csv', 'export_as_csv_gzip', 'export_as_jsonl', 'mark_as_completed', 'send_receipts']
+    
+    export_name = 'donations'
     
     def mark_as_completed(self, request, queryset):
         updated = queryset.update(payment_status='completed')
@@ -0,0 +1,184 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are selected with a WHERE clause on the sort key instead of OFFSET, and
+no COUNT query is run, so page 100 costs the same as page 1. Cursors are
+opaque signed tokens carrying the sort key of the first or last row shown.
+They carry no timestamp, so the same row always gives the same cursor and
+responses embedding one can be compared by hash.
+"""
+import datetime
+from collections.abc import Sequence
+from decimal import Decimal
+
+from django.core import signing
+from django.db.models import Q
+
+
+CURSOR_SALT = 'core.pagination.cursor'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return ['dt', value.isoformat()]
+    if isinstance(value, datetime.date):
+        return ['d', value.isoformat()]
+    if isinstance(value, Decimal):
+        return ['dec', str(value)]
+    return ['v', value]
+
+
+def _decode_value(encoded):
+    kind, value = encoded
+    if kind == 'dt':
+        return datetime.datetime.fromisoformat(value)
+    if kind == 'd':
+        return datetime.date.fromisoformat(value)
+    if kind == 'dec':
+        return Decimal(value)
+    return value
+
+
+class KeysetPage(Sequence):
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return f'<KeysetPage of {len(self.object_list)} objects>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[-1], 'next')
+
+    @property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.encode_cursor(self.object_list[0], 'previous')
+
+
+class KeysetPaginator:
+    """
+    Paginate a queryset by its sort key.
+
+    ordering is a list of field or annotation names such as ['-created_at'];
+    the primary key is appended as a tiebreaker in the direction of the first
+    field. Sort fields must not be NULL (use a Coalesce annotation otherwise).
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        ordering = list(ordering or ['-pk'])
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering.append('-pk' if ordering[0].startswith('-') else 'pk')
+        self.ordering = ordering
+        self.keys = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+
+    def encode_cursor(self, obj, direction):
+        values = [_encode_value(getattr(obj, name)) for name, descending in self.keys]
+        return signing.Signer(salt=CURSOR_SALT).sign_object(
+            {'o': self.ordering, 'd': direction, 'v': values},
+            compress=True,
+        )
+
+    def decode_cursor(self, cursor):
+        try:
+            payload = signing.Signer(salt=CURSOR_SALT).unsign_object(cursor)
+            if payload['o'] != self.ordering or payload['d'] not in ('next', 'previous'):
+                raise InvalidCursor(cursor)
+            values = [_decode_value(value) for value in payload['v']]
+        except (signing.BadSignature, KeyError, TypeError, ValueError) as exc:
+            raise InvalidCursor(cursor) from exc
+        if len(values) != len(self.keys):
+            raise InvalidCursor(cursor)
+        return payload['d'], values
+
+    def _seek_filter(self, values, backwards):
+        """
+        Rows strictly after (or before) values in sort order:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        for index, (name, descending) in enumerate(self.keys):
+            after = descending == backwards
+            clause = Q(**{f'{name}__{"gt" if after else "lt"}': values[index]})
+            for prev_index in range(index):
+                clause &= Q(**{self.keys[prev_index][0]: values[prev_index]})
+            condition |= clause
+        return condition
+
+    def page(self, cursor=None):
+        """
+        Return the page following (or preceding) cursor; an empty or invalid
+        cursor returns the first page.
+        """
+        direction, values = 'next', None
+        if cursor:
+            try:
+                direction, values = self.decode_cursor(cursor)
+            except InvalidCursor:
+                direction, values = 'next', None
+
+        backwards = direction == 'previous'
+        if backwards:
+            ordering = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        else:
+            ordering = self.ordering
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, backwards))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if backwards:
+            rows.reverse()
+            return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+        return KeysetPage(rows, self, has_next=has_more, has_previous=values is not None)
+
+
+class KeysetPaginationMixin:
+    """
+    Use keyset pagination in a ListView. Set keyset_ordering to the list's
+    sort key; pages are selected with the ?cursor= query parameter and the
+    template gets page_obj.next_cursor / page_obj.previous_cursor.
+    """
+    keyset_ordering = None
+    cursor_kwarg = 'cursor'
+
+    def get_keyset_ordering(self):
+        ordering = self.keyset_ordering or self.get_ordering()
+        if isinstance(ordering, str):
+            ordering = [ordering]
+        return ordering
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = KeysetPaginator(queryset, page_size, self.get_keyset_ordering())
+        page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
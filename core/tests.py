@@ -1,3 +1,104 @@
+import csv
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from apps.trees.models import Tree
+from core.models import Donation
+from dashboard import impact
+from dashboard.models import ImpactCounter, ImpactStat
+from shop.models import Order, OrderItem, Payment
+from shop.payments import apply_gateway_result
+
+
+class ImpactMetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Tree.objects.create(tree_id='T-1', species='coffee', planted_date=date(2024, 3, 1))
+
+    def test_pages_share_cached_snapshot(self):
+        with mock.patch.object(impact, 'compute_impact_metrics', wraps=impact.compute_impact_metrics) as compute:
+            home = self.client.get(reverse('core:home'))
+            self.client.get(reverse('core:home'))
+            about = self.client.get(reverse('core:about'))
+        self.assertEqual(compute.call_count, 1)
+        self.assertEqual(home.context['trees_planted'], 1)
+        self.assertEqual(about.context['trees_planted'], 1)
+        self.assertEqual(home.context['coffee_cups_sold'], 0)
+
+    def test_source_changes_invalidate_snapshot(self):
+        self.assertEqual(impact.get_impact_metrics()['trees_planted'], 1)
+        Tree.objects.create(tree_id='T-2', species='avocado', planted_date=date(2024, 3, 2))
+        self.assertEqual(impact.get_impact_metrics()['trees_planted'], 2)
+
+        stat = ImpactStat.objects.create(stat_name='Trees Planted', stat_value=5000)
+        self.assertEqual(impact.get_impact_metrics()['trees_planted'], 5000)
+        stat.delete()
+        self.assertEqual(impact.get_impact_metrics()['trees_planted'], 2)
+
+    def test_only_payment_changes_of_orders_invalidate_snapshot(self):
+        payment = self.order(2)
+        order = payment.order
+        impact.get_impact_metrics()
+        with mock.patch.object(impact, 'compute_impact_metrics', wraps=impact.compute_impact_metrics) as compute:
+            order.city = 'Huye'
+            order.save()
+            order.status = 'failed'
+            order.save(update_fields=['status'])
+            impact.get_impact_metrics()
+            compute.assert_not_called()
+
+            order.status = 'paid'
+            order.save(update_fields=['status'])
+            self.assertEqual(impact.get_impact_metrics()['coffee_cups_sold'], 2)
+            order.delete()
+            self.assertEqual(impact.get_impact_metrics()['coffee_cups_sold'], 0)
+        self.assertEqual(compute.call_count, 2)
+
+    def order(self, cups):
+        order = Order.objects.create(
+            full_name='Ama Uwase', email='ama@example.com', phone='0788000000', country='Rwanda',
+            city='Kigali', zip_code='00000', total_amount=Decimal('5000.00') * cups,
+        )
+        OrderItem.objects.create(order=order, product_name='House Blend', unit_price=Decimal('5000.00'), quantity=cups)
+        return Payment.objects.create(order=order, method='card', amount=order.total_amount)
+
+    def test_cups_sold_counter(self):
+        first = self.order(2)
+        self.order(5)
+        apply_gateway_result(first.reference, 'succeeded')
+        # Without a counter the total is summed from paid orders
+        self.assertEqual(impact.get_impact_metrics()['coffee_cups_sold'], 2)
+
+        call_command('rebuild_impact_counters', stdout=StringIO())
+        self.assertEqual(ImpactCounter.objects.get(name='coffee_cups_sold').value, 2)
+
+        second = self.order(3)
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_gateway_result(second.reference, 'succeeded')
+        self.assertEqual(ImpactCounter.objects.get(name='coffee_cups_sold').value, 5)
+        with mock.patch.object(impact, '_paid_cups') as paid_cups:
+            self.assertEqual(impact.get_impact_metrics()['coffee_cups_sold'], 5)
+        paid_cups.assert_not_called()
+
 
-# Create your tests here.
+class DonationExportTest(TestCase):
+    def test_foreign_keys_export_as_text(self):
+        self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+        tree = Tree.objects.create(tree_id='T-1', species='coffee', planted_date=date(2024, 3, 1))
+        Donation.objects.create(amount=5000, donation_type='one_time', tree=tree)
+        Donation.objects.create(amount=100, currency='USD', donation_type='one_time')
+        response = self.client.post(reverse('admin:core_donation_changelist'), {
+            'action': 'export_as_csv',
+            '_selected_action': Donation.objects.values_list('pk', flat=True),
+        })
+        rows = list(csv.DictReader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(sorted(row['tree'] for row in rows), ['', str(tree)])
+        self.assertEqual(sorted(row['farmer'] for row in rows), ['', ''])
@@ -67,51 +67,11 @@ class HomeView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        from dashboard.models import ImpactStat
-        from farmers.models import Farmer
-        from apps.trees.models import Tree
-        
-        # Try to get stats from ImpactStat, fallback to model counts
-        impact_stats = ImpactStat.objects.filter(is_active=True)
-        stats_dict = {stat.stat_name.lower().replace(' ', '_'): stat for stat in impact_stats}
-        
-        # Trees Planted
-        if 'trees_planted' in stats_dict:
-            context['trees_planted'] = stats_dict['trees_planted'].stat_value
-        else:
-            context['trees_planted'] = Tree.objects.filter(is_active=True).count()
-        
-        # Youth Trained
-        if 'youth_trained' in stats_dict:
-            context['youth_trained'] = stats_dict['youth_trained'].stat_value
-        else:
-            try:
-                from volunteers.models import BaristaTrainingApplication
-                context['youth_trained'] = BaristaTrainingApplication.objects.filter(selected_for_training=True).count()
-            except Exception:
-                context['youth_trained'] = 0
-        
-        # Coffee Cups Sold
-        if 'coffee_cups_sold' in stats_dict:
-            context['coffee_cups_sold'] = stats_dict['coffee_cups_sold'].stat_value
-        else:
-            try:
-                from shop.models import Order, CartItem
-                paid_orders = Order.objects.filter(status__in=["paid", "confirmed"])
-                cups_sold = 0
-                for order in paid_orders:
-                    if order.cart:
-                        cups_sold += sum(item.quantity for item in order.cart.items.all())
-                context['coffee_cups_sold'] = cups_sold
-            except Exception:
-                context['coffee_cups_sold'] = 0
-        
-        # CO2 Saved
-        if 'co2_saved' in stats_dict:
-            context['co2_saved'] = stats_dict['co2_saved'].stat_value
-        else:
-            context['co2_saved'] = 0
-            
+        from dashboard.impact import get_impact_metrics
+
+        metrics = get_impact_metrics()
+        for name in ('trees_planted', 'youth_trained', 'coffee_cups_sold', 'co2_saved'):
+            context[name] = metrics[name]
         return context
 
 
@@ -121,43 +81,12 @@ class AboutView(TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        from dashboard.models import ImpactStat
-        from farmers.models import Farmer
-        from apps.trees.models import Tree
+        from dashboard.impact import get_impact_metrics
         from .models import TeamMember
-        
-        # Try to get stats from ImpactStat, fallback to model counts
-        impact_stats = ImpactStat.objects.filter(is_active=True)
-        stats_dict = {stat.stat_name.lower().replace(' ', '_'): stat for stat in impact_stats}
-        
-        # Trees Planted
-        if 'trees_planted' in stats_dict:
-            context['trees_planted'] = stats_dict['trees_planted'].stat_value
-        else:
-            context['trees_planted'] = Tree.objects.filter(is_active=True).count()
-        
-        # Farmers Supported
-        if 'farmers_supported' in stats_dict:
-            context['farmers_supported'] = stats_dict['farmers_supported'].stat_value
-        else:
-            context['farmers_supported'] = Farmer.objects.count()
-        
-        # Youth Trained
-        if 'youth_trained' in stats_dict:
-            context['youth_trained'] = stats_dict['youth_trained'].stat_value
-        else:
-            try:
-                from volunteers.models import BaristaTrainingApplication
-                context['youth_trained'] = BaristaTrainingApplication.objects.filter(selected_for_training=True).count()
-            except Exception:
-                context['youth_trained'] = 0
-        
-        # Communities
-        if 'communities' in stats_dict:
-            context['communities'] = stats_dict['communities'].stat_value
-        else:
-            unique_sectors = Farmer.objects.values_list('sector', flat=True).distinct()
-            context['communities'] = unique_sectors.count()
+
+        metrics = get_impact_metrics()
+        for name in ('trees_planted', 'farmers_supported', 'youth_trained', 'communities'):
+            context[name] = metrics[name]
         context.update({
             'mission': "To create a sustainable coffee ecosystem that empowers farmers, trains youth, and restores our environment through innovative tree planting initiatives.",
             'vision': "A world where every cup of coffee contributes to environmental restoration and economic empowerment of local communities.",
@@ -1,11 +1,20 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import ImpactStat, Testimonial
+from .models import ImpactCounter, ImpactStat, Testimonial
 
 @admin.register(ImpactStat)
 class ImpactStatAdmin(admin.ModelAdmin):
 	pass
 
+@admin.register(ImpactCounter)
+class ImpactCounterAdmin(admin.ModelAdmin):
+	# Maintained from orders; rebuild with the rebuild_impact_counters command
+	list_display = ('name', 'value', 'updated_at')
+	readonly_fields = ('name', 'value', 'updated_at')
+
+	def has_add_permission(self, request):
+		return False
+
 @admin.register(Testimonial)
 class TestimonialAdmin(admin.ModelAdmin):
 	list_display = ('author', 'role', 'is_featured', 'created_at', 'media_preview')
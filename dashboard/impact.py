@@ -0,0 +1,221 @@
+"""
+Impact figures shown on the home, about and impact dashboard pages.
+
+get_impact_metrics() returns one snapshot of every figure, computed once and
+cached for IMPACT_METRICS_CACHE_TIMEOUT seconds. An active ImpactStat whose
+name matches a figure ("Trees Planted" -> trees_planted) overrides the live
+count. Saving or deleting any of the source models drops the snapshot (see
+dashboard.signals); the timeout covers changes made with queryset.update().
+
+get_public_impact() is the anonymous view of the same data: the figures that
+are not sensitive, this year's monthly trees and the district ranking,
+serialized once per snapshot with its ETag and build time so the public
+endpoint answers revalidations without touching the database.
+
+Coffee cups sold is read from the coffee_cups_sold ImpactCounter, which
+record_cups_sold() increments as orders are paid. Until the counter has been
+built with the rebuild_impact_counters command it is summed from paid orders.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import ExtractMonth, Greatest
+from django.utils import timezone
+
+
+IMPACT_METRICS_CACHE_KEY = 'dashboard:impact_metrics'
+
+PUBLIC_IMPACT_CACHE_KEY = 'dashboard:public_impact'
+
+MONTH_LABELS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Figures safe to publish; donation totals stay on the staff dashboard
+PUBLIC_METRICS = (
+    'trees_planted', 'youth_trained', 'coffee_cups_sold', 'farmers_supported',
+    'communities', 'co2_saved', 'total_success_stories',
+)
+
+COFFEE_CUPS_SOLD_COUNTER = 'coffee_cups_sold'
+
+
+def impact_stat_key(stat_name):
+    return stat_name.lower().replace(' ', '_')
+
+
+def _paid_cups():
+    from shop.models import Order
+
+    # Order lines rather than carts: a cart is deleted once its order is placed
+    return Order.objects.filter(status='paid').aggregate(cups=Sum('items__quantity'))['cups'] or 0
+
+
+def _coffee_cups_sold():
+    from .models import ImpactCounter
+
+    counter = ImpactCounter.objects.filter(name=COFFEE_CUPS_SOLD_COUNTER).values_list('value', flat=True).first()
+    return _paid_cups() if counter is None else counter
+
+
+def record_cups_sold(order_ids, delta=1):
+    """
+    Add (delta=1) the cups of newly paid orders to the counter, if it has been
+    built, or remove (delta=-1) those of orders no longer paid. Call inside
+    the transaction that changes their status.
+    """
+    from shop.models import OrderItem
+    from .models import ImpactCounter
+
+    cups = OrderItem.objects.filter(order_id__in=order_ids).aggregate(cups=Sum('quantity'))['cups']
+    if cups:
+        ImpactCounter.objects.filter(name=COFFEE_CUPS_SOLD_COUNTER).update(value=Greatest(F('value') + delta * cups, 0))
+        transaction.on_commit(invalidate_impact_metrics)
+
+
+def rebuild_cups_sold():
+    """
+    Recount cups sold from every paid order, e.g. after order statuses are
+    changed by hand. Returns the new total.
+    """
+    from .models import ImpactCounter
+
+    with transaction.atomic():
+        ImpactCounter.objects.get_or_create(name=COFFEE_CUPS_SOLD_COUNTER)
+        counter = ImpactCounter.objects.select_for_update().get(name=COFFEE_CUPS_SOLD_COUNTER)
+        counter.value = _paid_cups()
+        counter.save(update_fields=['value', 'updated_at'])
+    invalidate_impact_metrics()
+    return counter.value
+
+
+def _live_metrics():
+    """
+    Live fallback for each figure, evaluated only when no ImpactStat overrides it
+    """
+    from apps.trees.models import Tree
+    from core.models import Donation
+    from farmers.models import Farmer, FarmerStory
+    from volunteers.models import BaristaTrainingApplication
+
+    return {
+        'trees_planted': lambda: Tree.objects.filter(is_active=True).count(),
+        'youth_trained': lambda: BaristaTrainingApplication.objects.filter(selected_for_training=True).count(),
+        'coffee_cups_sold': _coffee_cups_sold,
+        'farmers_supported': lambda: Farmer.objects.count(),
+        'communities': lambda: Farmer.objects.values('sector').distinct().count(),
+        'co2_saved': lambda: 0,
+        'total_donations': lambda: Donation.objects.filter(payment_status='paid').aggregate(total=Sum('amount'))['total'] or 0,
+        'total_success_stories': lambda: FarmerStory.objects.filter(is_published=True).count(),
+    }
+
+
+def compute_impact_metrics():
+    from .models import ImpactStat
+
+    overrides = {
+        impact_stat_key(name): value
+        for name, value in ImpactStat.objects.filter(is_active=True).values_list('stat_name', 'stat_value')
+    }
+    return {
+        name: overrides[name] if name in overrides else live()
+        for name, live in _live_metrics().items()
+    }
+
+
+def get_impact_metrics():
+    """
+    Cached snapshot of every impact figure, as a dict keyed by figure name
+    """
+    metrics = cache.get(IMPACT_METRICS_CACHE_KEY)
+    if metrics is None:
+        metrics = compute_impact_metrics()
+        cache.set(IMPACT_METRICS_CACHE_KEY, metrics, getattr(settings, 'IMPACT_METRICS_CACHE_TIMEOUT', 300))
+    return metrics
+
+
+def _by_month(rows, total):
+    by_month = {row['month']: row[total] or 0 for row in rows}
+    return [by_month.get(month, 0) for month in range(1, 13)]
+
+
+def monthly_series(year):
+    """
+    (trees planted, paid donations in the base currency, currencies without a
+    rate) for each month of year, from the daily rollups. Donations in a
+    currency with no exchange rate are left out of the monthly figures rather
+    than added to amounts in other currencies.
+    """
+    from shop.currency import to_base
+
+    from .models import DonationDaily, TreePlantingDaily
+
+    trees = TreePlantingDaily.objects.filter(date__year=year).annotate(
+        month=ExtractMonth('date'),
+    ).values('month').annotate(count=Sum('trees')).order_by('month')
+    donations = DonationDaily.objects.filter(date__year=year).annotate(
+        month=ExtractMonth('date'),
+    ).values('month', 'currency').annotate(total=Sum('amount')).order_by('month', 'currency')
+    by_month, unconverted = {}, set()
+    for row in donations:
+        amount = to_base(row['total'] or 0, row['currency'])
+        if amount is None:
+            unconverted.add(row['currency'])
+            continue
+        by_month[row['month']] = by_month.get(row['month'], 0) + amount
+    donations_by_month = [float(by_month.get(month, 0)) for month in range(1, 13)]
+    return _by_month(trees, 'count'), donations_by_month, sorted(unconverted)
+
+
+def district_breakdown(limit=10):
+    """
+    (district, trees planted) of the districts with the most trees, all years
+    """
+    from .models import TreePlantingDaily
+
+    rows = TreePlantingDaily.objects.exclude(district='').values('district').annotate(
+        count=Sum('trees'),
+    ).order_by('-count', 'district')[:limit]
+    return [(row['district'], row['count']) for row in rows]
+
+
+def _build_public_impact():
+    metrics = get_impact_metrics()
+    year = timezone.localdate().year
+    trees_month_data, _, _ = monthly_series(year)
+    districts = district_breakdown()
+    payload = {
+        'stats': {name: metrics[name] for name in PUBLIC_METRICS},
+        'charts': {
+            'year': year,
+            'month_labels': MONTH_LABELS,
+            'trees_month_data': trees_month_data,
+            'district_labels': [district for district, _ in districts],
+            'district_data': [count for _, count in districts],
+        },
+    }
+    body = json.dumps(payload, cls=DjangoJSONEncoder, separators=(',', ':'))
+    return {
+        'body': body,
+        'etag': hashlib.md5(body.encode()).hexdigest(),
+        # Whole seconds, as in the Last-Modified header
+        'last_modified': timezone.now().replace(microsecond=0),
+    }
+
+
+def get_public_impact():
+    """
+    Cached public snapshot: {'body': JSON text, 'etag': hash of body, 'last_modified': build time}
+    """
+    snapshot = cache.get(PUBLIC_IMPACT_CACHE_KEY)
+    if snapshot is None:
+        snapshot = _build_public_impact()
+        cache.set(PUBLIC_IMPACT_CACHE_KEY, snapshot, getattr(settings, 'IMPACT_METRICS_CACHE_TIMEOUT', 300))
+    return snapshot
+
+
+def invalidate_impact_metrics():
+    cache.delete_many([IMPACT_METRICS_CACHE_KEY, PUBLIC_IMPACT_CACHE_KEY])
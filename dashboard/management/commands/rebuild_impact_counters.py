@@ -0,0 +1,21 @@
+"""
+Django management command to rebuild the impact counters from history.
+
+Recounts coffee cups sold from every paid order. Run it once to start keeping
+the counter, and after order statuses are changed by hand.
+
+Usage:
+    python manage.py rebuild_impact_counters
+"""
+
+from django.core.management.base import BaseCommand
+
+from dashboard.impact import rebuild_cups_sold
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the impact counters (coffee cups sold) from order history'
+
+    def handle(self, *args, **options):
+        cups = rebuild_cups_sold()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the impact counters: {cups} coffee cups sold'))
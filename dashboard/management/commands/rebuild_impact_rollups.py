@@ -0,0 +1,22 @@
+"""
+Django management command to rebuild the daily impact rollups from history.
+
+Recomputes trees planted and CO₂ offset per day and district, paid donations
+per day and currency and orders per day and city. Run it once after deploying
+the rollups, and after trees, donations or orders are changed in bulk.
+
+Usage:
+    python manage.py rebuild_impact_rollups
+"""
+
+from django.core.management.base import BaseCommand
+
+from dashboard.rollups import rebuild_impact_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily impact rollups (trees, donations, orders) from history'
+
+    def handle(self, *args, **options):
+        written = rebuild_impact_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the impact rollups: {written} daily rows'))
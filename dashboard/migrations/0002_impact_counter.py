@@ -0,0 +1,26 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImpactCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='name')),
+                ('value', models.PositiveBigIntegerField(default=0, verbose_name='value')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='updated at')),
+            ],
+            options={
+                'verbose_name': 'Impact Counter',
+                'verbose_name_plural': 'Impact Counters',
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_impact_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('currency', models.CharField(max_length=10, verbose_name='currency')),
+                ('donations', models.PositiveIntegerField(default=0, verbose_name='donations')),
+                ('amount', models.FloatField(default=0, verbose_name='amount')),
+            ],
+            options={
+                'verbose_name': 'Daily Donations',
+                'verbose_name_plural': 'Daily Donations',
+                'constraints': [models.UniqueConstraint(fields=('date', 'currency'), name='unique_donation_daily')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('city', models.CharField(max_length=100, verbose_name='city')),
+                ('orders', models.PositiveIntegerField(default=0, verbose_name='orders')),
+            ],
+            options={
+                'verbose_name': 'Daily Orders',
+                'verbose_name_plural': 'Daily Orders',
+                'constraints': [models.UniqueConstraint(fields=('date', 'city'), name='unique_order_daily')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TreePlantingDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='date')),
+                ('district', models.CharField(blank=True, max_length=255, verbose_name='district')),
+                ('trees', models.PositiveIntegerField(default=0, verbose_name='trees')),
+                ('co2_offset', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='CO₂ offset (kg)')),
+            ],
+            options={
+                'verbose_name': 'Daily Tree Planting',
+                'verbose_name_plural': 'Daily Tree Planting',
+                'constraints': [models.UniqueConstraint(fields=('date', 'district'), name='unique_tree_planting_daily')],
+            },
+        ),
+    ]
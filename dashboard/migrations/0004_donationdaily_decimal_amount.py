@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0003_impact_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='donationdaily',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='amount'),
+        ),
+    ]
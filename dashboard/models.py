@@ -17,6 +17,67 @@ class ImpactStat(models.Model):
     def __str__(self):
         return self.stat_name
 
+class ImpactCounter(models.Model):
+    """Running total kept up to date as events happen, e.g. coffee cups sold"""
+    name = models.CharField(_('name'), max_length=50, unique=True)
+    value = models.PositiveBigIntegerField(_('value'), default=0)
+    updated_at = models.DateTimeField(_('updated at'), auto_now=True)
+
+    class Meta:
+        verbose_name = _('Impact Counter')
+        verbose_name_plural = _('Impact Counters')
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+# Daily impact rollups, maintained by dashboard.rollups
+class TreePlantingDaily(models.Model):
+    date = models.DateField(_('date'))
+    district = models.CharField(_('district'), max_length=255, blank=True)
+    trees = models.PositiveIntegerField(_('trees'), default=0)
+    co2_offset = models.DecimalField(_('CO₂ offset (kg)'), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('Daily Tree Planting')
+        verbose_name_plural = _('Daily Tree Planting')
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'district'], name='unique_tree_planting_daily'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.district or '-'}: {self.trees} trees"
+
+class DonationDaily(models.Model):
+    date = models.DateField(_('date'))
+    currency = models.CharField(_('currency'), max_length=10)
+    donations = models.PositiveIntegerField(_('donations'), default=0)
+    amount = models.DecimalField(_('amount'), max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name = _('Daily Donations')
+        verbose_name_plural = _('Daily Donations')
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'currency'], name='unique_donation_daily'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.currency}: {self.amount}"
+
+class OrderDaily(models.Model):
+    date = models.DateField(_('date'))
+    city = models.CharField(_('city'), max_length=100)
+    orders = models.PositiveIntegerField(_('orders'), default=0)
+
+    class Meta:
+        verbose_name = _('Daily Orders')
+        verbose_name_plural = _('Daily Orders')
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'city'], name='unique_order_daily'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.city}: {self.orders} orders"
+
 class Testimonial(models.Model):
     author = models.CharField(_('author'), max_length=100)
     role = models.CharField(_('role'), max_length=100, blank=True)
@@ -1,7 +1,35 @@
+from django.conf import settings
+from django.http import HttpResponse
 from django.shortcuts import render
-from dashboard.views import impact_dashboard
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_GET
+
+from .impact import get_public_impact
+
 
 def public_dashboard(request):
-    # Reuse the same context as the admin dashboard, but filter out admin-only data if needed
-    context = impact_dashboard(request).context_data if hasattr(impact_dashboard(request), 'context_data') else {}
-    return render(request, 'dashboard/public_impact.html', context)
+    return render(request, 'dashboard/public_impact.html')
+
+
+@require_GET
+def public_impact_data(request):
+    """
+    Public impact figures, this year's monthly trees and the district ranking
+    as JSON, for the impact page and embeds on partner sites. Revalidations
+    with If-None-Match or If-Modified-Since get a 304 until the snapshot is
+    rebuilt; shared caches may keep it as long as the snapshot lives. CORS
+    headers come from the CORS settings (CORS_PUBLIC_URLS_REGEX).
+    """
+    snapshot = get_public_impact()
+    etag = quote_etag(snapshot['etag'])
+    last_modified = int(snapshot['last_modified'].timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = HttpResponse(snapshot['body'], content_type='application/json')
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(
+        response, public=True, max_age=60, s_maxage=getattr(settings, 'IMPACT_METRICS_CACHE_TIMEOUT', 300),
+    )
+    return response
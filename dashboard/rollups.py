@@ -0,0 +1,103 @@
+"""
+Daily impact rollups.
+
+TreePlantingDaily (trees and CO₂ offset per planting day and district),
+DonationDaily (paid donations per day and currency) and OrderDaily (orders
+per day and city) let the dashboard chart any year from a few hundred rows
+with portable ORM queries.
+
+Saving or deleting a tree, donation or order moves its contribution between
+rollup rows (see dashboard.signals). Changes made with queryset.update(), such
+as admin bulk actions, are not seen; rebuild_impact_rollups() recomputes
+everything from history.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Round, TruncDate
+from django.utils import timezone
+
+from apps.trees.models import Tree
+from core.models import Donation
+from shop.models import Order
+
+from .models import DonationDaily, OrderDaily, TreePlantingDaily
+
+
+def _money(amount):
+    # Donation.amount is a float; round it to cents once, before it is summed
+    return Decimal(str(amount or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def _tree_row(tree):
+    return (
+        {'date': tree.planted_date, 'district': tree.location or ''},
+        {'trees': 1, 'co2_offset': Decimal(str(tree.co2_offset or 0))},
+    )
+
+
+def _donation_row(donation):
+    if donation.payment_status != 'paid':
+        return None
+    return (
+        {'date': timezone.localdate(donation.created_at), 'currency': donation.currency},
+        {'donations': 1, 'amount': _money(donation.amount)},
+    )
+
+
+def _order_row(order):
+    return (
+        {'date': timezone.localdate(order.created_at), 'city': order.city},
+        {'orders': 1},
+    )
+
+
+# Source model: (rollup model, fields the rollup reads, the row a source instance adds to)
+ROLLUPS = {
+    Tree: (TreePlantingDaily, {'planted_date', 'location', 'co2_offset'}, _tree_row),
+    Donation: (DonationDaily, {'payment_status', 'currency', 'amount'}, _donation_row),
+    Order: (OrderDaily, {'city'}, _order_row),
+}
+
+
+def rollup_row(instance):
+    """
+    (key, values) that instance contributes to its rollup, or None
+    """
+    _, _, row = ROLLUPS[type(instance)]
+    return row(instance)
+
+
+def apply_rollup_row(model, row, sign):
+    """
+    Add (sign=1) or remove (sign=-1) one source row's contribution
+    """
+    if row is None:
+        return
+    key, values = row
+    with transaction.atomic():
+        model.objects.get_or_create(**key)
+        model.objects.filter(**key).update(**{field: F(field) + sign * value for field, value in values.items()})
+
+
+def rebuild_impact_rollups():
+    """
+    Recompute every rollup from history. Returns the number of rows written.
+    """
+    trees = Tree.objects.values(date=F('planted_date'), district=F('location')).annotate(
+        trees=Count('id'), co2_offset=Sum('co2_offset'),
+    ).order_by()
+    donations = Donation.objects.filter(payment_status='paid').values(
+        'currency', date=TruncDate('created_at'),
+    ).annotate(donations=Count('id'), amount=Sum(Round('amount', 2))).order_by()
+    donations = [dict(row, amount=_money(row['amount'])) for row in donations]
+    orders = Order.objects.values('city', date=TruncDate('created_at')).annotate(orders=Count('id')).order_by()
+
+    written = 0
+    with transaction.atomic():
+        for model, rows in ((TreePlantingDaily, trees), (DonationDaily, donations), (OrderDaily, orders)):
+            model.objects.all().delete()
+            created = model.objects.bulk_create([model(**row) for row in rows], batch_size=1000)
+            written += len(created)
+    return written
@@ -0,0 +1,95 @@
+import re
+
+from corsheaders.signals import check_request_enabled
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from apps.trees.models import Tree
+from core.models import Donation
+from farmers.models import Farmer, FarmerStory
+from shop.models import Order
+from volunteers.models import BaristaTrainingApplication
+
+from .impact import invalidate_impact_metrics
+from .models import ImpactStat
+from .rollups import ROLLUPS, apply_rollup_row, rollup_row
+
+
+@receiver([post_save, post_delete], sender=ImpactStat)
+@receiver([post_save, post_delete], sender=Tree)
+@receiver([post_save, post_delete], sender=Farmer)
+@receiver([post_save, post_delete], sender=FarmerStory)
+@receiver([post_save, post_delete], sender=BaristaTrainingApplication)
+@receiver([post_save, post_delete], sender=Donation)
+def invalidate_impact_metrics_on_change(sender, **kwargs):
+    invalidate_impact_metrics()
+
+
+@receiver(pre_save, sender=Order)
+def remember_previous_paid_state(sender, instance, update_fields=None, **kwargs):
+    # Orders only reach the impact figures through cups sold, which counts paid
+    # orders; checkout and gateway updates that leave them unpaid keep the snapshot
+    instance._previous_paid = None
+    if instance.pk and (update_fields is None or 'status' in update_fields):
+        previous = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+        instance._previous_paid = previous == 'paid'
+
+
+@receiver(post_save, sender=Order)
+def invalidate_impact_metrics_on_payment(sender, instance, created=False, **kwargs):
+    previous = getattr(instance, '_previous_paid', None)
+    if previous is None and not created:
+        return
+    if bool(previous) != (instance.status == 'paid'):
+        invalidate_impact_metrics()
+
+
+@receiver(post_delete, sender=Order)
+def invalidate_impact_metrics_on_paid_delete(sender, instance, **kwargs):
+    if instance.status == 'paid':
+        invalidate_impact_metrics()
+
+
+@receiver(pre_save, sender=Tree)
+@receiver(pre_save, sender=Donation)
+@receiver(pre_save, sender=Order)
+def remember_previous_rollup_row(sender, instance, update_fields=None, **kwargs):
+    # Keep the stored contribution so post_save can move only the difference;
+    # saves that touch none of the rolled up fields are skipped
+    _, fields, _ = ROLLUPS[sender]
+    instance._skip_rollup = update_fields is not None and not fields & set(update_fields)
+    instance._previous_rollup_row = None
+    if instance.pk and not instance._skip_rollup:
+        previous = sender.objects.filter(pk=instance.pk).first()
+        instance._previous_rollup_row = rollup_row(previous) if previous else None
+
+
+@receiver(post_save, sender=Tree)
+@receiver(post_save, sender=Donation)
+@receiver(post_save, sender=Order)
+def update_rollups_on_save(sender, instance, **kwargs):
+    if getattr(instance, '_skip_rollup', False):
+        return
+    previous = getattr(instance, '_previous_rollup_row', None)
+    current = rollup_row(instance)
+    if previous == current:
+        return
+    model, _, _ = ROLLUPS[sender]
+    apply_rollup_row(model, previous, -1)
+    apply_rollup_row(model, current, 1)
+
+
+@receiver(post_delete, sender=Tree)
+@receiver(post_delete, sender=Donation)
+@receiver(post_delete, sender=Order)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    model, _, _ = ROLLUPS[sender]
+    apply_rollup_row(model, rollup_row(instance), -1)
+
+
+@receiver(check_request_enabled)
+def allow_public_urls_from_any_origin(sender, request, **kwargs):
+    # Partner sites embed the public impact data; CORS_ALLOWED_ORIGINS still guards the rest
+    pattern = getattr(settings, 'CORS_PUBLIC_URLS_REGEX', None)
+    return bool(pattern and re.match(pattern, request.path_info))
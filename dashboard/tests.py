@@ -0,0 +1,110 @@
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.trees.models import Tree
+from core.models import Donation
+from shop.models import ExchangeRate, Order
+
+from .models import DonationDaily, OrderDaily, TreePlantingDaily
+
+
+class ImpactRollupTest(TestCase):
+    def rollups(self):
+        return (
+            sorted(TreePlantingDaily.objects.filter(trees__gt=0).values_list('date', 'district', 'trees', 'co2_offset')),
+            sorted(DonationDaily.objects.filter(donations__gt=0).values_list('currency', 'donations', 'amount')),
+            sorted(OrderDaily.objects.filter(orders__gt=0).values_list('city', 'orders')),
+        )
+
+    def test_rollups_follow_changes_and_match_rebuild(self):
+        Tree.objects.create(tree_id='T-1', species='coffee', planted_date=date(2024, 3, 1), location='Huye', co2_offset=Decimal('1.50'))
+        moved = Tree.objects.create(tree_id='T-2', species='coffee', planted_date=date(2024, 3, 1), location='Huye', co2_offset=Decimal('2.00'))
+        Tree.objects.create(tree_id='T-3', species='avocado', planted_date=date(2023, 7, 9))
+        moved.location = 'Musanze'
+        moved.save()
+        Tree.objects.get(tree_id='T-3').delete()
+
+        donation = Donation.objects.create(amount=100, currency='USD', donation_type='one_time')
+        Donation.objects.create(amount=5000, donation_type='one_time', payment_status='paid')
+        donation.payment_status = 'paid'
+        donation.save()
+        order = Order.objects.create(
+            full_name='Ama Uwase', email='ama@example.com', phone='0788000000', country='Rwanda',
+            city='Kigali', zip_code='00000', total_amount=Decimal('5000.00'),
+        )
+        order.status = 'paid'
+        order.save(update_fields=['status'])
+
+        maintained = self.rollups()
+        self.assertEqual(maintained[0], [
+            (date(2024, 3, 1), 'Huye', 1, Decimal('1.50')),
+            (date(2024, 3, 1), 'Musanze', 1, Decimal('2.00')),
+        ])
+        self.assertEqual(maintained[1], [('RWF', 1, Decimal('5000.00')), ('USD', 1, Decimal('100.00'))])
+        self.assertEqual(maintained[2], [('Kigali', 1)])
+
+        call_command('rebuild_impact_rollups', stdout=StringIO())
+        self.assertEqual(self.rollups(), maintained)
+
+        staff = get_user_model().objects.create_user(username='staff', email='staff@example.com', password='pw', is_staff=True)
+        self.client.force_login(staff)
+        data = self.client.get(reverse('impact'), {'format': 'json', 'year': 2024}).json()
+        self.assertEqual(data['charts']['trees_month_data'][2], 2)
+        self.assertEqual(sorted(data['charts']['district_labels']), ['Huye', 'Musanze'])
+        this_year = timezone.localdate().year
+        self.assertEqual(data['all_years'], [this_year, 2024])
+        data = self.client.get(reverse('impact'), {'format': 'json', 'year': this_year}).json()
+        self.assertEqual(sum(data['charts']['donations_month_data']), 5000.0)
+        self.assertEqual(data['charts']['unconverted_currencies'], ['USD'])
+
+        ExchangeRate.objects.create(currency='USD', rate=Decimal('1300'))
+        data = self.client.get(reverse('impact'), {'format': 'json', 'year': this_year}).json()
+        self.assertEqual(sum(data['charts']['donations_month_data']), 135000.0)
+        self.assertEqual(data['charts']['donations_currency'], 'RWF')
+        self.assertEqual(data['charts']['unconverted_currencies'], [])
+
+
+class PublicImpactTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('public_impact_data')
+        Tree.objects.create(tree_id='T-1', species='coffee', planted_date=timezone.localdate(), location='Huye')
+        Donation.objects.create(amount=5000, donation_type='one_time', payment_status='paid')
+
+    def test_public_snapshot_and_revalidation(self):
+        response = self.client.get(self.url)
+        data = response.json()
+        self.assertEqual(data['stats']['trees_planted'], 1)
+        self.assertNotIn('total_donations', data['stats'])
+        self.assertEqual(sum(data['charts']['trees_month_data']), 1)
+        self.assertEqual(data['charts']['district_labels'], ['Huye'])
+        self.assertIn('public', response['Cache-Control'])
+        self.assertFalse(response['ETag'].startswith('W/'))
+
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+
+        Tree.objects.create(tree_id='T-2', species='coffee', planted_date=timezone.localdate(), location='Huye')
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['stats']['trees_planted'], 2)
+
+    def test_cors_follows_settings(self):
+        response = self.client.get(self.url, HTTP_ORIGIN='https://partner.example')
+        self.assertEqual(response['Access-Control-Allow-Origin'], 'https://partner.example')
+        self.assertNotIn('Access-Control-Allow-Origin', self.client.get(self.url))
+        staff_data = self.client.get(reverse('impact'), {'format': 'json'}, HTTP_ORIGIN='https://partner.example')
+        self.assertNotIn('Access-Control-Allow-Origin', staff_data)
+
+    def test_public_page_renders(self):
+        self.assertContains(self.client.get(reverse('public_impact')), self.url)
@@ -1,9 +1,10 @@
 from django.urls import path
 from . import views
-from .public_views import public_dashboard
+from .public_views import public_dashboard, public_impact_data
 
 urlpatterns = [
     # Backend-only dashboard endpoint (redirects to home, or returns JSON with ?format=json)
     path('', views.impact_dashboard, name='impact'),
     path('public/', public_dashboard, name='public_impact'),
+    path('public/data/', public_impact_data, name='public_impact_data'),
 ]
\ No newline at end of file
@@ -3,11 +3,10 @@ from django.utils.html import format_html
 from django.utils import timezone
 from django.db.models import Count, Q
 from .models import Event
-import csv
-from django.http import HttpResponse
+from core.admin_export import StreamingExportMixin
 
 @admin.register(Event)
-class EventAdmin(admin.ModelAdmin):
+class EventAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = (
         'title', 'status_badge', 'date_range', 'location', 
         'organizer_name', 'attendees_count', 'duration'
@@ -215,7 +214,7 @@ class EventAdmin(admin.ModelAdmin):
         )
     event_stats.short_description = "Event Statistics"
     
-    actions = ['mark_as_completed', 'mark_as_cancelled', 'export_as_csv']
+    actions = ['mark_as_completed', 'mark_as_cancelled', 'export_as_csv', 'export_as_csv_gzip', 'export_as_jsonl']
     
     def mark_as_completed(self, request, queryset):
         updated = queryset.update(status='completed')
@@ -227,39 +226,35 @@ class EventAdmin(admin.ModelAdmin):
         self.message_user(request, f'{updated} events marked as cancelled.')
     mark_as_cancelled.short_description = "Mark selected events as cancelled"
     
-    def export_as_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=events_{queryset.count()}_items.csv'
-        writer = csv.writer(response)
-        
-        headers = [
-            'Title', 'Status', 'Start Date', 'End Date', 'Location',
-            'Organizer', 'Duration (minutes)', 'Description'
+    export_name = 'events'
+    export_headers = [
+        'Title', 'Status', 'Start Date', 'End Date', 'Location',
+        'Organizer', 'Duration (minutes)', 'Description'
+    ]
+    
+    def get_export_queryset(self, queryset):
+        return queryset.select_related('organizer')
+    
+    def export_row(self, obj):
+        if obj.start_date and obj.end_date:
+            duration_minutes = int((obj.end_date - obj.start_date).total_seconds() / 60)
+            start_date_str = obj.start_date.strftime('%Y-%m-%d %H:%M:%S')
+            end_date_str = obj.end_date.strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            duration_minutes = 0
+            start_date_str = 'Not set'
+            end_date_str = 'Not set'
+            
+        return [
+            obj.title,
+            obj.get_status_display(),
+            start_date_str,
+            end_date_str,
+            obj.location,
+            obj.organizer.get_full_name() if obj.organizer else '',
+            duration_minutes,
+            obj.description
         ]
-        writer.writerow(headers)
-        
-        for obj in queryset:
-            if obj.start_date and obj.end_date:
-                duration_minutes = int((obj.end_date - obj.start_date).total_seconds() / 60)
-                start_date_str = obj.start_date.strftime('%Y-%m-%d %H:%M:%S')
-                end_date_str = obj.end_date.strftime('%Y-%m-%d %H:%M:%S')
-            else:
-                duration_minutes = 0
-                start_date_str = 'Not set'
-                end_date_str = 'Not set'
-                
-            writer.writerow([
-                obj.title,
-                obj.get_status_display(),
-                start_date_str,
-                end_date_str,
-                obj.location,
-                obj.organizer.get_full_name() if obj.organizer else '',
-                duration_minutes,
-                obj.description
-            ])
-        return response
-    export_as_csv.short_description = "Export selected events as CSV"
     
     class Media:
         css = {
@@ -1,12 +1,14 @@
 
 from django.views.generic import ListView, DetailView
+from core.pagination import KeysetPaginationMixin
 from .models import Event
 
-class EventListView(ListView):
+class EventListView(KeysetPaginationMixin, ListView):
 	model = Event
 	template_name = 'events/event_list.html'
 	context_object_name = 'events'
 	paginate_by = 10
+	keyset_ordering = ['-pinned', '-start_date']
 
 class EventDetailView(DetailView):
 	model = Event
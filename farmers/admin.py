@@ -8,8 +8,7 @@ from .models import (
     Farmer, HouseholdMember, HouseholdAsset, FarmerSupportActivity, 
     FarmerStory, Farm, FarmSponsorship
 )
-import csv
-from django.http import HttpResponse
+from core.admin_export import StreamingExportMixin
 
 # Inline classes
 class HouseholdMemberInline(admin.TabularInline):
@@ -31,7 +30,7 @@ class FarmerStoryInline(admin.StackedInline):
     classes = ['collapse']
 
 @admin.register(Farmer)
-class FarmerAdmin(admin.ModelAdmin):
+class FarmerAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = (
         'full_name', 'household_id', 'location_info', 'phone_number', 
         'sponsorship_status', 'cooperation_status', 'pinned_status', 'created_date',
@@ -194,38 +193,30 @@ class FarmerAdmin(admin.ModelAdmin):
         )
     support_activities_count.short_description = "Support Activities"
     
-    actions = ['export_as_csv', 'activate_sponsorship', 'deactivate_sponsorship', 'pin_farmers']
+    actions = ['export_as_csv', 'export_as_csv_gzip', 'export_as_jsonl', 'activate_sponsorship', 'deactivate_sponsorship', 'pin_farmers']
     
-    def export_as_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=farmers_{queryset.count()}_items.csv'
-        writer = csv.writer(response)
-        
-        # Custom header for better export
-        headers = [
-            'Full Name', 'Household ID', 'Phone', 'District', 'Sector', 'Cell', 'Village',
-            'Age', 'Sex', 'Marital Status', 'Education', 'Main Income Source',
-            'Farm Size', 'Monthly Income', 'Coop Member', 'Occupation',
-            'Sponsorship Active', 'Sponsorship Goal', 'Sponsorship Received',
-            'Interview Date', 'Interviewer'
+    export_name = 'farmers'
+    export_headers = [
+        'Full Name', 'Household ID', 'Phone', 'District', 'Sector', 'Cell', 'Village',
+        'Age', 'Sex', 'Marital Status', 'Education', 'Main Income Source',
+        'Farm Size', 'Monthly Income', 'Coop Member', 'Occupation',
+        'Sponsorship Active', 'Sponsorship Goal', 'Sponsorship Received',
+        'Interview Date', 'Interviewer'
+    ]
+    
+    def export_row(self, obj):
+        return [
+            obj.full_name, obj.household_id, obj.phone_number,
+            obj.district, obj.sector, obj.cell, obj.village,
+            obj.age, obj.get_sex_display(), obj.get_marital_status_display(),
+            obj.get_education_level_display(), obj.main_income_source,
+            obj.farm_size, obj.avg_monthly_income, 
+            'Yes' if obj.is_coop_member else 'No',
+            obj.get_occupation_display() if obj.occupation else '',
+            'Yes' if obj.sponsorship_is_active else 'No',
+            obj.sponsorship_goal, obj.sponsorship_received,
+            obj.interview_date, obj.interviewer_name
         ]
-        writer.writerow(headers)
-        
-        for obj in queryset:
-            writer.writerow([
-                obj.full_name, obj.household_id, obj.phone_number,
-                obj.district, obj.sector, obj.cell, obj.village,
-                obj.age, obj.get_sex_display(), obj.get_marital_status_display(),
-                obj.get_education_level_display(), obj.main_income_source,
-                obj.farm_size, obj.avg_monthly_income, 
-                'Yes' if obj.is_coop_member else 'No',
-                obj.get_occupation_display() if obj.occupation else '',
-                'Yes' if obj.sponsorship_is_active else 'No',
-                obj.sponsorship_goal, obj.sponsorship_received,
-                obj.interview_date, obj.interviewer_name
-            ])
-        return response
-    export_as_csv.short_description = "Export selected farmers as CSV"
     
     def activate_sponsorship(self, request, queryset):
         updated = queryset.update(sponsorship_is_active=True)
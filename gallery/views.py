@@ -1,8 +1,10 @@
 from django.views.generic import ListView
+from core.pagination import KeysetPaginationMixin
 from .models import GalleryImage
 
-class GalleryListView(ListView):
+class GalleryListView(KeysetPaginationMixin, ListView):
     model = GalleryImage
     template_name = 'gallery/gallery_list.html'
     context_object_name = 'images'
     paginate_by = 12
+    keyset_ordering = ['-pinned', '-uploaded_at']
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'allauth.socialaccount',
     'crispy_forms',
     'crispy_bootstrap5',
+    'corsheaders',
     'whitenoise.runserver_nostatic',
     # Local apps
     'accounts',
@@ -67,6 +68,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,6 +93,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'core.context_processors.site_settings',
+                'shop.context_processors.cart_summary',
             ],
         },
     },
@@ -135,6 +138,46 @@ if os.getenv('DJANGO_PRODUCTION', 'False').lower() in ('1', 'true', 'yes'):
 #         }
 #     }
 
+# Cache
+# Set REDIS_URL (e.g. redis://localhost:6379/1, needs the redis package) in
+# production so every worker shares one cache and sees invalidations. Without
+# it each process keeps its own in-memory cache.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'onecup',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'onecup-default',
+        }
+    }
+
+# Seconds an anonymous product page body stays cached (changes invalidate it sooner)
+SHOP_PRODUCT_PAGE_CACHE_TIMEOUT = int(os.getenv('SHOP_PRODUCT_PAGE_CACHE_TIMEOUT', 600))
+
+# Seconds the impact figures snapshot stays cached (source model changes drop it sooner)
+IMPACT_METRICS_CACHE_TIMEOUT = int(os.getenv('IMPACT_METRICS_CACHE_TIMEOUT', 300))
+
+# Tree map tiles: seconds a tile stays cached (tree changes drop it sooner) and
+# the zoom from which single trees are shown instead of clusters
+TREE_MAP_CACHE_TIMEOUT = int(os.getenv('TREE_MAP_CACHE_TIMEOUT', 3600))
+TREE_MAP_MAX_CLUSTER_ZOOM = 15
+
+# Seconds a product change waits before the catalog feed serves it, so rows
+# committed late by slow transactions are not skipped by delta cursors; keep
+# it above the longest transaction that saves products
+CATALOG_FEED_SAFETY_LAG = int(os.getenv('CATALOG_FEED_SAFETY_LAG', 60))
+
+# Currency that cart totals, orders and price sorting are expressed in; other
+# product currencies are converted with the rates loaded by load_exchange_rates
+SHOP_BASE_CURRENCY = 'RWF'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -235,9 +278,12 @@ SECURE_BROWSER_XSS_FILTER = True
 SECURE_CONTENT_TYPE_NOSNIFF = True
 X_FRAME_OPTIONS = 'DENY'
 
-# CORS Settings (if needed for API)
+# CORS Settings: only the API and the public impact data answer cross-origin requests
 CORS_ALLOW_ALL_ORIGINS = os.getenv('CORS_ALLOW_ALL_ORIGINS', 'False').lower() in ('true', '1', 'yes')
 CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', 'http://localhost:3000,http://127.0.0.1:3000').split(',')
+CORS_URLS_REGEX = r'^/(api/|dashboard/public/data/$)'
+# Of those, the URLs partner sites embed, open to every origin (see dashboard.signals)
+CORS_PUBLIC_URLS_REGEX = r'^/dashboard/public/data/$'
 
 # Logging Configuration
 LOGGING = {
@@ -280,6 +326,10 @@ CONTACT_MAP_URL = os.getenv('CONTACT_MAP_URL', 'https://www.google.com/maps/plac
 
 # Payment Gateway Settings
 PAYMENT_GATEWAYS = {
+    'IREMBOPAY': {
+        # Shared secret used to sign payment callbacks (falls back to SECRET_KEY)
+        'webhook_secret': os.getenv('IREMBOPAY_WEBHOOK_SECRET', ''),
+    },
     'MTN_MOBILE_MONEY': {
         'enabled': os.getenv('MTN_ENABLED', 'False').lower() in ('true', '1', 'yes'),
         'api_key': os.getenv('MTN_API_KEY', ''),
@@ -1,9 +1,32 @@
-from django.contrib import admin
+import io
+
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
-from django.db.models import Sum, Count
-from .models import Product, ProductCategory, ProductReview, Cart, CartItem, Order, Wishlist
-import csv
-from django.http import HttpResponse
+from django.db.models import Count, Exists, F, OuterRef, Q, Sum
+from .models import Product, ProductCategory, ProductReview, Cart, CartItem, Order, OrderItem, Payment, Wishlist, ExchangeRate, InventorySnapshot
+from .catalog import annotate_product_counts, invalidate_category_catalog, invalidate_product_pages
+from .currency import base_currency, reprice_products
+from .forms import CatalogImportForm, ExchangeRateForm
+from .importer import file_format_for, import_catalog, read_rows
+from .payments import apply_gateway_result, settle_order
+from core.admin_export import StreamingExportMixin
+from django.db.models.functions import Coalesce
+
+
+def annotate_sales(queryset):
+    """
+    Annotate products with quantity_sold and orders_count from order lines of paid orders
+    """
+    sold = Q(order_items__order__status='paid')
+    return queryset.annotate(
+        quantity_sold=Coalesce(Sum('order_items__quantity', filter=sold), 0),
+        orders_count=Count('order_items__order', filter=sold, distinct=True),
+    )
 
 
 @admin.register(ProductCategory)
@@ -15,6 +38,9 @@ class ProductCategoryAdmin(admin.ModelAdmin):
     list_editable = ('is_active', 'ordering')
     ordering = ['ordering', 'name']
     
+    def get_queryset(self, request):
+        return annotate_product_counts(super().get_queryset(request))
+    
     def product_count_display(self, obj):
         count = obj.product_count
         return format_html(
@@ -22,6 +48,7 @@ class ProductCategoryAdmin(admin.ModelAdmin):
             count
         )
     product_count_display.short_description = "Products"
+    product_count_display.admin_order_field = 'active_product_count'
 
 
 @admin.register(ProductReview)
@@ -57,11 +84,12 @@ class ProductReviewAdmin(admin.ModelAdmin):
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = ('name', 'category', 'price_display', 'stock_status', 'rating_display', 'image_preview', 'is_active', 'is_featured', 'is_new')
-    list_filter = ('is_active', 'is_featured', 'is_new', 'category', 'currency')
+    list_select_related = ('category',)
+    list_filter = ('is_active', 'is_featured', 'is_new', 'stock_state', 'category', 'currency')
     search_fields = ('name', 'description', 'slug')
-    readonly_fields = ('image_preview', 'product_stats', 'created_at', 'updated_at')
+    readonly_fields = ('image_preview', 'product_stats', 'base_price', 'rating_average', 'rating_count', 'rating_histogram', 'created_at', 'updated_at')
     list_editable = ('is_active', 'is_featured', 'is_new')
     prepopulated_fields = {'slug': ('name',)}
     ordering = ['-created_at']
@@ -72,7 +100,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('name', 'slug', 'category', 'description', 'image', 'image_preview')
         }),
         ('Pricing', {
-            'fields': ('price', 'compare_price', 'currency')
+            'fields': ('price', 'compare_price', 'currency', 'base_price')
         }),
         ('Inventory', {
             'fields': ('stock_quantity', 'show_stock_publicly')
@@ -85,28 +113,27 @@ class ProductAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Statistics', {
-            'fields': ('product_stats',),
+            'fields': ('product_stats', 'rating_average', 'rating_count', 'rating_histogram'),
             'classes': ('collapse',)
         }),
     )
     
+    def get_queryset(self, request):
+        return annotate_sales(super().get_queryset(request))
+    
+    # Badge colour and icon per precomputed stock state
+    STOCK_BADGES = {
+        'untracked': ('#6c757d', 'minus-circle'),
+        'in_stock': ('#28a745', 'check-circle'),
+        'low': ('#ffc107', 'exclamation-triangle'),
+        'out': ('#dc3545', 'times-circle'),
+    }
+    
     def stock_status(self, obj):
-        if obj.stock_quantity is None:
-            color = '#6c757d'
-            icon = 'minus-circle'
-            text = 'Not Tracked'
-        elif obj.stock_quantity > 10:
-            color = '#28a745'
-            icon = 'check-circle'
-            text = f'In Stock ({obj.stock_quantity})'
-        elif obj.stock_quantity > 0:
-            color = '#ffc107'
-            icon = 'exclamation-triangle'
-            text = f'Low Stock ({obj.stock_quantity})'
-        else:
-            color = '#dc3545'
-            icon = 'times-circle'
-            text = 'Out of Stock'
+        color, icon = self.STOCK_BADGES[obj.stock_state]
+        text = obj.get_stock_state_display()
+        if obj.stock_state in ('in_stock', 'low'):
+            text = f'{text} ({obj.stock_quantity})'
         
         return format_html(
             '<span style="background: {}; color: white; padding: 4px 8px; border-radius: 4px; font-size: 12px;">'
@@ -114,6 +141,7 @@ class ProductAdmin(admin.ModelAdmin):
             color, icon, text
         )
     stock_status.short_description = "Stock"
+    stock_status.admin_order_field = 'stock_state'
     
     def rating_display(self, obj):
         if obj.average_rating:
@@ -124,6 +152,7 @@ class ProductAdmin(admin.ModelAdmin):
             )
         return format_html('<small style="color: #6c757d;">No reviews</small>')
     rating_display.short_description = "Rating"
+    rating_display.admin_order_field = 'rating_average'
     
     def price_display(self, obj):
         return format_html(
@@ -156,20 +185,16 @@ class ProductAdmin(admin.ModelAdmin):
     image_preview.short_description = "Image Preview"
     
     def order_count(self, obj):
-        count = CartItem.objects.filter(product=obj).aggregate(
-            total_quantity=Sum('quantity')
-        )['total_quantity'] or 0
-        
         return format_html(
             '<span style="background: #17a2b8; color: white; padding: 4px 8px; border-radius: 4px; font-size: 12px;">{} sold</span>',
-            count
+            obj.quantity_sold
         )
     order_count.short_description = "Sales"
+    order_count.admin_order_field = 'quantity_sold'
     
     def product_stats(self, obj):
-        cart_items = CartItem.objects.filter(product=obj)
-        total_quantity = cart_items.aggregate(Sum('quantity'))['quantity__sum'] or 0
-        cart_count = cart_items.values('cart').distinct().count()
+        total_quantity = obj.quantity_sold
+        order_count = obj.orders_count
         
         return format_html(
             '<div style="background: #f8f9fa; padding: 10px; border-radius: 6px;">'
@@ -179,49 +204,77 @@ class ProductAdmin(admin.ModelAdmin):
             'Average per Order: {:.1f}<br>'
             'Status: {}'
             '</div>',
-            total_quantity, cart_count,
-            total_quantity / cart_count if cart_count > 0 else 0,
+            total_quantity, order_count,
+            total_quantity / order_count if order_count > 0 else 0,
             'Active' if obj.is_active else 'Inactive'
         )
     product_stats.short_description = "Product Analytics"
     
-    actions = ['activate_products', 'deactivate_products', 'export_as_csv']
+    actions = ['activate_products', 'deactivate_products', 'export_as_csv', 'export_as_csv_gzip', 'export_as_jsonl']
     
     def activate_products(self, request, queryset):
-        updated = queryset.update(is_active=True)
+        updated = queryset.update(is_active=True, updated_at=timezone.now())
+        invalidate_category_catalog()
+        invalidate_product_pages()
         self.message_user(request, f'{updated} products activated.')
     activate_products.short_description = "Activate selected products"
     
     def deactivate_products(self, request, queryset):
-        updated = queryset.update(is_active=False)
+        updated = queryset.update(is_active=False, updated_at=timezone.now())
+        invalidate_category_catalog()
+        invalidate_product_pages()
         self.message_user(request, f'{updated} products deactivated.')
     deactivate_products.short_description = "Deactivate selected products"
     
-    def export_as_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=products_{queryset.count()}_items.csv'
-        writer = csv.writer(response)
-        
-        headers = ['Name', 'Description', 'Price', 'Currency', 'Active', 'Total Sold']
-        writer.writerow(headers)
-        
-        for obj in queryset:
-            total_sold = CartItem.objects.filter(product=obj).aggregate(
-                Sum('quantity')
-            )['quantity__sum'] or 0
-            
-            writer.writerow([
-                obj.name, obj.description, obj.price, obj.currency,
-                'Yes' if obj.is_active else 'No', total_sold
-            ])
-        return response
-    export_as_csv.short_description = "Export selected products as CSV"
+    change_list_template = 'admin/shop/product/change_list.html'
+    
+    def get_urls(self):
+        return [
+            path('import/', self.admin_site.admin_view(self.import_catalog_view), name='shop_product_import'),
+        ] + super().get_urls()
+    
+    def import_catalog_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+        result = None
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            upload = form.cleaned_data['file']
+            stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+            result = import_catalog(read_rows(stream, file_format_for(upload.name)), form.cleaned_data['dry_run'])
+            summary = f'{result.created} created, {result.updated} updated, {result.unchanged} unchanged'
+            if not result.ok:
+                self.message_user(request, f'{len(result.errors)} invalid rows, nothing imported.', messages.ERROR)
+            elif result.dry_run:
+                self.message_user(request, f'Dry run, nothing saved: {summary}.', messages.INFO)
+            else:
+                self.message_user(request, f'Catalog imported: {summary}.', messages.SUCCESS)
+        context = {
+            **self.admin_site.each_context(request),
+            'title': 'Import products',
+            'opts': self.model._meta,
+            'form': form,
+            'result': result,
+        }
+        return TemplateResponse(request, 'admin/shop/product/import_catalog.html', context)
+    
+    export_name = 'products'
+    export_headers = ['Name', 'Description', 'Price', 'Currency', 'Active', 'Total Sold']
+    
+    def export_row(self, obj):
+        return [
+            obj.name, obj.description, obj.price, obj.currency,
+            'Yes' if obj.is_active else 'No', obj.quantity_sold
+        ]
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 0
     readonly_fields = ('product_price', 'total_price')
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+    
     def product_price(self, obj):
         if obj.product:
             return f"{obj.product.currency} {obj.product.price}"
@@ -246,37 +299,33 @@ class CartAdmin(admin.ModelAdmin):
     
     inlines = [CartItemInline]
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            line_count=Count('items'),
+            total_quantity=Sum('items__quantity'),
+            value_total=Sum(F('items__quantity') * F('items__product__base_price')),
+            has_order=Exists(Order.objects.filter(cart=OuterRef('pk'))),
+        )
+    
     def items_count(self, obj):
-        count = obj.items.count()
-        total_quantity = obj.items.aggregate(Sum('quantity'))['quantity__sum'] or 0
-        
         return format_html(
             '<span style="font-weight: 600;">{} items</span><br>'
             '<span style="color: #666; font-size: 12px;">({} total quantity)</span>',
-            count, total_quantity
+            obj.line_count, obj.total_quantity or 0
         )
     items_count.short_description = "Items"
+    items_count.admin_order_field = 'line_count'
     
     def total_value(self, obj):
-        total = 0
-        currency = "RWF"  # Default currency
-        
-        for item in obj.items.all():
-            if item.product:
-                total += item.quantity * item.product.price
-                currency = item.product.currency
-        
         return format_html(
             '<span style="font-weight: 600; color: #28a745;">{} {}</span>',
-            currency, total
+            base_currency(), obj.value_total or 0
         )
     total_value.short_description = "Total Value"
+    total_value.admin_order_field = 'value_total'
     
     def status(self, obj):
-        # Check if cart has associated order
-        has_order = hasattr(obj, 'order_set') and obj.order_set.exists()
-        
-        if has_order:
+        if obj.has_order:
             return format_html(
                 '<span style="background: #28a745; color: white; padding: 4px 8px; border-radius: 4px; font-size: 12px;">'
                 '<i class="fas fa-check"></i> Ordered</span>'
@@ -286,11 +335,11 @@ class CartAdmin(admin.ModelAdmin):
             '<i class="fas fa-shopping-cart"></i> Pending</span>'
         )
     status.short_description = "Status"
+    status.admin_order_field = 'has_order'
     
     def cart_summary(self, obj):
-        items = obj.items.all()
+        items = obj.items.select_related('product')
         total_value = 0
-        currency = "RWF"
         
         html = '<div style="background: #f8f9fa; padding: 10px; border-radius: 6px;">'
         html += '<strong>Cart Summary:</strong><br>'
@@ -298,25 +347,57 @@ class CartAdmin(admin.ModelAdmin):
         for item in items:
             if item.product:
                 item_total = item.quantity * item.product.price
-                total_value += item_total
                 currency = item.product.currency
+                if item.product.base_price is not None:
+                    total_value += item.quantity * item.product.base_price
                 
                 html += f'• {item.product.name}: {item.quantity} × {currency} {item.product.price} = {currency} {item_total}<br>'
         
-        html += f'<hr style="margin: 8px 0;"><strong>Total: {currency} {total_value}</strong>'
+        html += f'<hr style="margin: 8px 0;"><strong>Total: {base_currency()} {total_value}</strong>'
         html += '</div>'
         
         return format_html(html)
     cart_summary.short_description = "Cart Details"
 
+class OrderItemInline(admin.TabularInline):
+    model = OrderItem
+    extra = 0
+    can_delete = False
+    fields = ('product', 'product_name', 'unit_price', 'currency', 'quantity', 'line_total')
+    readonly_fields = fields
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
+    def line_total(self, obj):
+        return f"{obj.currency} {obj.line_total}"
+    line_total.short_description = "Total"
+
+class PaymentInline(admin.TabularInline):
+    model = Payment
+    extra = 0
+    can_delete = False
+    fields = ('reference', 'method', 'amount', 'status', 'details', 'gateway_transaction_id', 'updated_at')
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(StreamingExportMixin, admin.ModelAdmin):
     list_display = ('id', 'customer_info', 'cart_info', 'status_badge', 'total_amount', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('full_name', 'email', 'phone')
     readonly_fields = ('order_summary', 'payment_info')
     date_hierarchy = 'created_at'
     ordering = ['-created_at']
+    inlines = [OrderItemInline, PaymentInline]
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(cart_item_count=Count('cart__items'))
     
     fieldsets = (
         ('Customer Information', {
@@ -349,12 +430,11 @@ class OrderAdmin(admin.ModelAdmin):
     customer_info.short_description = "Customer"
     
     def cart_info(self, obj):
-        if obj.cart:
-            items_count = obj.cart.items.count()
+        if obj.cart_id:
             return format_html(
                 '<span style="color: #17a2b8;">Cart #{}</span><br>'
                 '<span style="color: #666; font-size: 12px;">{} items</span>',
-                obj.cart.id, items_count
+                obj.cart_id, obj.cart_item_count
             )
         return "No cart"
     cart_info.short_description = "Cart"
@@ -362,7 +442,9 @@ class OrderAdmin(admin.ModelAdmin):
     def status_badge(self, obj):
         colors = {
             'pending': '#ffc107',
+            'pending_bank_transfer': '#17a2b8',
             'paid': '#28a745',
+            'refund_due': '#fd7e14',
             'failed': '#dc3545'
         }
         
@@ -376,38 +458,29 @@ class OrderAdmin(admin.ModelAdmin):
     status_badge.admin_order_field = 'status'
     
     def total_amount(self, obj):
-        if obj.cart:
-            total = 0
-            currency = "RWF"
-            
-            for item in obj.cart.items.all():
-                if item.product:
-                    total += item.quantity * item.product.price
-                    currency = item.product.currency
-            
-            return format_html(
-                '<span style="font-weight: 600; color: #28a745; font-size: 14px;">{} {}</span>',
-                currency, total
-            )
-        return "N/A"
+        return format_html(
+            '<span style="font-weight: 600; color: #28a745; font-size: 14px;">{} {}</span>',
+            base_currency(), obj.total_amount
+        )
     total_amount.short_description = "Total"
+    total_amount.admin_order_field = 'total_amount'
     
     def order_summary(self, obj):
-        if not obj.cart:
-            return "No cart associated"
+        items = obj.items.all()
+        if not items:
+            return "No items recorded"
         
         html = '<div style="background: #f8f9fa; padding: 10px; border-radius: 6px;">'
         html += '<strong>Order Details:</strong><br>'
         
         total = 0
-        currency = "RWF"
+        currency = base_currency()
         
-        for item in obj.cart.items.all():
-            if item.product:
-                item_total = item.quantity * item.product.price
-                total += item_total
-                currency = item.product.currency
-                html += f'• {item.product.name}: {item.quantity} × {currency} {item.product.price} = {currency} {item_total}<br>'
+        for item in items:
+            item_total = item.line_total
+            total += item_total
+            currency = item.currency
+            html += f'• {item.product_name}: {item.quantity} × {currency} {item.unit_price} = {currency} {item_total}<br>'
         
         html += f'<hr style="margin: 8px 0;"><strong>Total: {currency} {total}</strong><br>'
         html += f'Status: {obj.get_status_display()}<br>'
@@ -427,44 +500,85 @@ class OrderAdmin(admin.ModelAdmin):
             '</div>',
             obj.get_status_display(),
             obj.total_amount,
-            'RWF',  # Assuming default currency
+            base_currency(),
             obj.get_delivery_method_display()
         )
     payment_info.short_description = "Payment Details"
     
-    actions = ['mark_as_paid', 'mark_as_failed', 'export_as_csv']
+    actions = ['mark_as_paid', 'mark_as_failed', 'export_as_csv', 'export_as_csv_gzip', 'export_as_jsonl']
+    
+    def _settle(self, queryset, order_status, payment_status):
+        # Pending payments go through the payment state machine; orders
+        # without one are settled one by one the same way, so stock, sales
+        # rollups and impact figures follow
+        pending = Payment.objects.filter(order__in=queryset, status='pending')
+        settled_orders = set()
+        for reference, order_id in pending.values_list('reference', 'order_id'):
+            apply_gateway_result(reference, payment_status)
+            settled_orders.add(order_id)
+        with transaction.atomic():
+            for order in queryset.exclude(pk__in=settled_orders).select_for_update():
+                settle_order(order, order_status)
+                settled_orders.add(order.pk)
+        return len(settled_orders)
     
     def mark_as_paid(self, request, queryset):
-        updated = queryset.update(status='paid')
+        updated = self._settle(queryset, 'paid', 'succeeded')
         self.message_user(request, f'{updated} orders marked as paid.')
     mark_as_paid.short_description = "Mark selected orders as paid"
     
     def mark_as_failed(self, request, queryset):
-        updated = queryset.update(status='failed')
+        updated = self._settle(queryset, 'failed', 'failed')
         self.message_user(request, f'{updated} orders marked as failed.')
     mark_as_failed.short_description = "Mark selected orders as failed"
     
-    def export_as_csv(self, request, queryset):
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename=orders_{queryset.count()}_items.csv'
-        writer = csv.writer(response)
-        
-        headers = [
-            'Order ID', 'Customer Name', 'Customer Email', 'Customer Phone',
-            'Status', 'Total Amount', 'Country', 'City', 'Created Date'
+    export_name = 'orders'
+    export_headers = [
+        'Order ID', 'Customer Name', 'Customer Email', 'Customer Phone',
+        'Status', 'Total Amount', 'Country', 'City', 'Created Date'
+    ]
+    
+    def export_row(self, obj):
+        return [
+            obj.id, obj.full_name, obj.email, obj.phone,
+            obj.get_status_display(), obj.total_amount, obj.country,
+            obj.city, obj.created_at.strftime('%Y-%m-%d %H:%M:%S')
         ]
-        writer.writerow(headers)
-        
-        for obj in queryset:
-            total = obj.total_amount
-            
-            writer.writerow([
-                obj.id, obj.full_name, obj.email, obj.phone,
-                obj.get_status_display(), total, obj.country,
-                obj.city, obj.created_at.strftime('%Y-%m-%d %H:%M:%S')
-            ])
-        return response
-    export_as_csv.short_description = "Export selected orders as CSV"
+
+
+@admin.register(ExchangeRate)
+class ExchangeRateAdmin(admin.ModelAdmin):
+    form = ExchangeRateForm
+    list_display = ('currency', 'rate', 'updated_at')
+    readonly_fields = ('updated_at',)
+    
+    def save_model(self, request, obj, form, change):
+        # Reprices the products in the currency, and in the previous one if the row's currency changed
+        currencies = {obj.currency}
+        if change and 'currency' in form.changed_data:
+            currencies.add(form.initial['currency'])
+        with transaction.atomic():
+            obj.save()
+            reprice_products(currencies)
+    
+    def has_delete_permission(self, request, obj=None):
+        # Products priced in the currency would keep stale base prices
+        return False
+
+
+@admin.register(InventorySnapshot)
+class InventorySnapshotAdmin(admin.ModelAdmin):
+    list_display = ('date', 'product', 'stock_quantity', 'stock_state', 'units_sold', 'sell_through', 'days_of_cover', 'needs_restock')
+    list_filter = ('needs_restock', 'stock_state', 'date')
+    list_select_related = ('product',)
+    search_fields = ('product__name',)
+    date_hierarchy = 'date'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Wishlist)
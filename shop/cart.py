@@ -0,0 +1,214 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Sum
+from django.utils import timezone
+
+from .models import Cart, CartItem, Order, Product
+
+
+# Session keys under which the cart id and cart summary are stored
+CART_ID_SESSION_KEY = 'shop_cart_id'
+CART_SUMMARY_SESSION_KEY = 'shop_cart_summary'
+
+
+def empty_cart_summary():
+	return {'item_count': 0, 'line_count': 0, 'total': '0'}
+
+
+def get_cart(request):
+	"""
+	Return the Cart for the current session, or None.
+	The cart id remembered in the session is the key, since it survives the
+	session key change at login; older sessions are matched by session key.
+	"""
+	cart_id = request.session.get(CART_ID_SESSION_KEY)
+	if cart_id is not None:
+		return Cart.objects.filter(pk=cart_id).first()
+	session_key = request.session.session_key
+	if not session_key:
+		return None
+	return Cart.objects.filter(session_key=session_key).first()
+
+
+def get_or_create_cart_id(request):
+	"""
+	Return the id of the session's cart, creating the cart if needed.
+	The id is remembered in the session so repeat calls run no query.
+	"""
+	cart_id = request.session.get(CART_ID_SESSION_KEY)
+	if cart_id is not None:
+		return cart_id
+	if not request.session.session_key:
+		request.session.save()
+	cart, created = Cart.objects.get_or_create(session_key=request.session.session_key)
+	request.session[CART_ID_SESSION_KEY] = cart.pk
+	return cart.pk
+
+
+def add_item(cart_id, product_id, quantity=1):
+	"""
+	Add quantity of a product to a cart.
+
+	Existing lines are incremented with a single UPDATE ... SET quantity =
+	quantity + n, so concurrent adds never lose updates. New lines are
+	inserted with ignore_conflicts and fall back to the UPDATE if another
+	request inserted the same line first. Raises Product.DoesNotExist for
+	unknown or inactive products and Cart.DoesNotExist for a stale cart id.
+	"""
+	lines = CartItem.objects.filter(cart_id=cart_id, product_id=product_id)
+	if lines.update(quantity=F('quantity') + quantity):
+		return
+	with transaction.atomic():
+		if not Product.objects.filter(pk=product_id, is_active=True).exists():
+			raise Product.DoesNotExist(product_id)
+		if not Cart.objects.filter(pk=cart_id).exists():
+			raise Cart.DoesNotExist(cart_id)
+		CartItem.objects.bulk_create(
+			[CartItem(cart_id=cart_id, product_id=product_id, quantity=0)],
+			ignore_conflicts=True,
+		)
+		lines.update(quantity=F('quantity') + quantity)
+
+
+def add_to_session_cart(request, product_id, quantity=1):
+	"""
+	Add a product to the session's cart and return the cart id
+	"""
+	cart_id = get_or_create_cart_id(request)
+	try:
+		add_item(cart_id, product_id, quantity)
+	except Cart.DoesNotExist:
+		# The remembered cart was removed (checkout or cleanup); start a new one
+		request.session.pop(CART_ID_SESSION_KEY, None)
+		cart_id = get_or_create_cart_id(request)
+		add_item(cart_id, product_id, quantity)
+	return cart_id
+
+
+def update_quantities(cart_id, quantities):
+	"""
+	Apply {item_id: quantity} to a cart's lines: changed lines are written
+	with one bulk_update and lines set to zero or less are removed with
+	one DELETE. Returns the number of lines changed or removed.
+	"""
+	if not quantities:
+		return 0
+	changed, removed = [], []
+	with transaction.atomic():
+		items = CartItem.objects.filter(cart_id=cart_id, pk__in=quantities.keys()).only('id', 'quantity')
+		for item in items:
+			new_quantity = quantities[item.pk]
+			if new_quantity <= 0:
+				removed.append(item.pk)
+			elif new_quantity != item.quantity:
+				item.quantity = new_quantity
+				changed.append(item)
+		if changed:
+			CartItem.objects.bulk_update(changed, ['quantity'])
+		if removed:
+			CartItem.objects.filter(pk__in=removed).delete()
+	return len(changed) + len(removed)
+
+
+def build_cart_summary(cart):
+	"""
+	Compute item count, line count and total for a cart in a single query
+	"""
+	if cart is None:
+		return empty_cart_summary()
+	totals = CartItem.objects.filter(cart=cart).aggregate(
+		item_count=Sum('quantity'),
+		line_count=Count('id'),
+		# In the base currency (see shop.currency)
+		total=Sum(F('quantity') * F('product__base_price')),
+	)
+	return {
+		'item_count': totals['item_count'] or 0,
+		'line_count': totals['line_count'] or 0,
+		'total': str(totals['total'] or Decimal('0')),
+	}
+
+
+def refresh_cart_summary(request, cart=None):
+	"""
+	Recompute the cart summary and store it in the session.
+	Call this after any change to the session's cart; cart may be a Cart or its id.
+	"""
+	if cart is None:
+		cart = request.session.get(CART_ID_SESSION_KEY) or get_cart(request)
+	summary = build_cart_summary(cart)
+	request.session[CART_SUMMARY_SESSION_KEY] = summary
+	return summary
+
+
+def clear_cart_summary(request):
+	request.session.pop(CART_ID_SESSION_KEY, None)
+	request.session[CART_SUMMARY_SESSION_KEY] = empty_cart_summary()
+
+
+def get_cart_summary(request):
+	"""
+	Return the cached cart summary for the session.
+	Sessions without a cart never touch the cart tables; sessions created
+	before the summary existed are backfilled once.
+	"""
+	summary = request.session.get(CART_SUMMARY_SESSION_KEY)
+	if summary is None:
+		if not request.session.session_key:
+			return empty_cart_summary()
+		summary = refresh_cart_summary(request)
+	return summary
+
+
+def abandoned_carts(max_age_days=None, now=None):
+	"""
+	Carts older than max_age_days (SHOP_CART_MAX_AGE_DAYS, default 30) that no order refers to
+	"""
+	if max_age_days is None:
+		max_age_days = getattr(settings, 'SHOP_CART_MAX_AGE_DAYS', 30)
+	cutoff = (now or timezone.now()) - timedelta(days=max_age_days)
+	return Cart.objects.filter(created_at__lt=cutoff).exclude(
+		Exists(Order.objects.filter(cart=OuterRef('pk')))
+	)
+
+
+def _delete_in_chunks(queryset, chunk_size, delete_chunk):
+	deleted = 0
+	while True:
+		ids = list(queryset.values_list('pk', flat=True)[:chunk_size])
+		if not ids:
+			return deleted
+		# One short transaction per chunk so the tables are never locked for long
+		with transaction.atomic():
+			deleted += delete_chunk(ids)
+
+
+def sweep_abandoned_carts(max_age_days=None, chunk_size=1000, now=None):
+	"""
+	Delete abandoned carts with their items, and expired database sessions,
+	chunk_size rows at a time. Returns the rows deleted per table, e.g.
+	{'carts': 12, 'cart_items': 30, 'sessions': 40}.
+
+	This is the scheduler hook: call it from cron (via the sweep_abandoned_carts
+	command) or from any periodic task runner.
+	"""
+	now = now or timezone.now()
+	reclaimed = {'carts': 0, 'cart_items': 0, 'sessions': 0}
+
+	def delete_carts(ids):
+		reclaimed['cart_items'] += CartItem.objects.filter(cart_id__in=ids).delete()[0]
+		return Cart.objects.filter(pk__in=ids).delete()[0]
+
+	reclaimed['carts'] = _delete_in_chunks(abandoned_carts(max_age_days, now), chunk_size, delete_carts)
+
+	if settings.SESSION_ENGINE == 'django.contrib.sessions.backends.db':
+		reclaimed['sessions'] = _delete_in_chunks(
+			Session.objects.filter(expire_date__lt=now),
+			chunk_size,
+			lambda keys: Session.objects.filter(pk__in=keys).delete()[0],
+		)
+	return reclaimed
@@ -0,0 +1,83 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Q
+
+from .models import Product, ProductCategory
+
+
+CATEGORY_CATALOG_CACHE_KEY = 'shop:category_catalog'
+
+# Product page cache versions: one for the whole catalog (products, categories,
+# related products) and one per product slug (reviews, ratings, stock)
+PRODUCT_PAGES_VERSION_KEY = 'shop:product_pages_version'
+PRODUCT_PAGE_VERSION_KEY = 'shop:product_page_version:{slug}'
+
+
+def annotate_product_counts(queryset):
+	"""
+	Annotate categories with their number of active products
+	"""
+	return queryset.annotate(
+		active_product_count=Count('products', filter=Q(products__is_active=True))
+	)
+
+
+def get_category_catalog():
+	"""
+	Return active categories with active product counts.
+	Built from one grouped query and cached until a product or category changes.
+	"""
+	categories = cache.get(CATEGORY_CATALOG_CACHE_KEY)
+	if categories is None:
+		categories = list(annotate_product_counts(ProductCategory.objects.filter(is_active=True)))
+		cache.set(
+			CATEGORY_CATALOG_CACHE_KEY,
+			categories,
+			getattr(settings, 'SHOP_CATALOG_CACHE_TIMEOUT', 60 * 60),
+		)
+	return categories
+
+
+def invalidate_category_catalog():
+	cache.delete(CATEGORY_CATALOG_CACHE_KEY)
+
+
+def _new_version():
+	# Time based, so a version lost from the cache never matches old pages again
+	return time.time_ns()
+
+
+def product_page_cache_key(slug):
+	"""
+	Cache key for a product page's rendered body, including the catalog and product versions
+	"""
+	product_key = PRODUCT_PAGE_VERSION_KEY.format(slug=slug)
+	versions = cache.get_many([PRODUCT_PAGES_VERSION_KEY, product_key])
+	missing = {key: _new_version() for key in (PRODUCT_PAGES_VERSION_KEY, product_key) if key not in versions}
+	if missing:
+		cache.set_many(missing, None)
+		versions.update(missing)
+	return f'shop:product_page:{slug}:{versions[PRODUCT_PAGES_VERSION_KEY]}:{versions[product_key]}'
+
+
+def invalidate_product_pages():
+	"""
+	Drop every cached product page, e.g. after product or category changes
+	"""
+	cache.set(PRODUCT_PAGES_VERSION_KEY, _new_version(), None)
+
+
+def invalidate_product_page(*product_ids):
+	"""
+	Drop the cached pages of the given products (one slug lookup)
+	"""
+	invalidate_product_page_slugs(*Product.objects.filter(pk__in=product_ids).values_list('slug', flat=True))
+
+
+def invalidate_product_page_slugs(*slugs):
+	"""
+	Drop the cached pages of the given product slugs, without touching the database
+	"""
+	cache.set_many({PRODUCT_PAGE_VERSION_KEY.format(slug=slug): _new_version() for slug in slugs}, None)
@@ -0,0 +1,20 @@
+from django.utils.functional import SimpleLazyObject
+
+from .cart import get_cart_summary
+from .currency import base_currency
+
+
+def cart_summary(request):
+    """
+    Add the session's cart summary to template context. Lazy, so pages that
+    never show the cart leave the session (and Vary: Cookie) untouched.
+    """
+    if not hasattr(request, 'session'):
+        return {}
+    summary = SimpleLazyObject(lambda: get_cart_summary(request))
+    return {
+        'cart_summary': summary,
+        'cart_count': SimpleLazyObject(lambda: summary['item_count']),
+        # Currency of cart and order totals
+        'base_currency': base_currency(),
+    }
@@ -0,0 +1,113 @@
+"""
+Exchange rates and base-currency prices.
+
+Every product stores base_price, its price converted to SHOP_BASE_CURRENCY,
+so price sorting, price filters and cart totals compare like with like using
+one indexed column. Rates live in ExchangeRate (see the load_exchange_rates
+command) and are read through a per-process copy, reloaded when the newest
+updated_at or the number of rows in ExchangeRate changes. The version lives
+in the database rather than the cache, so web workers see rates loaded by a
+management command even with a per-process cache.
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Max, Value
+from django.db.models.functions import Round
+
+from .models import ExchangeRate, Product
+
+
+CENT = Decimal('0.01')
+
+
+class MissingExchangeRate(Exception):
+	def __init__(self, currency):
+		self.currency = currency
+		super().__init__(f"No exchange rate for {currency}")
+
+
+_rates = None
+_rates_version = None
+
+
+def base_currency():
+	return getattr(settings, 'SHOP_BASE_CURRENCY', 'RWF')
+
+
+def get_rates():
+	"""
+	Return {currency: rate to the base currency}, the base currency included
+	"""
+	global _rates, _rates_version
+	version = ExchangeRate.objects.aggregate(latest=Max('updated_at'), rows=Count('pk'))
+	if _rates is None or _rates_version != version:
+		rates = dict(ExchangeRate.objects.values_list('currency', 'rate'))
+		rates[base_currency()] = Decimal('1')
+		_rates, _rates_version = rates, version
+	return _rates
+
+
+def to_base(amount, currency):
+	"""
+	Convert amount in currency to the base currency, or None without a rate
+	"""
+	if amount is None:
+		return None
+	rate = get_rates().get(currency)
+	if rate is None:
+		return None
+	return (Decimal(amount) * rate).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def set_base_price(product):
+	"""
+	Fill product.base_price from its price and currency (does not save)
+	"""
+	product.base_price = to_base(product.price, product.currency)
+
+
+def set_exchange_rates(rates):
+	"""
+	Store {currency: rate} and recompute base_price of the products priced in
+	those currencies with one UPDATE per currency. Returns the number of
+	products updated.
+	"""
+	rates = {currency: Decimal(rate) for currency, rate in rates.items() if currency != base_currency()}
+	with transaction.atomic():
+		for currency, rate in rates.items():
+			ExchangeRate.objects.update_or_create(currency=currency, defaults={'rate': rate})
+		return reprice_products(rates)
+
+
+def reprice_products(currencies):
+	"""
+	Recompute base_price of the products priced in currencies from the stored
+	rates, with one UPDATE per currency; a currency without a rate leaves its
+	products unpriced. Returns the number of products updated.
+	"""
+	rates = dict(ExchangeRate.objects.filter(currency__in=currencies).values_list('currency', 'rate'))
+	updated = 0
+	for currency in currencies:
+		if currency == base_currency():
+			continue
+		rate = rates.get(currency)
+		updated += Product.objects.filter(currency=currency).update(
+			base_price=None if rate is None else Round(F('price') * Value(rate, output_field=DecimalField()), 2)
+		)
+	return updated
+
+
+def cart_total(items):
+	"""
+	Total of cart items in the base currency. Raises MissingExchangeRate if
+	a product's currency has no rate.
+	"""
+	total = Decimal('0')
+	for item in items:
+		base_price = item.product.base_price
+		if base_price is None:
+			raise MissingExchangeRate(item.product.currency)
+		total += base_price * item.quantity
+	return total
@@ -1,6 +1,6 @@
 from django import forms
 from django.utils.translation import gettext_lazy as _
-from .models import Order, OrderItem, Product
+from .models import ExchangeRate, Order, OrderItem, Product
 #from django_countries.fields import CountryField
 #from django_countries.widgets import CountrySelectWidget
 
@@ -223,4 +223,36 @@ class ProductFilterForm(forms.Form):
     def __init__(self, *args, **kwargs):
         from .models import ProductCategory
         super().__init__(*args, **kwargs)
-        self.fields['category'].queryset = ProductCategory.objects.filter(is_active=True)
\ No newline at end of file
+        self.fields['category'].queryset = ProductCategory.objects.filter(is_active=True)
+
+class CatalogImportForm(forms.Form):
+    file = forms.FileField(
+        label=_('Catalog file'),
+        help_text=_('CSV or JSON Lines (.jsonl) with a slug or name column per product')
+    )
+    dry_run = forms.BooleanField(
+        required=False,
+        initial=True,
+        label=_('Dry run'),
+        help_text=_('Validate and report changes without saving them')
+    )
+
+    def clean_file(self):
+        from .importer import file_format_for
+        upload = self.cleaned_data['file']
+        if file_format_for(upload.name) is None:
+            raise forms.ValidationError(_('Upload a .csv or .jsonl file.'))
+        return upload
+
+
+class ExchangeRateForm(forms.ModelForm):
+    class Meta:
+        model = ExchangeRate
+        fields = ['currency', 'rate']
+
+    def clean_currency(self):
+        from .currency import base_currency
+        currency = self.cleaned_data['currency']
+        if currency == base_currency():
+            raise forms.ValidationError(_('%(currency)s is the base currency; its rate is always 1.'), params={'currency': currency})
+        return currency
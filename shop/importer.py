@@ -0,0 +1,266 @@
+"""
+Bulk catalog import from CSV or JSON Lines.
+
+Rows are validated one at a time as the file is read and written in chunks:
+each chunk looks up its existing products by slug with one query, then goes
+out as one bulk_create() for new products and one bulk_update() for changed
+ones. Categories are resolved from their slugs with a single lookup up front.
+
+A row needs a slug or a name (the slug is then derived from the name) and
+may carry any of IMPORT_FIELDS; only the columns present are changed on an
+existing product, so a file with just slug and price is a price update. New
+products also need a name and a price.
+
+The import runs in one transaction and is all or nothing: when any row is
+invalid nothing is written and every error is reported, including a file
+that is not UTF-8 or not valid CSV. Bulk writes bypass model signals, so
+base prices and stock states are set here; afterwards the search index is
+updated for the imported products only, those whose related products may
+change are marked stale for refresh_related_products, and the catalog caches
+are dropped.
+"""
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from .catalog import invalidate_category_catalog, invalidate_product_pages
+from .currency import set_base_price
+from .inventory import set_stock_state
+from .models import Product, ProductCategory
+from .related import SCORING_FIELDS, mark_related_stale
+from .search import get_search_backend
+
+
+IMPORT_FIELDS = [
+	'slug', 'name', 'description', 'category', 'price', 'compare_price', 'currency',
+	'stock_quantity', 'show_stock_publicly', 'is_active', 'is_featured', 'is_new',
+]
+
+IMPORT_CHUNK_SIZE = 500
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+
+class ImportResult:
+	def __init__(self, dry_run=False):
+		self.dry_run = dry_run
+		self.created = 0
+		self.updated = 0
+		self.unchanged = 0
+		# (line number, message)
+		self.errors = []
+		# Slugs of the products created or updated, and of those whose related products may change
+		self.written_slugs = []
+		self.related_slugs = []
+
+	@property
+	def ok(self):
+		return not self.errors
+
+	def add_error(self, line, message):
+		self.errors.append((line, message))
+
+
+def read_rows(stream, file_format):
+	"""
+	Yield (line number, row dict) from a text stream in 'csv' or 'jsonl'
+	format. Lines that cannot be parsed come back as (line number, error message).
+	"""
+	if file_format == 'csv':
+		reader = csv.DictReader(stream)
+		try:
+			for row in reader:
+				yield reader.line_num, row
+		except UnicodeDecodeError as e:
+			yield reader.line_num + 1, f'The file is not UTF-8 text: {e}'
+		except csv.Error as e:
+			yield reader.line_num, f'Invalid CSV: {e}'
+	elif file_format == 'jsonl':
+		line_num = 0
+		try:
+			for line in stream:
+				line_num += 1
+				if not line.strip():
+					continue
+				try:
+					row = json.loads(line)
+				except ValueError as e:
+					yield line_num, f'Invalid JSON: {e}'
+					continue
+				yield line_num, row if isinstance(row, dict) else 'Expected a JSON object'
+		except UnicodeDecodeError as e:
+			yield line_num + 1, f'The file is not UTF-8 text: {e}'
+	else:
+		raise ValueError(f'Unsupported catalog format: {file_format}')
+
+
+def file_format_for(filename):
+	"""
+	Catalog format from a file name: 'csv' or 'jsonl' (.jsonl or .ndjson), None otherwise
+	"""
+	name = filename.lower()
+	if name.endswith('.csv'):
+		return 'csv'
+	if name.endswith(('.jsonl', '.ndjson')):
+		return 'jsonl'
+	return None
+
+
+def _clean_value(field, value):
+	if isinstance(value, str):
+		value = value.strip()
+		if isinstance(field, models.BooleanField):
+			lowered = value.lower()
+			if lowered in TRUE_VALUES:
+				value = True
+			elif lowered in FALSE_VALUES:
+				value = False
+	if value in ('', None) and field.null:
+		return None
+	if value is None:
+		value = ''
+	return field.clean(value, None)
+
+
+def clean_row(row, categories):
+	"""
+	Validate one row. Returns (slug, values) with values keyed by model field
+	name; raises ValidationError listing every invalid column.
+	"""
+	values = {}
+	errors = []
+	for column in IMPORT_FIELDS:
+		if column not in row:
+			continue
+		value = row[column]
+		if column == 'category':
+			if value is not None and not isinstance(value, str):
+				errors.append('category: expected a category slug')
+				continue
+			category_slug = (value or '').strip()
+			if not category_slug:
+				values['category_id'] = None
+			elif category_slug in categories:
+				values['category_id'] = categories[category_slug]
+			else:
+				errors.append(f'category: unknown category "{category_slug}"')
+			continue
+		try:
+			values[column] = _clean_value(Product._meta.get_field(column), value)
+		except ValidationError as e:
+			errors.append(f'{column}: {" ".join(e.messages)}')
+	slug = values.pop('slug', None) or slugify(values.get('name') or '')
+	if not slug and not errors:
+		errors.append('slug or name is required')
+	if errors:
+		raise ValidationError(errors)
+	return slug, values
+
+
+def _apply_chunk(chunk, result, write):
+	"""
+	Create or update the products of one chunk of (line, slug, values)
+	"""
+	existing = Product.objects.in_bulk([slug for _, slug, _ in chunk], field_name='slug')
+	creates, updates, update_fields = [], [], set()
+	now = timezone.now()
+	for line, slug, values in chunk:
+		product = existing.get(slug)
+		if product is None:
+			missing = [field for field in ('name', 'price') if values.get(field) in (None, '')]
+			if missing:
+				result.add_error(line, f'new product "{slug}" needs {" and ".join(missing)}')
+				continue
+			product = Product(slug=slug, **values)
+			set_base_price(product)
+			set_stock_state(product)
+			creates.append(product)
+			result.related_slugs.append(slug)
+			continue
+		changed = [field for field, value in values.items() if getattr(product, field) != value]
+		if not changed:
+			result.unchanged += 1
+			continue
+		for field in changed:
+			setattr(product, field, values[field])
+		if 'price' in changed or 'currency' in changed:
+			set_base_price(product)
+			changed.append('base_price')
+		if 'stock_quantity' in changed:
+			set_stock_state(product)
+			changed.append('stock_state')
+		# bulk_update() skips auto_now
+		product.updated_at = now
+		update_fields.update(changed)
+		updates.append(product)
+		if set(changed) & set(SCORING_FIELDS):
+			result.related_slugs.append(slug)
+
+	if write and result.ok:
+		Product.objects.bulk_create(creates)
+		if updates:
+			Product.objects.bulk_update(updates, sorted(update_fields) + ['updated_at'])
+	result.created += len(creates)
+	result.updated += len(updates)
+	result.written_slugs.extend(product.slug for product in creates + updates)
+
+
+def _ids_for(slugs, chunk_size=IMPORT_CHUNK_SIZE):
+	# Looked up by slug, since bulk_create() does not set primary keys on every database
+	for start in range(0, len(slugs), chunk_size):
+		yield list(Product.objects.filter(slug__in=slugs[start:start + chunk_size]).values_list('pk', flat=True))
+
+
+def refresh_after_import(result):
+	"""
+	Do for the imported products what model signals would have done
+	"""
+	backend = get_search_backend()
+	for product_ids in _ids_for(result.written_slugs):
+		backend.index_products(product_ids)
+	for product_ids in _ids_for(result.related_slugs):
+		mark_related_stale(product_ids)
+	invalidate_category_catalog()
+	invalidate_product_pages()
+
+
+def import_catalog(rows, dry_run=False, chunk_size=IMPORT_CHUNK_SIZE):
+	"""
+	Import (line number, row) pairs as produced by read_rows(). Nothing is
+	written when dry_run is set or when any row is invalid. Returns an ImportResult.
+	"""
+	result = ImportResult(dry_run=dry_run)
+	categories = dict(ProductCategory.objects.values_list('slug', 'pk'))
+	seen = set()
+	chunk = []
+	with transaction.atomic():
+		for line, row in rows:
+			if isinstance(row, str):
+				result.add_error(line, row)
+				continue
+			try:
+				slug, values = clean_row(row, categories)
+			except ValidationError as e:
+				result.add_error(line, '; '.join(e.messages))
+				continue
+			if slug in seen:
+				result.add_error(line, f'duplicate slug "{slug}"')
+				continue
+			seen.add(slug)
+			chunk.append((line, slug, values))
+			if len(chunk) >= chunk_size:
+				_apply_chunk(chunk, result, not dry_run)
+				chunk = []
+		if chunk:
+			_apply_chunk(chunk, result, not dry_run)
+		if not result.ok:
+			transaction.set_rollback(True)
+
+	if result.ok and not dry_run and (result.created or result.updated):
+		refresh_after_import(result)
+	return result
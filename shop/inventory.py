@@ -0,0 +1,151 @@
+"""
+Stock state and daily inventory snapshots.
+
+Product.stock_state (untracked, in_stock, low or out) is derived from
+stock_quantity whenever stock changes, so pages and the admin read one stored
+column instead of comparing quantities per product. Low means at most
+SHOP_LOW_STOCK_THRESHOLD (default 10) units left.
+
+take_inventory_snapshot() runs once a day (see the snapshot_inventory
+command): it records every product's stock, units sold over the last
+SHOP_SELL_THROUGH_DAYS (default 30) days, sell-through rate and days of cover,
+and emails one digest listing the products that newly need restocking, that
+is products that went low or out of stock or whose cover fell below
+SHOP_LOW_STOCK_COVER_DAYS (default 7) since the previous snapshot.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.db.models import Case, Sum, Value, When
+from django.utils import timezone
+
+from .models import InventorySnapshot, Product, ProductSalesDaily
+from .sales import refresh_sales_rollups
+
+
+def low_stock_threshold():
+	return getattr(settings, 'SHOP_LOW_STOCK_THRESHOLD', 10)
+
+
+def stock_state_for(quantity):
+	if quantity is None:
+		return "untracked"
+	if quantity <= 0:
+		return "out"
+	if quantity <= low_stock_threshold():
+		return "low"
+	return "in_stock"
+
+
+def set_stock_state(product):
+	"""
+	Fill product.stock_state from its stock_quantity (does not save)
+	"""
+	product.stock_state = stock_state_for(product.stock_quantity)
+
+
+def stock_state_expression():
+	"""
+	SQL equivalent of stock_state_for() over the stock_quantity column
+	"""
+	return Case(
+		When(stock_quantity__isnull=True, then=Value("untracked")),
+		When(stock_quantity__lte=0, then=Value("out")),
+		When(stock_quantity__lte=low_stock_threshold(), then=Value("low")),
+		default=Value("in_stock"),
+	)
+
+
+def refresh_stock_states(product_ids=None):
+	"""
+	Recompute stock_state in one UPDATE, for product_ids or every product.
+	Call after changing stock_quantity with queryset.update(). Products whose
+	state changes get a new updated_at, so catalog feed clients see it.
+	"""
+	products = Product.objects.all()
+	if product_ids is not None:
+		products = products.filter(pk__in=product_ids)
+	return products.exclude(stock_state=stock_state_expression()).update(
+		stock_state=stock_state_expression(), updated_at=timezone.now(),
+	)
+
+
+def _needs_restock(stock_state, days_of_cover):
+	if stock_state in ("low", "out"):
+		return True
+	cover_days = getattr(settings, 'SHOP_LOW_STOCK_COVER_DAYS', 7)
+	return days_of_cover is not None and days_of_cover < cover_days
+
+
+def take_inventory_snapshot(today=None):
+	"""
+	Store today's snapshot of every product, replacing one taken earlier the
+	same day, and email the restock digest. Returns the new snapshots of
+	products that newly need restocking.
+	"""
+	today = today or timezone.localdate()
+	window = getattr(settings, 'SHOP_SELL_THROUGH_DAYS', 30)
+	refresh_sales_rollups()
+	refresh_stock_states()
+
+	sold = dict(
+		ProductSalesDaily.objects.filter(date__gt=today - timedelta(days=window), date__lte=today, product__isnull=False)
+		.values_list('product').annotate(units=Sum('units')).order_by()
+	)
+	previous = {
+		snapshot.product_id: snapshot.needs_restock
+		for snapshot in InventorySnapshot.objects.filter(
+			date=InventorySnapshot.objects.filter(date__lt=today).order_by('-date').values('date')[:1]
+		).only('product_id', 'needs_restock')
+	}
+
+	snapshots, alerts = [], []
+	for product in Product.objects.only('id', 'name', 'stock_quantity', 'stock_state').iterator():
+		units_sold = sold.get(product.pk, 0)
+		quantity = product.stock_quantity
+		sell_through = days_of_cover = None
+		if quantity is not None:
+			available = units_sold + max(quantity, 0)
+			if available:
+				sell_through = (Decimal(100) * units_sold / available).quantize(Decimal('0.01'))
+			if units_sold:
+				days_of_cover = (Decimal(max(quantity, 0)) * window / units_sold).quantize(Decimal('0.1'))
+		snapshot = InventorySnapshot(
+			date=today, product=product, stock_quantity=quantity, stock_state=product.stock_state,
+			units_sold=units_sold, sell_through=sell_through, days_of_cover=days_of_cover,
+			needs_restock=_needs_restock(product.stock_state, days_of_cover),
+		)
+		snapshots.append(snapshot)
+		if snapshot.needs_restock and not previous.get(product.pk, False):
+			alerts.append(snapshot)
+
+	with transaction.atomic():
+		InventorySnapshot.objects.filter(date=today).delete()
+		InventorySnapshot.objects.bulk_create(snapshots, batch_size=1000)
+	if alerts:
+		send_restock_digest(alerts)
+	return alerts
+
+
+def send_restock_digest(snapshots):
+	"""
+	Email the shop team one message listing products that need restocking
+	"""
+	lines = [f"{len(snapshots)} products need restocking:\n"]
+	for snapshot in snapshots:
+		quantity = "not tracked" if snapshot.stock_quantity is None else f"{snapshot.stock_quantity} left"
+		cover = "" if snapshot.days_of_cover is None else f", {snapshot.days_of_cover} days of cover"
+		lines.append(
+			f"- {snapshot.product.name}: {snapshot.get_stock_state_display()} ({quantity}{cover}, "
+			f"{snapshot.units_sold} sold in the last {getattr(settings, 'SHOP_SELL_THROUGH_DAYS', 30)} days)"
+		)
+	send_mail(
+		subject=f"Shop restock digest for {snapshots[0].date:%Y-%m-%d}",
+		message="\n".join(lines),
+		from_email=settings.DEFAULT_FROM_EMAIL,
+		recipient_list=[settings.CONTACT_NOTIFICATION_EMAIL],
+		fail_silently=True,
+	)
@@ -0,0 +1,63 @@
+"""
+Django management command to import products from a CSV or JSON Lines file.
+
+Creates new products and updates existing ones (matched by slug) with bulk
+queries inside one transaction. Columns: slug, name, description, category
+(category slug), price, compare_price, currency, stock_quantity,
+show_stock_publicly, is_active, is_featured, is_new. Only the columns present
+are changed, so a file of slug,price rows is a price update. When any row is
+invalid nothing is written and every error is listed.
+
+Usage:
+    python manage.py import_catalog catalog.csv
+    python manage.py import_catalog prices.jsonl --dry-run
+    python manage.py import_catalog export.txt --format csv --chunk-size 1000
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.importer import IMPORT_CHUNK_SIZE, file_format_for, import_catalog, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Create and update shop products from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON Lines file to import')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'jsonl'],
+            default=None,
+            help='File format (default: from the file extension)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Validate the file and report what would change without writing',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=IMPORT_CHUNK_SIZE,
+            help=f'Number of rows written per bulk query (default: {IMPORT_CHUNK_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or file_format_for(options['path'])
+        if file_format is None:
+            raise CommandError('Cannot tell the file format from its name, pass --format csv or --format jsonl')
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = import_catalog(read_rows(stream, file_format), options['dry_run'], options['chunk_size'])
+        except OSError as e:
+            raise CommandError(f'Cannot read {options["path"]}: {e}')
+
+        for line, message in result.errors:
+            self.stderr.write(f'Line {line}: {message}')
+        summary = f'{result.created} created, {result.updated} updated, {result.unchanged} unchanged'
+        if not result.ok:
+            raise CommandError(f'{len(result.errors)} invalid rows, nothing imported ({summary} otherwise)')
+        if result.dry_run:
+            self.stdout.write(self.style.SUCCESS(f'Dry run, nothing written: {summary}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Imported catalog: {summary}'))
@@ -0,0 +1,66 @@
+"""
+Django management command to load exchange rates to the shop's base currency.
+
+Stores one rate per currency (units of SHOP_BASE_CURRENCY per unit of the
+currency) and recomputes the base-currency price of every product priced in
+it, which product sorting, price filters and cart totals use. Rates come as
+CURRENCY=RATE arguments or from a JSON file mapping currency to rate.
+
+Usage:
+    python manage.py load_exchange_rates USD=1450 EUR=1580.5
+    python manage.py load_exchange_rates --file rates.json
+"""
+
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.currency import base_currency, set_exchange_rates
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Load exchange rates to the base currency and refresh product base prices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('rates', nargs='*', help='Rates as CURRENCY=RATE, e.g. USD=1450')
+        parser.add_argument('--file', help='JSON file mapping currency codes to rates')
+
+    def parse_rates(self, options):
+        pairs = []
+        if options['file']:
+            try:
+                with open(options['file']) as f:
+                    pairs.extend(json.load(f).items())
+            except (OSError, ValueError, AttributeError) as e:
+                raise CommandError(f'Cannot read rates from {options["file"]}: {e}')
+        for argument in options['rates']:
+            currency, sep, rate = argument.partition('=')
+            if not sep:
+                raise CommandError(f'Expected CURRENCY=RATE, got "{argument}"')
+            pairs.append((currency, rate))
+
+        currencies = {code for code, _ in Product.CURRENCY_CHOICES}
+        rates = {}
+        for currency, rate in pairs:
+            currency = currency.strip().upper()
+            if currency not in currencies:
+                raise CommandError(f'Unknown currency "{currency}"')
+            try:
+                rate = Decimal(str(rate))
+            except InvalidOperation:
+                raise CommandError(f'Invalid rate for {currency}: "{rate}"')
+            if not rate > 0:
+                raise CommandError(f'Rate for {currency} must be positive')
+            rates[currency] = rate
+        return rates
+
+    def handle(self, *args, **options):
+        rates = self.parse_rates(options)
+        if not rates:
+            raise CommandError('No rates given')
+        updated = set_exchange_rates(rates)
+        self.stdout.write(self.style.SUCCESS(
+            f'Loaded {len(rates)} rates to {base_currency()} and repriced {updated} products'
+        ))
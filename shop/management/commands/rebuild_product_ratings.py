@@ -0,0 +1,30 @@
+"""
+Django management command to rebuild the stored product rating summaries.
+
+Recomputes rating_average, rating_count and rating_histogram for every product
+from approved reviews in one grouped query. Use after bulk review imports or
+queryset.update() calls that bypass the review signals.
+
+Usage:
+    python manage.py rebuild_product_ratings
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.ratings import recompute_all_ratings
+
+
+class Command(BaseCommand):
+    help = 'Rebuild stored product rating summaries from approved reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Number of products written per UPDATE batch (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        updated = recompute_all_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt rating summaries for {updated} products'))
@@ -0,0 +1,23 @@
+"""
+Django management command to rebuild the related-products index.
+
+Scores every pair of active products from co-purchases in orders and carts,
+shared category and price similarity, and stores the best matches for each
+product. Product changes, imported ones included, are picked up by
+refresh_related_products; run this nightly so new orders are reflected.
+
+Usage:
+    python manage.py rebuild_related_products
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.related import rebuild_related_products
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed related-products index'
+
+    def handle(self, *args, **options):
+        written = rebuild_related_products()
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} related-product entries'))
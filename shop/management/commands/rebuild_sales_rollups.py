@@ -0,0 +1,22 @@
+"""
+Django management command to rebuild the daily sales rollups from all orders.
+
+Clears the product and category rollups and recomputes them from every paid
+order. Run it once after deploying the rollups, and after order statuses or
+product categories are changed by hand.
+
+Usage:
+    python manage.py rebuild_sales_rollups
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.sales import rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the daily sales rollups from order history'
+
+    def handle(self, *args, **options):
+        added = rebuild_sales_rollups()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt the sales rollups from {added} paid orders'))
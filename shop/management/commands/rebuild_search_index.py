@@ -0,0 +1,23 @@
+"""
+Django management command to rebuild the shop product search index.
+
+Repopulates the FTS5 table on SQLite or refreshes the in-process index used by
+the Python fallback. MySQL maintains its FULLTEXT indexes itself. Run after
+bulk changes that bypass model signals (queryset.update(), raw SQL, imports).
+
+Usage:
+    python manage.py rebuild_search_index
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the shop product search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        indexed = backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products with the {backend.name} search backend'))
@@ -0,0 +1,25 @@
+"""
+Django management command to refresh the related-products entries of changed
+products.
+
+Product saves that change a category, base price or active flag only mark the
+product stale; this recomputes the lists those products can affect in one pass
+and clears the marks. Run it from cron, e.g.
+
+    */10 * * * * cd /path/to/site && python manage.py refresh_related_products
+
+Usage:
+    python manage.py refresh_related_products
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.related import refresh_stale_related
+
+
+class Command(BaseCommand):
+    help = 'Recompute the related products affected by products changed since the last run'
+
+    def handle(self, *args, **options):
+        refreshed = refresh_stale_related()
+        self.stdout.write(self.style.SUCCESS(f'Refreshed related products of {refreshed} products'))
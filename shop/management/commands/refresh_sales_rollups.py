@@ -0,0 +1,32 @@
+"""
+Django management command to add new orders to the daily sales rollups.
+
+Processes the orders placed since the previous run (tracked by order id), so
+it stays cheap however much history there is. Run it from cron, e.g.
+
+    */15 * * * * cd /path/to/site && python manage.py refresh_sales_rollups
+
+Usage:
+    python manage.py refresh_sales_rollups
+    python manage.py refresh_sales_rollups --batch-size 500
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.sales import ROLLUP_BATCH_SIZE, refresh_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Add orders placed since the last run to the daily sales rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=ROLLUP_BATCH_SIZE,
+            help=f'Number of orders processed per transaction (default: {ROLLUP_BATCH_SIZE})',
+        )
+
+    def handle(self, *args, **options):
+        added = refresh_sales_rollups(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Added {added} paid orders to the sales rollups'))
@@ -0,0 +1,21 @@
+"""
+Django management command to return stock held by expired reservations.
+
+Checkout holds stock for SHOP_STOCK_RESERVATION_MINUTES (default 15). Run this
+from cron every few minutes so stock from abandoned payments goes back on sale.
+
+Usage:
+    python manage.py release_expired_reservations
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.stock import release_expired_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release stock held by expired checkout reservations'
+
+    def handle(self, *args, **options):
+        released = release_expired_reservations()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} expired stock reservations'))
@@ -0,0 +1,24 @@
+"""
+Django management command to record the daily inventory snapshot.
+
+Stores every product's stock level, units sold, sell-through rate and days of
+cover for today (replacing an earlier run the same day) and emails one digest
+of the products that newly need restocking. Run it daily from cron, e.g.
+
+    30 6 * * * cd /path/to/site && python manage.py snapshot_inventory
+
+Usage:
+    python manage.py snapshot_inventory
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.inventory import take_inventory_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Snapshot stock levels and email the restock digest'
+
+    def handle(self, *args, **options):
+        alerts = take_inventory_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Inventory snapshot taken, {len(alerts)} products newly need restocking'))
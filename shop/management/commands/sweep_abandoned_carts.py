@@ -0,0 +1,42 @@
+"""
+Django management command to delete abandoned shopping carts.
+
+Removes carts older than SHOP_CART_MAX_AGE_DAYS (default 30) that no order
+refers to, together with their items and expired database sessions, in small
+chunks so the tables are never locked for long. Run it daily from cron, e.g.
+
+    0 3 * * * cd /path/to/site && python manage.py sweep_abandoned_carts
+
+Usage:
+    python manage.py sweep_abandoned_carts
+    python manage.py sweep_abandoned_carts --days 14 --chunk-size 500
+"""
+
+from django.core.management.base import BaseCommand
+
+from shop.cart import sweep_abandoned_carts
+
+
+class Command(BaseCommand):
+    help = 'Delete abandoned carts, their items and expired sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Delete carts older than this many days (default: SHOP_CART_MAX_AGE_DAYS or 30)',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Number of rows deleted per transaction (default: 1000)',
+        )
+
+    def handle(self, *args, **options):
+        reclaimed = sweep_abandoned_carts(options['days'], options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Reclaimed {sum(reclaimed.values())} rows: {reclaimed['carts']} carts, "
+            f"{reclaimed['cart_items']} cart items, {reclaimed['sessions']} expired sessions"
+        ))
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:19
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    ProductReview = apps.get_model('shop', 'ProductReview')
+    histograms = {}
+    rows = (
+        ProductReview.objects.filter(is_approved=True)
+        .values('product_id', 'rating')
+        .annotate(n=Count('id'))
+        .order_by()
+    )
+    for row in rows:
+        histograms.setdefault(row['product_id'], {})[str(row['rating'])] = row['n']
+    products = list(Product.objects.filter(pk__in=histograms.keys()))
+    for product in products:
+        histogram = histograms[product.pk]
+        count = sum(histogram.values())
+        total = sum(int(star) * n for star, n in histogram.items())
+        product.rating_histogram = histogram
+        product.rating_count = count
+        product.rating_average = (Decimal(total) / Decimal(count)).quantize(Decimal('0.01'))
+    Product.objects.bulk_update(products, ['rating_histogram', 'rating_count', 'rating_average'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_wishlist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_average',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_histogram',
+            field=models.JSONField(blank=True, default=dict, help_text='Approved review count per star'),
+        ),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            schema_editor.execute(
+                'CREATE VIRTUAL TABLE shop_product_fts USING fts5(name, description, category)'
+            )
+        except Exception:
+            # SQLite built without FTS5: shop.search falls back to the Python index
+            return
+        schema_editor.execute(
+            'INSERT INTO shop_product_fts (rowid, name, description, category) '
+            "SELECT p.id, p.name, p.description, COALESCE(c.name, '') "
+            'FROM shop_product p LEFT JOIN shop_productcategory c ON c.id = p.category_id'
+        )
+    elif vendor == 'mysql':
+        schema_editor.execute('CREATE FULLTEXT INDEX shop_product_name_ft ON shop_product (name)')
+        schema_editor.execute('CREATE FULLTEXT INDEX shop_product_description_ft ON shop_product (description)')
+        schema_editor.execute('CREATE FULLTEXT INDEX shop_productcategory_name_ft ON shop_productcategory (name)')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS shop_product_fts')
+    elif vendor == 'mysql':
+        schema_editor.execute('DROP INDEX shop_product_name_ft ON shop_product')
+        schema_editor.execute('DROP INDEX shop_product_description_ft ON shop_product')
+        schema_editor.execute('DROP INDEX shop_productcategory_name_ft ON shop_productcategory')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_product_rating_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:24
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    CartItem = apps.get_model('shop', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('cart_id', 'product_id')
+        .annotate(lines=Count('id'), total=Sum('quantity'))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        items = CartItem.objects.filter(cart_id=duplicate['cart_id'], product_id=duplicate['product_id']).order_by('id')
+        keep = items.first()
+        items.exclude(pk=keep.pk).delete()
+        CartItem.objects.filter(pk=keep.pk).update(quantity=duplicate['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('cart', 'product'), name='unique_cart_product'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def snapshot_existing_order_carts(apps, schema_editor):
+    # Orders placed before this migration only keep their cart while it exists
+    Order = apps.get_model('shop', 'Order')
+    OrderItem = apps.get_model('shop', 'OrderItem')
+    CartItem = apps.get_model('shop', 'CartItem')
+    order_ids = dict(Order.objects.filter(cart__isnull=False).values_list('cart_id', 'id'))
+    items = [
+        OrderItem(
+            order_id=order_ids[cart_item.cart_id],
+            product_id=cart_item.product_id,
+            product_name=cart_item.product.name,
+            unit_price=cart_item.product.price,
+            currency=cart_item.product.currency,
+            quantity=cart_item.quantity,
+        )
+        for cart_item in CartItem.objects.filter(cart_id__in=order_ids.keys()).select_related('product')
+    ]
+    OrderItem.objects.bulk_create(items, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_cartitem_unique_cart_product'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_name', models.CharField(max_length=255)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('currency', models.CharField(choices=[('RWF', 'Rwandan Franc'), ('USD', 'US Dollar'), ('EUR', 'Euro'), ('KES', 'Kenyan Shilling'), ('UGX', 'Ugandan Shilling')], default='RWF', max_length=3)),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='shop.order')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_items', to='shop.product')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['product', 'order'], name='shop_orderi_product_573aed_idx')],
+            },
+        ),
+        migrations.RunPython(snapshot_existing_order_carts, migrations.RunPython.noop),
+    ]
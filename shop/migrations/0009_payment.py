@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:29
+
+import django.db.models.deletion
+import shop.models
+from django.db import migrations, models
+
+
+def retire_confirmed_status(apps, schema_editor):
+    # Card and mobile orders used to be stored as "confirmed" once paid inline
+    Order = apps.get_model('shop', 'Order')
+    Order.objects.filter(status='confirmed').update(status='paid')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_stockreservation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('pending_bank_transfer', 'Awaiting Bank Transfer'), ('paid', 'Paid'), ('failed', 'Failed')], default='pending', max_length=30),
+        ),
+        migrations.CreateModel(
+            name='Payment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('reference', models.CharField(default=shop.models.new_payment_reference, editable=False, max_length=32, unique=True)),
+                ('method', models.CharField(choices=[('card', 'Credit/Debit Card'), ('mobile', 'Mobile Money'), ('bank', 'Bank Transfer')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('gateway_transaction_id', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payments', to='shop.order')),
+            ],
+        ),
+        migrations.RunPython(retire_confirmed_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_payment'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_cart_created_at_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedProduct',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_entries', to='shop.product')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='related_to', to='shop.product')),
+            ],
+            options={
+                'ordering': ['product', '-score'],
+                'indexes': [models.Index(fields=['product', '-score'], name='shop_relate_product_8a8e9a_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'related'), name='unique_related_product')],
+            },
+        ),
+    ]
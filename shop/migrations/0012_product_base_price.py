@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:52
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_base_prices(apps, schema_editor):
+    # No rates are loaded yet, so only base-currency products can be priced
+    Product = apps.get_model('shop', 'Product')
+    base_currency = getattr(settings, 'SHOP_BASE_CURRENCY', 'RWF')
+    Product.objects.filter(currency=base_currency).update(base_price=F('price'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_relatedproduct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('RWF', 'Rwandan Franc'), ('USD', 'US Dollar'), ('EUR', 'Euro'), ('KES', 'Kenyan Shilling'), ('UGX', 'Ugandan Shilling')], max_length=3, unique=True)),
+                ('rate', models.DecimalField(decimal_places=8, help_text='Units of the base currency per unit of this currency', max_digits=18)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['currency'],
+            },
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='base_price',
+            field=models.DecimalField(blank=True, db_index=True, decimal_places=2, editable=False, max_digits=14, null=True),
+        ),
+        migrations.RunPython(fill_base_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_product_base_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('last_order_id', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CategorySalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('currency', models.CharField(choices=[('RWF', 'Rwandan Franc'), ('USD', 'US Dollar'), ('EUR', 'Euro'), ('KES', 'Kenyan Shilling'), ('UGX', 'Ugandan Shilling')], max_length=3)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales_rollups', to='shop.productcategory')),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['category', 'date'], name='shop_catego_categor_828585_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'category', 'currency'), name='unique_category_sales_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('currency', models.CharField(choices=[('RWF', 'Rwandan Franc'), ('USD', 'US Dollar'), ('EUR', 'Euro'), ('KES', 'Kenyan Shilling'), ('UGX', 'Ugandan Shilling')], max_length=3)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sales_rollups', to='shop.product')),
+            ],
+            options={
+                'ordering': ['date'],
+                'indexes': [models.Index(fields=['product', 'date'], name='shop_produc_product_ea6a3b_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product', 'currency'), name='unique_product_sales_day')],
+            },
+        ),
+    ]
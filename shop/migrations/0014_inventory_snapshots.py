@@ -0,0 +1,51 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Case, Value, When
+
+
+def fill_stock_states(apps, schema_editor):
+    Product = apps.get_model('shop', 'Product')
+    Product.objects.update(stock_state=Case(
+        When(stock_quantity__isnull=True, then=Value('untracked')),
+        When(stock_quantity__lte=0, then=Value('out')),
+        When(stock_quantity__lte=getattr(settings, 'SHOP_LOW_STOCK_THRESHOLD', 10), then=Value('low')),
+        default=Value('in_stock'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='stock_state',
+            field=models.CharField(choices=[('untracked', 'Not Tracked'), ('in_stock', 'In Stock'), ('low', 'Low Stock'), ('out', 'Out of Stock')], db_index=True, default='untracked', editable=False, max_length=10),
+        ),
+        migrations.CreateModel(
+            name='InventorySnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('stock_quantity', models.IntegerField(blank=True, null=True)),
+                ('stock_state', models.CharField(choices=[('untracked', 'Not Tracked'), ('in_stock', 'In Stock'), ('low', 'Low Stock'), ('out', 'Out of Stock')], max_length=10)),
+                ('units_sold', models.PositiveIntegerField(default=0, help_text='Units sold over the sell-through window')),
+                ('sell_through', models.DecimalField(blank=True, decimal_places=2, help_text='Percent of available units sold over the window', max_digits=5, null=True)),
+                ('days_of_cover', models.DecimalField(blank=True, decimal_places=1, help_text='Days until stock runs out at the current sales rate', max_digits=8, null=True)),
+                ('needs_restock', models.BooleanField(default=False)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_snapshots', to='shop.product')),
+            ],
+            options={
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['product', 'date'], name='shop_invent_product_263ccf_idx')],
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='unique_inventory_snapshot_day')],
+            },
+        ),
+        migrations.RunPython(fill_stock_states, migrations.RunPython.noop),
+    ]
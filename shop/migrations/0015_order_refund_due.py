@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_inventory_snapshots'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('pending_bank_transfer', 'Awaiting Bank Transfer'), ('paid', 'Paid'), ('refund_due', 'Paid, Sold Out (Refund Due)'), ('failed', 'Failed')], default='pending', max_length=30),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0015_order_refund_due'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StaleRelatedProduct',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='related_stale', serialize=False, to='shop.product')),
+                ('marked_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
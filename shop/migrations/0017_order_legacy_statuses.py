@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+# Statuses written by the checkout before payments were recorded
+LEGACY_STATUSES = {
+    'confirmed': 'paid',
+    'pending_bank_transfer': 'pending',
+}
+
+
+def map_legacy_statuses(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    for legacy, status in LEGACY_STATUSES.items():
+        Order.objects.filter(status=legacy).update(status=status)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_stale_related_products'),
+    ]
+
+    operations = [
+        migrations.RunPython(map_legacy_statuses, migrations.RunPython.noop),
+    ]
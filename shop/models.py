@@ -1,7 +1,8 @@
 
+import uuid
+
 from django.db import models
 from django.utils.text import slugify
-from django.db.models import Avg, Count
 from django.conf import settings
 
 # Product Category model
@@ -29,6 +30,10 @@ class ProductCategory(models.Model):
 	
 	@property
 	def product_count(self):
+		# Use the count annotated by shop.catalog when available
+		annotated = getattr(self, 'active_product_count', None)
+		if annotated is not None:
+			return annotated
 		return self.products.filter(is_active=True).count()
 
 # Product model for shop
@@ -40,6 +45,12 @@ class Product(models.Model):
 		("KES", "Kenyan Shilling"),
 		("UGX", "Ugandan Shilling"),
 	]
+	STOCK_STATE_CHOICES = [
+		("untracked", "Not Tracked"),
+		("in_stock", "In Stock"),
+		("low", "Low Stock"),
+		("out", "Out of Stock"),
+	]
 	name = models.CharField(max_length=255)
 	slug = models.SlugField(max_length=255, unique=True, blank=True)
 	description = models.TextField(blank=True)
@@ -48,11 +59,19 @@ class Product(models.Model):
 	compare_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, help_text="Original price for showing discounts")
 	currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default="RWF")
 	stock_quantity = models.IntegerField(null=True, blank=True, help_text="Available stock quantity (leave empty if not tracking)")
+	# Derived from stock_quantity by shop.inventory whenever stock changes
+	stock_state = models.CharField(max_length=10, choices=STOCK_STATE_CHOICES, default="untracked", db_index=True, editable=False)
 	show_stock_publicly = models.BooleanField(default=False, help_text="Display stock quantity on public product pages")
 	is_active = models.BooleanField(default=True)
 	is_featured = models.BooleanField(default=False, help_text="Display as featured product")
 	is_new = models.BooleanField(default=False, help_text="Mark as new product")
 	image = models.ImageField(upload_to="product_images/", blank=True, null=True)
+	# Price in SHOP_BASE_CURRENCY for sorting, filtering and totals, maintained by shop.currency
+	base_price = models.DecimalField(max_digits=14, decimal_places=2, null=True, blank=True, db_index=True, editable=False)
+	# Rating summary over approved reviews, maintained by shop.ratings
+	rating_average = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True, db_index=True)
+	rating_count = models.PositiveIntegerField(default=0)
+	rating_histogram = models.JSONField(default=dict, blank=True, help_text="Approved review count per star")
 	created_at = models.DateTimeField(auto_now_add=True)
 	updated_at = models.DateTimeField(auto_now=True)
 
@@ -69,16 +88,20 @@ class Product(models.Model):
 	
 	@property
 	def average_rating(self):
-		avg = self.reviews.aggregate(Avg('rating'))['rating__avg']
-		return round(avg, 1) if avg else None
+		return round(float(self.rating_average), 1) if self.rating_average is not None else None
 	
 	@property
 	def review_count(self):
-		return self.reviews.count()
+		return self.rating_count
 	
 	@property
 	def is_in_stock(self):
-		return self.stock_quantity > 0
+		# Untracked products are always available
+		return self.stock_state != "out"
+	
+	@property
+	def is_low_stock(self):
+		return self.stock_state == "low"
 	
 	@property
 	def discount_percentage(self):
@@ -87,6 +110,19 @@ class Product(models.Model):
 		return 0
 
 
+# Exchange rate to the shop's base currency
+class ExchangeRate(models.Model):
+	currency = models.CharField(max_length=3, choices=Product.CURRENCY_CHOICES, unique=True)
+	rate = models.DecimalField(max_digits=18, decimal_places=8, help_text="Units of the base currency per unit of this currency")
+	updated_at = models.DateTimeField(auto_now=True)
+
+	class Meta:
+		ordering = ['currency']
+
+	def __str__(self):
+		return f"1 {self.currency} = {self.rate}"
+
+
 # Product Review model
 class ProductReview(models.Model):
 	product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reviews')
@@ -107,6 +143,32 @@ class ProductReview(models.Model):
 		return f"{self.customer_name} - {self.product.name} ({self.rating}★)"
 
 
+# Precomputed related products, rebuilt by shop.related
+class RelatedProduct(models.Model):
+	product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="related_entries")
+	related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="related_to")
+	score = models.FloatField()
+
+	class Meta:
+		ordering = ['product', '-score']
+		constraints = [
+			models.UniqueConstraint(fields=['product', 'related'], name='unique_related_product'),
+		]
+		indexes = [
+			models.Index(fields=['product', '-score']),
+		]
+
+	def __str__(self):
+		return f"{self.product_id} -> {self.related_id} ({self.score:.2f})"
+
+# Products whose related-products entries wait for refresh_related_products
+class StaleRelatedProduct(models.Model):
+	product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="related_stale")
+	marked_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"{self.product_id} since {self.marked_at:%Y-%m-%d %H:%M}"
+
 # Wishlist model
 class Wishlist(models.Model):
 	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='wishlists')
@@ -126,7 +188,8 @@ class Wishlist(models.Model):
 # Cart model
 class Cart(models.Model):
 	session_key = models.CharField(max_length=40, db_index=True)
-	created_at = models.DateTimeField(auto_now_add=True)
+	# Indexed for the abandoned cart sweep
+	created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
 	def __str__(self):
 		return f"Cart {self.session_key}"
@@ -137,6 +200,11 @@ class CartItem(models.Model):
 	product = models.ForeignKey(Product, on_delete=models.CASCADE)
 	quantity = models.PositiveIntegerField(default=1)
 
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['cart', 'product'], name='unique_cart_product'),
+		]
+
 	def __str__(self):
 		return f"{self.quantity} x {self.product.name}"
 
@@ -144,7 +212,9 @@ class CartItem(models.Model):
 class Order(models.Model):
 	STATUS_CHOICES = [
 		("pending", "Pending"),
+		("pending_bank_transfer", "Awaiting Bank Transfer"),
 		("paid", "Paid"),
+		("refund_due", "Paid, Sold Out (Refund Due)"),
 		("failed", "Failed"),
 	]
 	# Cart reference
@@ -159,12 +229,68 @@ class Order(models.Model):
 	delivery_method = models.CharField(max_length=30, choices=[("pickup", "Pickup"), ("delivery", "Delivery")], default="pickup")
 	# Order summary
 	total_amount = models.DecimalField(max_digits=10, decimal_places=2)
-	status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+	status = models.CharField(max_length=30, choices=STATUS_CHOICES, default="pending")
 	created_at = models.DateTimeField(auto_now_add=True)
 
 	def __str__(self):
 		return f"Order #{self.id} - {self.full_name}"
 
+# Order line items, snapshotted from the cart at checkout
+class OrderItem(models.Model):
+	order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
+	product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="order_items")
+	product_name = models.CharField(max_length=255)
+	unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+	currency = models.CharField(max_length=3, choices=Product.CURRENCY_CHOICES, default="RWF")
+	quantity = models.PositiveIntegerField(default=1)
+
+	class Meta:
+		ordering = ['id']
+		indexes = [
+			models.Index(fields=['product', 'order']),
+		]
+
+	def __str__(self):
+		return f"{self.quantity} x {self.product_name}"
+
+	@property
+	def line_total(self):
+		return self.unit_price * self.quantity
+
+	@classmethod
+	def from_cart_item(cls, order, cart_item):
+		product = cart_item.product
+		return cls(
+			order=order,
+			product=product,
+			product_name=product.name,
+			unit_price=product.price,
+			currency=product.currency,
+			quantity=cart_item.quantity,
+		)
+
+# Stock held for an order until payment succeeds, fails or times out
+class StockReservation(models.Model):
+	STATUS_CHOICES = [
+		("held", "Held"),
+		("committed", "Committed"),
+		("released", "Released"),
+	]
+	order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="stock_reservations")
+	product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_reservations")
+	quantity = models.PositiveIntegerField()
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="held")
+	expires_at = models.DateTimeField()
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'expires_at']),
+		]
+
+	def __str__(self):
+		return f"{self.quantity} x {self.product_id} for order #{self.order_id} ({self.status})"
+
 # Payment gateway abstraction
 class PaymentGateway(models.Model):
 	name = models.CharField(max_length=100)
@@ -176,8 +302,117 @@ class PaymentGateway(models.Model):
 
 # Mock IremboPay gateway (to be replaced with real API integration)
 class MockIremboPayGateway(PaymentGateway):
-	def process_payment(self, order: Order):
-		# Simulate payment success for testing
-		order.status = "paid"
-		order.save()
-		return True
+	"""
+	Local stub: accepts every payment and reports the outcome back through the
+	payment callback after a delay. config may set "delay_seconds" and "outcome".
+	"""
+	def submit(self, payment):
+		from .payments import simulate_gateway_callback
+		config = self.config or {}
+		simulate_gateway_callback(
+			payment.reference,
+			config.get("outcome", "succeeded"),
+			config.get("delay_seconds", getattr(settings, "SHOP_PAYMENT_STUB_DELAY", 3)),
+		)
+
+def new_payment_reference():
+	return uuid.uuid4().hex
+
+# Payment intent for an order; the gateway settles it through the payment callback
+class Payment(models.Model):
+	METHOD_CHOICES = [
+		("card", "Credit/Debit Card"),
+		("mobile", "Mobile Money"),
+		("bank", "Bank Transfer"),
+	]
+	STATUS_CHOICES = [
+		("pending", "Pending"),
+		("succeeded", "Succeeded"),
+		("failed", "Failed"),
+	]
+	order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="payments")
+	reference = models.CharField(max_length=32, unique=True, default=new_payment_reference, editable=False)
+	method = models.CharField(max_length=10, choices=METHOD_CHOICES)
+	amount = models.DecimalField(max_digits=10, decimal_places=2)
+	status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+	# Non-sensitive details shown to staff, e.g. card last four digits or mobile provider
+	details = models.JSONField(default=dict, blank=True)
+	gateway_transaction_id = models.CharField(max_length=100, blank=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"Payment {self.reference} for order #{self.order_id} ({self.status})"
+
+# Daily sales rollups over paid orders, maintained by shop.sales
+class ProductSalesDaily(models.Model):
+	date = models.DateField()
+	product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name="sales_rollups")
+	currency = models.CharField(max_length=3, choices=Product.CURRENCY_CHOICES)
+	units = models.PositiveIntegerField(default=0)
+	revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	order_count = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		ordering = ['date']
+		constraints = [
+			models.UniqueConstraint(fields=['date', 'product', 'currency'], name='unique_product_sales_day'),
+		]
+		indexes = [
+			models.Index(fields=['product', 'date']),
+		]
+
+	def __str__(self):
+		return f"{self.date} product #{self.product_id}: {self.units} sold, {self.revenue} {self.currency}"
+
+class CategorySalesDaily(models.Model):
+	date = models.DateField()
+	category = models.ForeignKey(ProductCategory, on_delete=models.SET_NULL, null=True, blank=True, related_name="sales_rollups")
+	currency = models.CharField(max_length=3, choices=Product.CURRENCY_CHOICES)
+	units = models.PositiveIntegerField(default=0)
+	revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+	order_count = models.PositiveIntegerField(default=0)
+
+	class Meta:
+		ordering = ['date']
+		constraints = [
+			models.UniqueConstraint(fields=['date', 'category', 'currency'], name='unique_category_sales_day'),
+		]
+		indexes = [
+			models.Index(fields=['category', 'date']),
+		]
+
+	def __str__(self):
+		return f"{self.date} category #{self.category_id}: {self.units} sold, {self.revenue} {self.currency}"
+
+# Highest order id the sales rollups have processed
+class SalesRollupCursor(models.Model):
+	name = models.CharField(max_length=50, unique=True)
+	last_order_id = models.PositiveBigIntegerField(default=0)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return f"{self.name} at order #{self.last_order_id}"
+
+# Daily stock level and sales velocity of a product, written by shop.inventory
+class InventorySnapshot(models.Model):
+	date = models.DateField()
+	product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="inventory_snapshots")
+	stock_quantity = models.IntegerField(null=True, blank=True)
+	stock_state = models.CharField(max_length=10, choices=Product.STOCK_STATE_CHOICES)
+	units_sold = models.PositiveIntegerField(default=0, help_text="Units sold over the sell-through window")
+	sell_through = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True, help_text="Percent of available units sold over the window")
+	days_of_cover = models.DecimalField(max_digits=8, decimal_places=1, null=True, blank=True, help_text="Days until stock runs out at the current sales rate")
+	needs_restock = models.BooleanField(default=False)
+
+	class Meta:
+		ordering = ['-date']
+		constraints = [
+			models.UniqueConstraint(fields=['date', 'product'], name='unique_inventory_snapshot_day'),
+		]
+		indexes = [
+			models.Index(fields=['product', 'date']),
+		]
+
+	def __str__(self):
+		return f"{self.date} {self.product_id}: {self.stock_quantity} ({self.stock_state})"
@@ -0,0 +1,267 @@
+"""
+Asynchronous payments for checkout.
+
+Checkout validates the payment details locally, creates a pending Payment
+(the payment intent) and hands it to the gateway after the order transaction
+commits, on a background thread, so the request never waits on the gateway.
+The gateway reports the outcome to the payment callback endpoint, keyed by
+the payment reference:
+
+    pending -> succeeded   order paid, reserved stock committed
+    pending -> failed      order failed, reserved stock released
+
+A payment that succeeds after its stock reservation expired and the stock
+was sold to someone else leaves the order refund_due instead of paid, and
+the shop team is asked to refund it.
+
+Repeated callbacks with the same outcome are acknowledged without side
+effects; a callback contradicting a settled payment is rejected. Bank
+transfers are not sent to a gateway and stay pending until confirmed.
+"""
+import hashlib
+import hmac
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import connection, transaction
+from django.utils.crypto import salted_hmac
+
+from dashboard.impact import record_cups_sold
+
+from .currency import base_currency
+from .models import MockIremboPayGateway, Payment
+from .sales import record_paid_order
+from .stock import InsufficientStock, commit_reservations, release_reservations
+
+
+# Allowed transitions; succeeded and failed are final
+PAYMENT_TRANSITIONS = {
+	"pending": ("succeeded", "failed"),
+}
+
+SIGNATURE_HEADER = 'HTTP_X_PAYMENT_SIGNATURE'
+
+
+class InvalidPaymentDetails(Exception):
+	pass
+
+
+class InvalidTransition(Exception):
+	def __init__(self, payment, status):
+		self.payment = payment
+		self.status = status
+		super().__init__(f"Payment {payment.reference} is {payment.status}, cannot become {status}")
+
+
+def payment_details(payment_data):
+	"""
+	Check the submitted payment fields and return the details worth keeping
+	on the Payment. Full card numbers and CVVs are never stored.
+	Raises InvalidPaymentDetails.
+	"""
+	method = payment_data['payment_method']
+	if method == 'card':
+		card_number = (payment_data.get('card_number') or '').replace(' ', '')
+		card_cvv = payment_data.get('card_cvv') or ''
+		if not 13 <= len(card_number) <= 19 or not 3 <= len(card_cvv) <= 4:
+			raise InvalidPaymentDetails(method)
+		return {'card_last4': card_number[-4:], 'card_name': payment_data.get('card_name', '')}
+	if method == 'mobile':
+		provider = payment_data.get('mobile_provider')
+		phone_number = (payment_data.get('mobile_number') or '').replace(' ', '').replace('-', '')
+		if provider not in ('mtn', 'airtel') or not phone_number:
+			raise InvalidPaymentDetails(method)
+		# Basic phone number validation for Rwanda
+		if not phone_number.startswith('+250') and not phone_number.startswith('250'):
+			if phone_number.startswith('07') or phone_number.startswith('78') or phone_number.startswith('79'):
+				phone_number = '+250' + phone_number[1:]
+			else:
+				raise InvalidPaymentDetails(method)
+		return {'provider': provider, 'phone': phone_number}
+	if method == 'bank':
+		return {}
+	raise InvalidPaymentDetails(method)
+
+
+def create_payment(order, method, details):
+	return Payment.objects.create(order=order, method=method, amount=order.total_amount, details=details)
+
+
+def get_gateway(payment):
+	"""
+	Gateway that settles payment. Only the IremboPay stub exists so far; real
+	MTN, Airtel or IremboPay clients would be chosen here from PAYMENT_GATEWAYS.
+	"""
+	return MockIremboPayGateway.objects.filter(is_active=True).first() or MockIremboPayGateway(name="IremboPay (local stub)")
+
+
+def _submit(payment_id):
+	try:
+		payment = Payment.objects.get(pk=payment_id)
+		get_gateway(payment).submit(payment)
+	finally:
+		connection.close()
+
+
+def dispatch_payment(payment):
+	"""
+	Send payment to its gateway once the current transaction commits, without
+	blocking the caller. Bank transfers are left pending.
+	"""
+	if payment.method == 'bank':
+		return
+	transaction.on_commit(
+		lambda: threading.Thread(target=_submit, args=(payment.pk,), daemon=True).start()
+	)
+
+
+def simulate_gateway_callback(reference, outcome, delay):
+	"""
+	Report outcome for reference after delay seconds, as a gateway calling
+	the payment callback would. A delay of None never reports.
+	"""
+	if delay is None:
+		return
+	time.sleep(delay)
+	try:
+		apply_gateway_result(reference, outcome, transaction_id=f"stub-{reference[:12]}")
+	finally:
+		connection.close()
+
+
+def _webhook_secret():
+	return settings.PAYMENT_GATEWAYS.get('IREMBOPAY', {}).get('webhook_secret')
+
+
+def sign_callback(reference, body):
+	"""
+	Signature a gateway sends with a callback body (hex HMAC-SHA256). It
+	covers the payment reference too, so a callback signed for one payment
+	cannot be replayed against another.
+	"""
+	message = reference.encode() + b'\n' + body
+	secret = _webhook_secret()
+	if secret:
+		return hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+	return salted_hmac('shop.payments.callback', message, algorithm='sha256').hexdigest()
+
+
+def verify_callback_signature(reference, body, signature):
+	return bool(signature) and hmac.compare_digest(sign_callback(reference, body), signature)
+
+
+def apply_gateway_result(reference, status, transaction_id=''):
+	"""
+	Move the payment with reference to status and update its order.
+
+	Returns (payment, changed); changed is False when the payment already had
+	that status, so duplicate callbacks are harmless. Raises
+	Payment.DoesNotExist for unknown references and InvalidTransition when a
+	settled payment is reported with a different outcome.
+	"""
+	with transaction.atomic():
+		payment = Payment.objects.select_for_update().select_related('order').get(reference=reference)
+		if payment.status == status:
+			return payment, False
+		if status not in PAYMENT_TRANSITIONS.get(payment.status, ()):
+			raise InvalidTransition(payment, status)
+
+		payment.status = status
+		if transaction_id:
+			payment.gateway_transaction_id = transaction_id
+		payment.save(update_fields=['status', 'gateway_transaction_id', 'updated_at'])
+
+		settle_order(payment.order, "paid" if status == "succeeded" else "failed", payment)
+	return payment, True
+
+
+def settle_order(order, status, payment=None):
+	"""
+	Move order to "paid" or "failed", committing or releasing its stock and
+	keeping the sales rollups and impact counters in step. Used for gateway
+	results and for orders settled by hand in the admin. Call inside a
+	transaction. Returns the new status, which is refund_due when a paid
+	order's expired reservation can no longer be filled.
+	"""
+	previous = order.status
+	if previous == status:
+		return previous
+	if status == "paid":
+		try:
+			commit_reservations(order)
+			order.status = "paid"
+		except InsufficientStock as e:
+			order.status = "refund_due"
+			sold_out = e.product
+			transaction.on_commit(lambda: send_refund_notification(order, payment, sold_out))
+	else:
+		release_reservations(order)
+		order.status = "failed"
+	order.save(update_fields=['status'])
+
+	if order.status == "paid":
+		record_paid_order(order)
+		record_cups_sold([order.pk])
+		if payment is not None:
+			transaction.on_commit(lambda: send_order_notification(order, payment))
+	elif previous == "paid":
+		record_paid_order(order, delta=-1)
+		record_cups_sold([order.pk], delta=-1)
+	return order.status
+
+
+def send_order_notification(order, payment):
+	"""
+	Email the shop team the details of an order ready to fulfil
+	"""
+	order_details = [
+		f"Order #{order.id}",
+		f"Name: {order.full_name}",
+		f"Email: {order.email}",
+		f"Phone: {order.phone}",
+		f"Country: {order.country}",
+		f"City: {order.city}",
+		f"ZIP: {order.zip_code}",
+		f"Delivery Method: {order.delivery_method}",
+		"\nCart Items:",
+	]
+	for item in order.items.all():
+		order_details.append(f"- {item.product_name} ({item.quantity} x {item.unit_price} {item.currency}) = {item.line_total} {item.currency}")
+	order_details.append(f"\nTotal: {order.total_amount} {base_currency()}")
+	order_details.append(f"Payment Method: {payment.method.upper()}")
+	order_details.append(f"Payment Status: {payment.get_status_display()} (ref {payment.reference})")
+
+	# Add payment details based on method
+	if payment.method == 'card':
+		order_details.append(f"Card ending in: ****{payment.details.get('card_last4', 'N/A')}")
+	elif payment.method == 'mobile':
+		order_details.append(f"Mobile Provider: {payment.details.get('provider', 'N/A')}")
+		order_details.append(f"Phone Number: {payment.details.get('phone', 'N/A')}")
+
+	send_mail(
+		subject="New Shop Order Received",
+		message="\n".join(order_details),
+		from_email=settings.DEFAULT_FROM_EMAIL,
+		recipient_list=[settings.CONTACT_NOTIFICATION_EMAIL],
+		fail_silently=True,
+	)
+
+
+def send_refund_notification(order, payment, product):
+	"""
+	Ask the shop team to refund an order paid after its stock was sold out
+	"""
+	paid_with = f"payment {payment.reference} ({payment.method.upper()})" if payment else "a payment confirmed by hand"
+	send_mail(
+		subject=f"Refund needed for order #{order.id}",
+		message=(
+			f"Order #{order.id} ({order.total_amount} {base_currency()}) was paid with {paid_with} after its "
+			f"stock reservation expired, and {product.name} has sold out since. The order will "
+			f"not be fulfilled; please refund {order.full_name} <{order.email}>."
+		),
+		from_email=settings.DEFAULT_FROM_EMAIL,
+		recipient_list=[settings.CONTACT_NOTIFICATION_EMAIL],
+		fail_silently=True,
+	)
@@ -0,0 +1,73 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count
+
+from .catalog import invalidate_product_pages
+from .models import Product, ProductReview
+
+
+STARS = [str(i) for i in range(1, 6)]
+
+
+def summarize_histogram(histogram):
+	"""
+	Return (count, average) for a star histogram like {'5': 3, '4': 1}
+	"""
+	count = sum(histogram.get(star, 0) for star in STARS)
+	if not count:
+		return 0, None
+	total = sum(int(star) * histogram.get(star, 0) for star in STARS)
+	average = (Decimal(total) / Decimal(count)).quantize(Decimal('0.01'))
+	return count, average
+
+
+def apply_rating_change(product_id, rating, delta):
+	"""
+	Add (delta=1) or remove (delta=-1) one approved review from a product's summary
+	"""
+	with transaction.atomic():
+		product = Product.objects.select_for_update().only('rating_histogram').filter(pk=product_id).first()
+		if product is None:
+			return
+		histogram = dict(product.rating_histogram or {})
+		star = str(rating)
+		histogram[star] = max(histogram.get(star, 0) + delta, 0)
+		count, average = summarize_histogram(histogram)
+		# update() keeps updated_at and the product signals untouched
+		Product.objects.filter(pk=product_id).update(
+			rating_histogram=histogram,
+			rating_count=count,
+			rating_average=average,
+		)
+
+
+def recompute_all_ratings(batch_size=500):
+	"""
+	Rebuild every product's rating summary from one grouped query.
+	Returns the number of products updated.
+	"""
+	histograms = defaultdict(dict)
+	rows = (
+		ProductReview.objects.filter(is_approved=True)
+		.values('product_id', 'rating')
+		.annotate(n=Count('id'))
+		.order_by()
+	)
+	for row in rows:
+		histograms[row['product_id']][str(row['rating'])] = row['n']
+
+	products = []
+	for product in Product.objects.only('id').iterator(chunk_size=batch_size):
+		histogram = histograms.get(product.id, {})
+		product.rating_histogram = histogram
+		product.rating_count, product.rating_average = summarize_histogram(histogram)
+		products.append(product)
+
+	with transaction.atomic():
+		Product.objects.bulk_update(
+			products, ['rating_histogram', 'rating_count', 'rating_average'], batch_size=batch_size
+		)
+	invalidate_product_pages()
+	return len(products)
@@ -0,0 +1,199 @@
+"""
+Related-products index.
+
+For each active product the RELATED_LIMIT best-scoring other active products
+are stored in RelatedProduct, so the detail page reads them with one indexed
+query. A candidate's score adds up:
+
+- ORDER_WEIGHT for every order both products appear in (failed orders excluded)
+- CART_WEIGHT for every open cart holding both
+- CATEGORY_WEIGHT when they share a category
+- PRICE_WEIGHT scaled by how close their base prices are (1.0 for equal prices)
+
+rebuild_related_products() rebuilds everything (see the rebuild_related_products
+command). Saves are not scored on the spot: a product whose category, base
+price or active flag changes is marked stale (see shop.signals), and
+refresh_stale_related() recomputes the entries affected by the marked products
+in one pass (see the refresh_related_products command, run from cron).
+"""
+from collections import Counter, defaultdict
+from itertools import combinations
+
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import invalidate_product_pages
+from .models import CartItem, OrderItem, Product, RelatedProduct, StaleRelatedProduct
+
+
+RELATED_LIMIT = 8
+
+ORDER_WEIGHT = 3.0
+CART_WEIGHT = 1.0
+CATEGORY_WEIGHT = 2.0
+PRICE_WEIGHT = 1.0
+
+# Product fields that feed a score; saves touching none of them keep the index
+SCORING_FIELDS = ('category_id', 'base_price', 'is_active')
+
+
+def _count_pairs(rows, product_ids=None):
+	"""
+	Count how often two products share a basket. rows are (basket_id,
+	product_id) ordered by basket; only pairs touching product_ids are kept
+	when it is given.
+	"""
+	pairs = Counter()
+	basket, members = None, set()
+
+	def flush():
+		for a, b in combinations(sorted(members), 2):
+			if product_ids is None or a in product_ids or b in product_ids:
+				pairs[a, b] += 1
+				pairs[b, a] += 1
+
+	for basket_id, product_id in rows:
+		if basket_id != basket:
+			flush()
+			basket, members = basket_id, set()
+		members.add(product_id)
+	flush()
+	return pairs
+
+
+def _co_purchases(product_ids=None):
+	orders = OrderItem.objects.filter(product__isnull=False).exclude(order__status="failed")
+	carts = CartItem.objects.all()
+	if product_ids is not None:
+		orders = orders.filter(order__items__product_id__in=product_ids)
+		carts = carts.filter(cart__items__product_id__in=product_ids)
+	order_pairs = _count_pairs(
+		orders.order_by('order_id').values_list('order_id', 'product_id').distinct().iterator(), product_ids
+	)
+	cart_pairs = _count_pairs(
+		carts.order_by('cart_id').values_list('cart_id', 'product_id').distinct().iterator(), product_ids
+	)
+	return order_pairs, cart_pairs
+
+
+def _price_similarity(a, b):
+	if a is None or b is None:
+		return 0.0
+	high = max(a, b)
+	if not high:
+		return 1.0
+	return float(1 - abs(a - b) / high)
+
+
+def compute_related(product_ids=None, limit=RELATED_LIMIT):
+	"""
+	Return {product_id: [(related_id, score), ...]} best first, for product_ids
+	(all active products when None).
+	"""
+	# Base prices, so products priced in different currencies compare
+	products = dict(
+		(pk, (category_id, price))
+		for pk, category_id, price in Product.objects.filter(is_active=True).values_list('id', 'category_id', 'base_price')
+	)
+	by_category = defaultdict(list)
+	for pk, (category_id, price) in products.items():
+		if category_id is not None:
+			by_category[category_id].append(pk)
+
+	targets = products.keys() if product_ids is None else [pk for pk in product_ids if pk in products]
+	order_pairs, cart_pairs = _co_purchases(None if product_ids is None else set(product_ids))
+
+	candidates = defaultdict(set)
+	for a, b in list(order_pairs) + list(cart_pairs):
+		candidates[a].add(b)
+
+	related = {}
+	for pk in targets:
+		category_id, price = products[pk]
+		scores = []
+		for other in candidates[pk] | set(by_category.get(category_id, ())):
+			if other == pk or other not in products:
+				continue
+			other_category, other_price = products[other]
+			score = ORDER_WEIGHT * order_pairs[pk, other] + CART_WEIGHT * cart_pairs[pk, other]
+			if category_id is not None and other_category == category_id:
+				score += CATEGORY_WEIGHT
+			score += PRICE_WEIGHT * _price_similarity(price, other_price)
+			scores.append((other, score))
+		scores.sort(key=lambda item: (-item[1], -item[0]))
+		related[pk] = scores[:limit]
+	return related
+
+
+def _store(related, product_ids):
+	rows = [
+		RelatedProduct(product_id=pk, related_id=other, score=score)
+		for pk, scores in related.items()
+		for other, score in scores
+	]
+	with transaction.atomic():
+		stale = RelatedProduct.objects.all()
+		if product_ids is not None:
+			stale = stale.filter(product_id__in=product_ids)
+		stale.delete()
+		RelatedProduct.objects.bulk_create(rows, batch_size=1000)
+	invalidate_product_pages()
+	return len(rows)
+
+
+def rebuild_related_products():
+	"""
+	Rebuild the whole index. Returns the number of rows written.
+	"""
+	started = timezone.now()
+	written = _store(compute_related(), None)
+	StaleRelatedProduct.objects.filter(marked_at__lte=started).delete()
+	return written
+
+
+def mark_related_stale(product_ids):
+	"""
+	Queue product_ids for the next refresh_stale_related()
+	"""
+	now = timezone.now()
+	# Moving marked_at forward keeps a mark made during a refresh for the next one
+	StaleRelatedProduct.objects.bulk_create(
+		[StaleRelatedProduct(product_id=pk, marked_at=now) for pk in product_ids],
+		update_conflicts=True, unique_fields=['product'], update_fields=['marked_at'],
+	)
+
+
+def refresh_stale_related():
+	"""
+	Recompute the lists the marked products can affect: their own, those of
+	products in their categories and those that currently list them, then
+	clear the marks. Returns the number of products recomputed.
+	"""
+	started = timezone.now()
+	marked = set(StaleRelatedProduct.objects.filter(marked_at__lte=started).values_list('product_id', flat=True))
+	if not marked:
+		return 0
+	categories = Product.objects.filter(pk__in=marked, category__isnull=False).values('category_id')
+	product_ids = set(marked)
+	product_ids.update(Product.objects.filter(category_id__in=categories).values_list('pk', flat=True))
+	product_ids.update(RelatedProduct.objects.filter(related_id__in=marked).values_list('product_id', flat=True))
+	_store(compute_related(product_ids), product_ids)
+	StaleRelatedProduct.objects.filter(product_id__in=marked, marked_at__lte=started).delete()
+	return len(product_ids)
+
+
+def get_related_products(product, limit=4):
+	"""
+	Related products for the detail page, best first; falls back to other
+	products in the category while the index has no entries for product.
+	"""
+	related = list(
+		Product.objects.filter(related_to__product=product, is_active=True)
+		.order_by('-related_to__score')[:limit]
+	)
+	if related or not product.category_id:
+		return related
+	return list(
+		Product.objects.filter(category_id=product.category_id, is_active=True)
+		.exclude(pk=product.pk)[:limit]
+	)
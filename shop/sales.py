@@ -0,0 +1,185 @@
+"""
+Daily sales rollups.
+
+ProductSalesDaily and CategorySalesDaily hold, per day and currency, the units
+sold, revenue and number of orders of paid orders, so sales charts read a few
+pre-aggregated rows instead of the order tables.
+
+refresh_sales_rollups() adds the orders placed since the last run, tracked by
+the highest processed order id in SalesRollupCursor; run it from cron. Orders
+still awaiting payment when the cursor passes them are added by
+record_paid_order() once their payment succeeds, and taken out again by
+record_paid_order(order, delta=-1) if a paid order is later marked failed. rebuild_sales_rollups()
+recomputes everything from history, e.g. after editing order statuses by hand.
+Category figures use each product's current category.
+
+Only the batch refresher locks the cursor. It also locks the orders it reads
+and the rollup rows it rewrites, while record_paid_order() moves a single
+order with F() increments after a plain read of the cursor. A payment
+settling an order while the refresher reads it waits on that order's row
+lock, so it sees the cursor the refresher left and the order is counted once.
+"""
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Greatest, TruncDate, TruncMonth
+
+from .models import CategorySalesDaily, Order, OrderItem, ProductSalesDaily, SalesRollupCursor
+
+
+CURSOR_NAME = 'sales'
+
+ROLLUP_BATCH_SIZE = 1000
+
+# Rollup model, its key field and the order line lookup that fills it
+ROLLUPS = {
+	'product': (ProductSalesDaily, 'product', 'product'),
+	'category': (CategorySalesDaily, 'category', 'product__category'),
+}
+
+
+def _lock_cursor():
+	SalesRollupCursor.objects.get_or_create(name=CURSOR_NAME)
+	return SalesRollupCursor.objects.select_for_update().get(name=CURSOR_NAME)
+
+
+def _create_missing(model, key_field, totals):
+	# Empty rows to add to; rows another transaction created first are kept
+	model.objects.bulk_create(
+		[
+			model(date=date, currency=currency, units=0, revenue=0, order_count=0, **{f'{key_field}_id': key})
+			for date, key, currency in totals
+		],
+		ignore_conflicts=True,
+	)
+
+
+def _merge(model, key_field, totals, delta=1):
+	"""
+	Add (delta=1) or remove (delta=-1) {(date, key id, currency): (units, revenue, orders)}
+	in model's rows, locking the rows of those dates and writing them back in bulk
+	"""
+	if delta > 0:
+		_create_missing(model, key_field, totals)
+	existing = {
+		(row.date, getattr(row, f'{key_field}_id'), row.currency): row
+		for row in model.objects.select_for_update().filter(date__in={date for date, _, _ in totals}).order_by('pk')
+	}
+	updated = []
+	for (date, key, currency), (units, revenue, orders) in totals.items():
+		row = existing.get((date, key, currency))
+		if row is None:
+			continue
+		row.units = max(row.units + delta * units, 0)
+		row.revenue += delta * revenue
+		row.order_count = max(row.order_count + delta * orders, 0)
+		updated.append(row)
+	model.objects.bulk_update(updated, ['units', 'revenue', 'order_count'])
+
+
+def _increment(model, key_field, totals, delta=1):
+	"""
+	Same as _merge() with one UPDATE ... SET units = units + n per row, for the
+	few rows of a single order; only those rows are locked
+	"""
+	if delta > 0:
+		_create_missing(model, key_field, totals)
+	for (date, key, currency), (units, revenue, orders) in totals.items():
+		model.objects.filter(date=date, currency=currency, **{f'{key_field}_id': key}).update(
+			units=Greatest(F('units') + delta * units, 0),
+			revenue=F('revenue') + delta * revenue,
+			order_count=Greatest(F('order_count') + delta * orders, 0),
+		)
+
+
+def _accumulate(order_ids, delta=1, merge=_merge):
+	"""
+	Add (or with delta=-1 remove) the lines of the given paid orders in the rollups, one grouped query per table
+	"""
+	if not order_ids:
+		return
+	lines = OrderItem.objects.filter(order_id__in=order_ids)
+	for model, key_field, lookup in ROLLUPS.values():
+		rows = lines.values(
+			'currency', day=TruncDate('order__created_at'), key=F(lookup),
+		).annotate(
+			units=Sum('quantity'),
+			revenue=Sum(F('quantity') * F('unit_price'), output_field=DecimalField(max_digits=14, decimal_places=2)),
+			orders=Count('order', distinct=True),
+		).order_by()
+		totals = {
+			(row['day'], row['key'], row['currency']): (row['units'], row['revenue'], row['orders'])
+			for row in rows
+		}
+		merge(model, key_field, totals, delta)
+
+
+def refresh_sales_rollups(batch_size=ROLLUP_BATCH_SIZE):
+	"""
+	Roll up orders placed since the last run, batch_size orders per
+	transaction. Returns the number of paid orders added.
+	"""
+	added = 0
+	while True:
+		with transaction.atomic():
+			cursor = _lock_cursor()
+			orders = list(
+				Order.objects.select_for_update().filter(pk__gt=cursor.last_order_id)
+				.order_by('pk').values_list('pk', 'status')[:batch_size]
+			)
+			if not orders:
+				return added
+			paid = [pk for pk, status in orders if status == 'paid']
+			_accumulate(paid)
+			cursor.last_order_id = orders[-1][0]
+			cursor.save(update_fields=['last_order_id', 'updated_at'])
+			added += len(paid)
+
+
+def rebuild_sales_rollups(batch_size=ROLLUP_BATCH_SIZE):
+	"""
+	Recompute the rollups from every order. Returns the number of paid orders added.
+	"""
+	with transaction.atomic():
+		cursor = _lock_cursor()
+		ProductSalesDaily.objects.all().delete()
+		CategorySalesDaily.objects.all().delete()
+		cursor.last_order_id = 0
+		cursor.save(update_fields=['last_order_id', 'updated_at'])
+		return refresh_sales_rollups(batch_size)
+
+
+def record_paid_order(order, delta=1):
+	"""
+	Add (delta=1) an order that was paid after the cursor passed it, or
+	remove (delta=-1) one that is no longer paid. Call inside the transaction
+	that changes its status, after saving it; later orders are left to
+	refresh_sales_rollups().
+	"""
+	last_order_id = SalesRollupCursor.objects.filter(name=CURSOR_NAME).values_list('last_order_id', flat=True).first()
+	if last_order_id is not None and order.pk <= last_order_id:
+		_accumulate([order.pk], delta, _increment)
+
+
+def sales_series(by='product', period='day', start=None, end=None, ids=None):
+	"""
+	Units, revenue and orders per period, product or category and currency,
+	read from the rollup tables only. period is 'day' or 'month'.
+	"""
+	model, key_field, _ = ROLLUPS[by]
+	rows = model.objects.all()
+	if start:
+		rows = rows.filter(date__gte=start)
+	if end:
+		rows = rows.filter(date__lte=end)
+	if ids:
+		rows = rows.filter(**{f'{key_field}_id__in': ids})
+	return rows.values(
+		'currency',
+		period=TruncMonth('date') if period == 'month' else F('date'),
+		key=F(f'{key_field}_id'),
+		name=F(f'{key_field}__name'),
+	).annotate(
+		units=Sum('units'),
+		revenue=Sum('revenue'),
+		orders=Sum('order_count'),
+	).order_by('period', 'key', 'currency')
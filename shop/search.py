@@ -0,0 +1,297 @@
+"""
+Product search backends for the shop.
+
+Every backend ranks products by relevance over name, description and category
+name, with name hits weighted above category and description hits:
+
+- SQLiteFTSBackend: FTS5 virtual table (shop_product_fts), ranked with bm25()
+- MySQLFulltextBackend: FULLTEXT indexes queried with MATCH ... AGAINST
+- PythonIndexBackend: in-process inverted index, used when neither is available
+
+The backend is picked from the database vendor, or forced with the
+SHOP_SEARCH_BACKEND setting ('fts5', 'mysql' or 'python').
+
+A backend's rank() restricts a product queryset to the matches and annotates
+their search_rank (lower ranks first). The SQL backends compute it inside
+the product query, so the caller's filters and pagination run on every match;
+the Python backend can only hand over ids, and keeps the SEARCH_RESULT_LIMIT
+best of those the queryset allows, checking them one page of ids at a time.
+"""
+import bisect
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, FloatField, IntegerField, Value, When
+from django.db.models.expressions import RawSQL
+
+from .models import Product
+
+
+NAME_WEIGHT = 10.0
+CATEGORY_WEIGHT = 4.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Maximum number of results the Python backend ranks for one query
+SEARCH_RESULT_LIMIT = 500
+
+FTS_TABLE = 'shop_product_fts'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+	return TOKEN_RE.findall((text or '').lower())
+
+
+class SQLiteFTSBackend:
+	name = 'fts5'
+
+	def rank(self, queryset, query):
+		tokens = tokenize(query)
+		if not tokens:
+			return queryset.none()
+		# Prefix match on every term, any term may match; bm25() is lower-is-better
+		match = ' OR '.join(f'"{token}"*' for token in tokens)
+		product_table = Product._meta.db_table
+		return queryset.filter(
+			pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]),
+		).annotate(
+			search_rank=RawSQL(
+				f'SELECT bm25({FTS_TABLE}, %s, %s, %s) FROM {FTS_TABLE} '
+				f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{product_table}"."id"',
+				[NAME_WEIGHT, DESCRIPTION_WEIGHT, CATEGORY_WEIGHT, match],
+				output_field=FloatField(),
+			),
+		).order_by('search_rank', 'pk')
+
+	def index_product(self, product):
+		category_name = product.category.name if product.category_id else ''
+		with connection.cursor() as cursor:
+			cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product.pk])
+			cursor.execute(
+				f'INSERT INTO {FTS_TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)',
+				[product.pk, product.name, product.description, category_name],
+			)
+
+	def index_products(self, product_ids):
+		if not product_ids:
+			return
+		placeholders = ', '.join(['%s'] * len(product_ids))
+		with connection.cursor() as cursor:
+			cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', list(product_ids))
+			cursor.execute(
+				f'INSERT INTO {FTS_TABLE} (rowid, name, description, category) '
+				'SELECT p.id, p.name, p.description, COALESCE(c.name, \'\') '
+				'FROM shop_product p LEFT JOIN shop_productcategory c ON c.id = p.category_id '
+				f'WHERE p.id IN ({placeholders})',
+				list(product_ids),
+			)
+
+	def remove_product(self, product_id):
+		with connection.cursor() as cursor:
+			cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [product_id])
+
+	def reindex_category(self, category_id, name):
+		with connection.cursor() as cursor:
+			cursor.execute(
+				f'UPDATE {FTS_TABLE} SET category = %s '
+				f'WHERE rowid IN (SELECT id FROM shop_product WHERE category_id = %s)',
+				[name, category_id],
+			)
+
+	def rebuild(self):
+		with connection.cursor() as cursor:
+			cursor.execute(f'DELETE FROM {FTS_TABLE}')
+			cursor.execute(
+				f'INSERT INTO {FTS_TABLE} (rowid, name, description, category) '
+				'SELECT p.id, p.name, p.description, COALESCE(c.name, \'\') '
+				'FROM shop_product p LEFT JOIN shop_productcategory c ON c.id = p.category_id'
+			)
+			cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+			return cursor.fetchone()[0]
+
+
+class MySQLFulltextBackend:
+	"""
+	Uses the FULLTEXT indexes created by migration 0005. MySQL keeps them up to
+	date itself, so the index hooks are no-ops.
+	"""
+	name = 'mysql'
+
+	def rank(self, queryset, query):
+		tokens = tokenize(query)
+		if not tokens:
+			return queryset.none()
+		against = ' '.join(f'{token}*' for token in tokens)
+		name_match = 'MATCH(p.name) AGAINST (%s IN BOOLEAN MODE)'
+		description_match = 'MATCH(p.description) AGAINST (%s IN BOOLEAN MODE)'
+		category_match = 'COALESCE(MATCH(c.name) AGAINST (%s IN BOOLEAN MODE), 0)'
+		joined = 'FROM shop_product p LEFT JOIN shop_productcategory c ON c.id = p.category_id'
+		# Negated so that, as with bm25(), lower ranks first
+		return queryset.filter(
+			pk__in=RawSQL(
+				f'SELECT p.id {joined} WHERE {name_match} OR {description_match} OR {category_match} > 0',
+				[against, against, against],
+			),
+		).annotate(
+			search_rank=RawSQL(
+				f'SELECT -({name_match} * %s + {description_match} * %s + {category_match} * %s) '
+				f'{joined} WHERE p.id = `shop_product`.`id`',
+				[against, NAME_WEIGHT, against, DESCRIPTION_WEIGHT, against, CATEGORY_WEIGHT],
+				output_field=FloatField(),
+			),
+		).order_by('search_rank', 'pk')
+
+	def index_product(self, product):
+		pass
+
+	def index_products(self, product_ids):
+		pass
+
+	def remove_product(self, product_id):
+		pass
+
+	def reindex_category(self, category_id, name):
+		pass
+
+	def rebuild(self):
+		return Product.objects.count()
+
+
+class PythonIndexBackend:
+	"""
+	Inverted index held in process memory. Changes bump a version number in
+	the cache, and each process rebuilds its copy lazily on the next search.
+	"""
+	name = 'python'
+	VERSION_CACHE_KEY = 'shop:search_index_version'
+
+	_postings = None
+	_vocabulary = None
+	_version = None
+
+	def _current_version(self):
+		return cache.get_or_set(self.VERSION_CACHE_KEY, 1, None)
+
+	def _build(self):
+		postings = defaultdict(lambda: defaultdict(float))
+		rows = Product.objects.values_list('id', 'name', 'description', 'category__name')
+		for product_id, name, description, category_name in rows.iterator():
+			for field_text, weight in (
+				(name, NAME_WEIGHT),
+				(description, DESCRIPTION_WEIGHT),
+				(category_name, CATEGORY_WEIGHT),
+			):
+				for token in tokenize(field_text):
+					postings[token][product_id] += weight
+		PythonIndexBackend._postings = {token: dict(docs) for token, docs in postings.items()}
+		PythonIndexBackend._vocabulary = sorted(postings)
+
+	def _ensure_index(self):
+		version = self._current_version()
+		if PythonIndexBackend._postings is None or PythonIndexBackend._version != version:
+			self._build()
+			PythonIndexBackend._version = version
+
+	def search(self, query, limit=SEARCH_RESULT_LIMIT):
+		tokens = tokenize(query)
+		if not tokens:
+			return []
+		self._ensure_index()
+		vocabulary = PythonIndexBackend._vocabulary
+		scores = defaultdict(float)
+		for token in tokens:
+			# Prefix match via the sorted vocabulary
+			start = bisect.bisect_left(vocabulary, token)
+			for term in vocabulary[start:]:
+				if not term.startswith(token):
+					break
+				for product_id, weight in PythonIndexBackend._postings[term].items():
+					scores[product_id] += weight
+		ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+		return [product_id for product_id, score in ranked[:limit]]
+
+	def rank(self, queryset, query):
+		matches = self.search(query, limit=None)
+		# Filter before truncating, so matches the queryset excludes take no
+		# slots; matches are checked a page at a time, best first, so no
+		# pk__in list grows past SEARCH_RESULT_LIMIT ids
+		ranked_ids = []
+		for start in range(0, len(matches), SEARCH_RESULT_LIMIT):
+			page = matches[start:start + SEARCH_RESULT_LIMIT]
+			allowed = set(queryset.filter(pk__in=page).values_list('pk', flat=True))
+			ranked_ids.extend(product_id for product_id in page if product_id in allowed)
+			if len(ranked_ids) >= SEARCH_RESULT_LIMIT:
+				break
+		ranked_ids = ranked_ids[:SEARCH_RESULT_LIMIT]
+		if not ranked_ids:
+			return queryset.none()
+		return queryset.filter(pk__in=ranked_ids).annotate(
+			search_rank=Case(
+				*[When(pk=product_id, then=Value(position)) for position, product_id in enumerate(ranked_ids)],
+				output_field=IntegerField(),
+			)
+		).order_by('search_rank')
+
+	def _invalidate(self):
+		try:
+			cache.incr(self.VERSION_CACHE_KEY)
+		except ValueError:
+			cache.set(self.VERSION_CACHE_KEY, 2, None)
+
+	def index_product(self, product):
+		self._invalidate()
+
+	def index_products(self, product_ids):
+		self._invalidate()
+
+	def remove_product(self, product_id):
+		self._invalidate()
+
+	def reindex_category(self, category_id, name):
+		self._invalidate()
+
+	def rebuild(self):
+		self._invalidate()
+		# Rebuild this process's copy even if a cleared cache repeats an old version
+		self._build()
+		PythonIndexBackend._version = self._current_version()
+		return Product.objects.count()
+
+
+_fts_table_exists = None
+
+
+def fts_table_exists():
+	"""
+	Whether migration 0005 could create the FTS5 table (checked once per process)
+	"""
+	global _fts_table_exists
+	if _fts_table_exists is None:
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+			_fts_table_exists = cursor.fetchone() is not None
+	return _fts_table_exists
+
+
+def get_search_backend():
+	forced = getattr(settings, 'SHOP_SEARCH_BACKEND', None)
+	if forced == 'python':
+		return PythonIndexBackend()
+	if forced == 'mysql' or (forced is None and connection.vendor == 'mysql'):
+		return MySQLFulltextBackend()
+	if forced == 'fts5' or (forced is None and connection.vendor == 'sqlite' and fts_table_exists()):
+		return SQLiteFTSBackend()
+	return PythonIndexBackend()
+
+
+def search_products(queryset, query):
+	"""
+	Restrict a product queryset to matches for query, ordered by relevance
+	(the search_rank annotation). Further order_by() calls replace the
+	relevance ordering.
+	"""
+	return get_search_backend().rank(queryset, query)
@@ -0,0 +1,100 @@
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .catalog import invalidate_category_catalog, invalidate_product_page, invalidate_product_pages
+from .currency import set_base_price
+from .inventory import set_stock_state
+from .models import Product, ProductCategory, ProductReview, RelatedProduct
+from .ratings import apply_rating_change
+from .related import SCORING_FIELDS, mark_related_stale
+from .search import get_search_backend
+
+
+@receiver(pre_save, sender=Product)
+def derive_product_fields(sender, instance, **kwargs):
+	set_base_price(instance)
+	set_stock_state(instance)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductCategory)
+def invalidate_catalog_on_change(sender, **kwargs):
+	invalidate_category_catalog()
+	# Names, prices and categories also show in other products' related blocks
+	invalidate_product_pages()
+
+
+@receiver(pre_save, sender=ProductReview)
+def remember_previous_review_state(sender, instance, **kwargs):
+	# Keep the stored state so post_save can apply only the difference
+	instance._previous_rating_state = None
+	if instance.pk:
+		instance._previous_rating_state = (
+			sender.objects.filter(pk=instance.pk)
+			.values_list('product_id', 'rating', 'is_approved')
+			.first()
+		)
+
+
+@receiver(post_save, sender=ProductReview)
+def update_rating_on_save(sender, instance, **kwargs):
+	previous = getattr(instance, '_previous_rating_state', None)
+	current = (instance.product_id, instance.rating, instance.is_approved)
+	if previous == current:
+		return
+	if previous and previous[2]:
+		apply_rating_change(previous[0], previous[1], -1)
+	if instance.is_approved:
+		apply_rating_change(instance.product_id, instance.rating, 1)
+	invalidate_product_page(instance.product_id, *([previous[0]] if previous else []))
+
+
+@receiver(post_delete, sender=ProductReview)
+def update_rating_on_delete(sender, instance, **kwargs):
+	if instance.is_approved:
+		apply_rating_change(instance.product_id, instance.rating, -1)
+		invalidate_product_page(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+def index_product_for_search(sender, instance, **kwargs):
+	get_search_backend().index_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_search(sender, instance, **kwargs):
+	get_search_backend().remove_product(instance.pk)
+
+
+@receiver(post_save, sender=ProductCategory)
+def reindex_category_for_search(sender, instance, **kwargs):
+	get_search_backend().reindex_category(instance.pk, instance.name)
+
+
+@receiver(pre_delete, sender=ProductCategory)
+def clear_category_from_search(sender, instance, **kwargs):
+	# Products keep existing with category set to NULL
+	get_search_backend().reindex_category(instance.pk, '')
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_scoring_state(sender, instance, **kwargs):
+	# Runs after derive_product_fields, so base_price is already current
+	instance._previous_scoring_state = None
+	if instance.pk:
+		instance._previous_scoring_state = (
+			sender.objects.filter(pk=instance.pk).values_list(*SCORING_FIELDS).first()
+		)
+
+
+@receiver(post_save, sender=Product)
+def mark_related_products_stale(sender, instance, **kwargs):
+	previous = getattr(instance, '_previous_scoring_state', None)
+	if previous != tuple(getattr(instance, field) for field in SCORING_FIELDS):
+		mark_related_stale([instance.pk])
+
+
+@receiver(pre_delete, sender=Product)
+def mark_listing_products_stale(sender, instance, **kwargs):
+	# The product's own entries and mark go with it; the lists naming it need filling
+	mark_related_stale(RelatedProduct.objects.filter(related=instance).values_list('product_id', flat=True))
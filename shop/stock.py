@@ -0,0 +1,140 @@
+"""
+Stock reservations for checkout.
+
+Stock is taken with one conditional UPDATE per product
+(SET stock_quantity = stock_quantity - n WHERE stock_quantity >= n), so
+concurrent checkouts only contend on the rows they share and can never
+oversell. Products with stock_quantity NULL are not tracked and are never
+reserved. Held reservations are committed when payment succeeds and put
+back when it fails or when they expire.
+
+Reservations last SHOP_STOCK_RESERVATION_MINUTES (default 15), or
+SHOP_BANK_TRANSFER_RESERVATION_HOURS (default 72) for bank transfers, which
+wait on the customer. A payment that succeeds after its reservation expired
+takes the stock again with the same conditional UPDATE; when that is no
+longer possible commit_reservations() raises InsufficientStock and the order
+is not fulfilled.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .catalog import invalidate_product_page, invalidate_product_page_slugs
+from .inventory import refresh_stock_states
+from .models import Product, StockReservation
+
+
+class InsufficientStock(Exception):
+	def __init__(self, product):
+		self.product = product
+		super().__init__(f"Not enough stock for {product.name}")
+
+
+def reservation_ttl(payment_method=None):
+	if payment_method == 'bank':
+		return timedelta(hours=getattr(settings, 'SHOP_BANK_TRANSFER_RESERVATION_HOURS', 72))
+	return timedelta(minutes=getattr(settings, 'SHOP_STOCK_RESERVATION_MINUTES', 15))
+
+
+def _take(product_id, quantity):
+	return Product.objects.filter(
+		pk=product_id, stock_quantity__gte=quantity,
+	).update(stock_quantity=F('stock_quantity') - quantity)
+
+
+def reserve_stock(order, lines, ttl=None):
+	"""
+	Reserve stock for (product, quantity) lines on behalf of order, for ttl
+	(default reservation_ttl()).
+
+	Raises InsufficientStock, rolling back every decrement made so far, if
+	any tracked product cannot cover its quantity. Must be called inside the
+	transaction that creates the order so a failure also discards the order.
+	"""
+	quantities = defaultdict(int)
+	products = {}
+	for product, quantity in lines:
+		if product.stock_quantity is None:
+			continue
+		quantities[product.pk] += quantity
+		products[product.pk] = product
+
+	expires_at = timezone.now() + (ttl or reservation_ttl())
+	reservations = []
+	with transaction.atomic():
+		# Fixed order keeps concurrent multi-product checkouts deadlock-free
+		for product_id in sorted(quantities):
+			quantity = quantities[product_id]
+			if not _take(product_id, quantity):
+				raise InsufficientStock(products[product_id])
+			reservations.append(StockReservation(
+				order=order, product_id=product_id, quantity=quantity, expires_at=expires_at,
+			))
+		StockReservation.objects.bulk_create(reservations)
+		if reservations:
+			refresh_stock_states(list(quantities))
+			# Product pages show stock levels
+			slugs = [products[pk].slug for pk in quantities]
+			transaction.on_commit(lambda: invalidate_product_page_slugs(*slugs))
+	return reservations
+
+
+def commit_reservations(order):
+	"""
+	Mark an order's stock as sold. Reservations that expired are taken again
+	first; raises InsufficientStock, committing nothing, when one of them no
+	longer can be. Returns the number of reservations committed.
+	"""
+	with transaction.atomic():
+		committed = StockReservation.objects.filter(order=order, status="held").update(status="committed")
+		expired = list(
+			StockReservation.objects.filter(order=order, status="released")
+			.select_related('product').order_by('product_id')
+		)
+		for reservation in expired:
+			# Products no longer tracked have nothing to take
+			if reservation.product.stock_quantity is not None and not _take(reservation.product_id, reservation.quantity):
+				raise InsufficientStock(reservation.product)
+		if expired:
+			StockReservation.objects.filter(pk__in=[r.pk for r in expired]).update(status="committed")
+			product_ids = [r.product_id for r in expired]
+			refresh_stock_states(product_ids)
+			slugs = [r.product.slug for r in expired]
+			transaction.on_commit(lambda: invalidate_product_page_slugs(*slugs))
+	return committed + len(expired)
+
+
+def _release(reservations):
+	released = 0
+	for reservation in reservations:
+		# The status check makes each release happen once, even when the
+		# sweeper and a payment failure race for the same reservation
+		with transaction.atomic():
+			if StockReservation.objects.filter(pk=reservation.pk, status="held").update(status="released"):
+				Product.objects.filter(pk=reservation.product_id, stock_quantity__isnull=False).update(
+					stock_quantity=F('stock_quantity') + reservation.quantity
+				)
+				refresh_stock_states([reservation.product_id])
+				transaction.on_commit(lambda product_id=reservation.product_id: invalidate_product_page(product_id))
+				released += 1
+	return released
+
+
+def release_reservations(order):
+	"""
+	Return an order's held stock, e.g. after a failed payment
+	"""
+	return _release(StockReservation.objects.filter(order=order, status="held").only('id', 'product_id', 'quantity'))
+
+
+def release_expired_reservations(now=None):
+	"""
+	Return stock held past its expiry time. Returns the number released.
+	"""
+	now = now or timezone.now()
+	expired = StockReservation.objects.filter(status="held", expires_at__lte=now).only('id', 'product_id', 'quantity')
+	return _release(expired.iterator())
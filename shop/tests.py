@@ -1,3 +1,1123 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import QuerySet
+from django.db import OperationalError, connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from dashboard.models import ImpactCounter
+
+from .admin import annotate_sales
+from .cart import CART_SUMMARY_SESSION_KEY, add_item, update_quantities
+from .catalog import get_category_catalog
+from .currency import set_exchange_rates, to_base
+from .inventory import take_inventory_snapshot
+from .importer import import_catalog, read_rows
+from .models import (
+	Cart, CartItem, CategorySalesDaily, ExchangeRate, InventorySnapshot, Order, OrderItem, Payment, Product, ProductCategory, ProductReview,
+	ProductSalesDaily, RelatedProduct, StaleRelatedProduct, StockReservation, Wishlist,
+)
+from .payments import apply_gateway_result, create_payment, sign_callback
+from .related import get_related_products, rebuild_related_products
+from .sales import refresh_sales_rollups
+from .search import SEARCH_RESULT_LIMIT, get_search_backend, search_products
+from .stock import InsufficientStock, release_expired_reservations, release_reservations, reserve_stock
+from .views import CSRF_TOKEN_PLACEHOLDER
+
+
+class CartSummaryTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.category = ProductCategory.objects.create(name='Coffee')
+		self.product = Product.objects.create(
+			name='House Blend', category=self.category, price=Decimal('5000.00'), stock_quantity=20,
+		)
+
+	def add(self, product, quantity):
+		return self.client.post(reverse('shop:add_to_cart'), {'product_id': product.id, 'quantity': quantity})
+
+	def test_add_to_cart_stores_summary_in_session(self):
+		self.add(self.product, 2)
+		summary = self.client.session[CART_SUMMARY_SESSION_KEY]
+		self.assertEqual(summary['item_count'], 2)
+		self.assertEqual(summary['line_count'], 1)
+		self.assertEqual(Decimal(summary['total']), Decimal('10000.00'))
+
+	def test_product_list_runs_no_cart_queries(self):
+		self.add(self.product, 3)
+		with CaptureQueriesContext(connection) as ctx:
+			response = self.client.get(reverse('shop:product_list'))
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.context['cart_count'], 3)
+		self.assertFalse([q for q in ctx.captured_queries if 'shop_cart' in q['sql']])
+
+	def test_cart_follows_the_session_through_login(self):
+		self.add(self.product, 3)
+		user = get_user_model().objects.create_user(username='ama', email='ama@example.com', password='pw')
+		# login() gives the session a new key; the cart must still be found
+		self.client.force_login(user)
+		response = self.client.get(reverse('shop:view_cart'))
+		self.assertEqual([item.quantity for item in response.context['items']], [3])
+		response = self.client.get(reverse('shop:checkout'))
+		self.assertEqual(len(response.context['items']), 1)
+
+	def test_pages_without_the_cart_leave_the_session_alone(self):
+		self.add(self.product, 1)
+		response = self.client.get(reverse('core:about'))
+		self.assertEqual(response.status_code, 200)
+		self.assertNotIn('Cookie', response.get('Vary', ''))
+		self.assertIn('Cookie', self.client.get(reverse('shop:product_list')).get('Vary', ''))
+
+
+class CategoryCatalogTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.coffee = ProductCategory.objects.create(name='Coffee')
+		self.merch = ProductCategory.objects.create(name='Merch')
+		Product.objects.create(name='House Blend', category=self.coffee, price=Decimal('5000.00'))
+		Product.objects.create(name='Espresso', category=self.coffee, price=Decimal('6000.00'))
+		Product.objects.create(name='Old Mug', category=self.merch, price=Decimal('3000.00'), is_active=False)
+
+	def test_counts_come_from_one_query_and_are_cached(self):
+		with self.assertNumQueries(1):
+			counts = {c.name: c.product_count for c in get_category_catalog()}
+		self.assertEqual(counts, {'Coffee': 2, 'Merch': 0})
+		with self.assertNumQueries(0):
+			get_category_catalog()
+
+	def test_product_save_invalidates_catalog(self):
+		get_category_catalog()
+		Product.objects.create(name='New Mug', category=self.merch, price=Decimal('3500.00'))
+		counts = {c.name: c.product_count for c in get_category_catalog()}
+		self.assertEqual(counts['Merch'], 1)
+
+
+class ProductRatingSummaryTest(TestCase):
+	def setUp(self):
+		self.product = Product.objects.create(name='House Blend', price=Decimal('5000.00'))
+
+	def review(self, rating, approved=True):
+		return ProductReview.objects.create(
+			product=self.product, customer_name='Ama', customer_email='ama@example.com',
+			rating=rating, comment='Great', is_approved=approved,
+		)
+
+	def test_summary_tracks_approval_and_deletion(self):
+		self.review(5)
+		pending = self.review(3, approved=False)
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.review_count, 1)
+		self.assertEqual(self.product.average_rating, 5.0)
+
+		pending.is_approved = True
+		pending.save()
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.rating_histogram, {'5': 1, '3': 1})
+		self.assertEqual(self.product.average_rating, 4.0)
+
+		pending.delete()
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.review_count, 1)
+		self.assertEqual(self.product.average_rating, 5.0)
+
+	def test_rebuild_command_matches_incremental_summary(self):
+		self.review(4)
+		self.review(2)
+		Product.objects.update(rating_count=0, rating_average=None, rating_histogram={})
+		call_command('rebuild_product_ratings', stdout=StringIO())
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.review_count, 2)
+		self.assertEqual(self.product.average_rating, 3.0)
+
+
+class ProductSearchTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		beans = ProductCategory.objects.create(name='Beans')
+		self.described = Product.objects.create(
+			name='Morning Blend', price=Decimal('4000.00'), description='Smooth arabica from Huye',
+		)
+		self.named = Product.objects.create(name='Huye Arabica', price=Decimal('6000.00'), category=beans)
+		Product.objects.create(name='Ceramic Mug', price=Decimal('3000.00'))
+
+	def ranked_names(self, query):
+		return [p.name for p in search_products(Product.objects.all(), query)]
+
+	def test_name_hits_rank_above_description_hits(self):
+		self.assertEqual(self.ranked_names('arabica'), ['Huye Arabica', 'Morning Blend'])
+
+	def test_index_follows_product_changes(self):
+		self.named.name = 'Nyungwe Reserve'
+		self.named.save()
+		self.assertEqual(self.ranked_names('huye'), ['Morning Blend'])
+		self.assertEqual(self.ranked_names('bean'), ['Nyungwe Reserve'])
+
+	@override_settings(SHOP_SEARCH_BACKEND='python')
+	def test_python_fallback_ranks_the_same_way(self):
+		self.assertEqual(self.ranked_names('arabica'), ['Huye Arabica', 'Morning Blend'])
+		self.assertEqual(self.ranked_names('mug'), ['Ceramic Mug'])
+
+	def test_product_list_search(self):
+		response = self.client.get(reverse('shop:product_list'), {'q': 'arabica'})
+		self.assertEqual([p.name for p in response.context['products']], ['Huye Arabica', 'Morning Blend'])
+
+	def test_filters_apply_before_results_are_cut(self):
+		# More retired name hits than SEARCH_RESULT_LIMIT, all ranking above the one on sale
+		Product.objects.bulk_create(
+			Product(name=f'Arabica {i}', slug=f'arabica-{i}', price=Decimal('5000.00'), is_active=False)
+			for i in range(SEARCH_RESULT_LIMIT + 5)
+		)
+		for backend in ('fts5', 'python'):
+			with self.subTest(backend=backend), self.settings(SHOP_SEARCH_BACKEND=backend):
+				get_search_backend().rebuild()
+				response = self.client.get(reverse('shop:product_list'), {'q': 'arabica', 'category': 'beans'})
+				self.assertEqual([p.name for p in response.context['products']], ['Huye Arabica'])
+				response = self.client.get(reverse('shop:product_list'), {'q': 'arabica', 'max_price': '5000'})
+				self.assertEqual([p.name for p in response.context['products']], ['Morning Blend'])
+
+	def test_python_backend_checks_matches_a_page_at_a_time(self):
+		Product.objects.bulk_create(
+			Product(name=f'Arabica {i}', slug=f'arabica-{i}', price=Decimal('5000.00'), is_active=i % 2 == 0)
+			for i in range(SEARCH_RESULT_LIMIT * 3)
+		)
+		with self.settings(SHOP_SEARCH_BACKEND='python'):
+			backend = get_search_backend()
+			backend.rebuild()
+			with mock.patch.object(QuerySet, 'filter', autospec=True, side_effect=QuerySet.filter) as filter_:
+				ranked = list(backend.rank(Product.objects.filter(is_active=True), 'arabica').values_list('pk', flat=True))
+		self.assertEqual(len(ranked), SEARCH_RESULT_LIMIT)
+		id_lists = [call.kwargs['pk__in'] for call in filter_.call_args_list if 'pk__in' in call.kwargs]
+		self.assertTrue(id_lists)
+		self.assertLessEqual(max(len(ids) for ids in id_lists), SEARCH_RESULT_LIMIT)
+
+
+class KeysetPaginationTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		for i in range(20):
+			# Equal prices force the id tiebreaker
+			Product.objects.create(name=f'Blend {i:02d}', price=Decimal(1000 + (i // 4) * 100))
+
+	def walk(self, sort):
+		names, cursor = [], None
+		while True:
+			params = {'sort': sort}
+			if cursor:
+				params['cursor'] = cursor
+			with CaptureQueriesContext(connection) as ctx:
+				response = self.client.get(reverse('shop:product_list'), params)
+			self.assertFalse([q for q in ctx.captured_queries if 'COUNT(*)' in q['sql'] or 'OFFSET' in q['sql']])
+			page = response.context['page_obj']
+			names.extend(p.name for p in page)
+			if not page.has_next():
+				return names, page
+			cursor = page.next_cursor
+
+	def test_pages_cover_every_product_once_in_sort_order(self):
+		names, last_page = self.walk('price')
+		expected = [p.name for p in Product.objects.order_by('price', 'pk')]
+		self.assertEqual(names, expected)
+		self.assertEqual(len(last_page), 2)
+
+	def test_previous_cursor_returns_the_preceding_page(self):
+		names, last_page = self.walk('-created_at')
+		response = self.client.get(reverse('shop:product_list'), {'sort': '-created_at', 'cursor': last_page.previous_cursor})
+		self.assertEqual([p.name for p in response.context['page_obj']], names[9:18])
+
+	def test_tampered_cursor_falls_back_to_first_page(self):
+		response = self.client.get(reverse('shop:product_list'), {'cursor': 'not-a-cursor'})
+		self.assertEqual(len(response.context['page_obj']), 9)
+		self.assertFalse(response.context['page_obj'].has_previous())
+
+
+class CartMutationTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.coffee = Product.objects.create(name='House Blend', price=Decimal('5000.00'))
+		self.mug = Product.objects.create(name='Mug', price=Decimal('3000.00'))
+		self.cart = Cart.objects.create(session_key='abc')
+
+	def test_add_item_increments_existing_line_in_one_statement(self):
+		add_item(self.cart.pk, self.coffee.pk, 2)
+		with self.assertNumQueries(1):
+			add_item(self.cart.pk, self.coffee.pk, 3)
+		self.assertEqual(CartItem.objects.get(cart=self.cart, product=self.coffee).quantity, 5)
+
+	def test_add_item_rejects_inactive_products(self):
+		self.mug.is_active = False
+		self.mug.save()
+		with self.assertRaises(Product.DoesNotExist):
+			add_item(self.cart.pk, self.mug.pk, 1)
+
+	def test_update_quantities_batches_changes_and_removals(self):
+		add_item(self.cart.pk, self.coffee.pk, 1)
+		add_item(self.cart.pk, self.mug.pk, 1)
+		coffee_line = CartItem.objects.get(product=self.coffee)
+		mug_line = CartItem.objects.get(product=self.mug)
+		self.assertEqual(update_quantities(self.cart.pk, {coffee_line.pk: 4, mug_line.pk: 0}), 2)
+		self.assertEqual(list(self.cart.items.values_list('product__name', 'quantity')), [('House Blend', 4)])
+
+	def test_add_to_cart_recovers_from_a_removed_cart(self):
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': self.coffee.pk, 'quantity': 1})
+		Cart.objects.exclude(pk=self.cart.pk).delete()
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': self.mug.pk, 'quantity': 2})
+		self.assertEqual(self.client.session[CART_SUMMARY_SESSION_KEY]['item_count'], 2)
+
+
+CHECKOUT_DATA = {
+	'full_name': 'Ama Uwase', 'email': 'ama@example.com', 'phone': '0788000000',
+	'country': 'Rwanda', 'city': 'Kigali', 'zip_code': '00000', 'delivery_method': 'pickup',
+	'payment_method': 'bank',
+}
+
+
+class CheckoutOrderItemsTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		set_exchange_rates({'USD': Decimal('1450')})
+		self.coffee = Product.objects.create(name='House Blend', price=Decimal('5000.00'), currency='RWF')
+		self.mug = Product.objects.create(name='Mug', price=Decimal('12.50'), currency='USD')
+
+	def test_checkout_snapshots_cart_lines(self):
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': self.coffee.pk, 'quantity': 2})
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': self.mug.pk, 'quantity': 1})
+		response = self.client.post(reverse('shop:checkout'), CHECKOUT_DATA)
+		self.assertRedirects(response, reverse('shop:order_success'))
+
+		order = Order.objects.get()
+		self.assertFalse(Cart.objects.exists())
+		# The total is in the base currency: 2 x 5000 RWF + 12.50 USD at 1450
+		self.assertEqual(order.total_amount, Decimal('28125.00'))
+		# Later price changes do not rewrite the order
+		Product.objects.filter(pk=self.coffee.pk).update(price=Decimal('9999.00'))
+		self.assertEqual(
+			list(order.items.values_list('product_name', 'unit_price', 'currency', 'quantity')),
+			[('House Blend', Decimal('5000.00'), 'RWF', 2), ('Mug', Decimal('12.50'), 'USD', 1)],
+		)
+
+
+class StockReservationTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.coffee = Product.objects.create(name='House Blend', price=Decimal('5000.00'), stock_quantity=3)
+		self.untracked = Product.objects.create(name='Gift Card', price=Decimal('10000.00'))
+
+	def order(self):
+		return Order.objects.create(
+			full_name='Ama', email='ama@example.com', phone='0788000000', country='Rwanda',
+			city='Kigali', zip_code='00000', total_amount=Decimal('0'),
+		)
+
+	def stock(self):
+		return Product.objects.get(pk=self.coffee.pk).stock_quantity
+
+	def test_reserve_decrements_tracked_stock_only(self):
+		order = self.order()
+		reservations = reserve_stock(order, [(self.coffee, 2), (self.untracked, 5)])
+		self.assertEqual(len(reservations), 1)
+		self.assertEqual(self.stock(), 1)
+
+	def test_insufficient_stock_rolls_back_every_line(self):
+		mug = Product.objects.create(name='Mug', price=Decimal('3000.00'), stock_quantity=10)
+		with self.assertRaises(InsufficientStock):
+			reserve_stock(self.order(), [(mug, 2), (self.coffee, 4)])
+		self.assertEqual(Product.objects.get(pk=mug.pk).stock_quantity, 10)
+		self.assertFalse(StockReservation.objects.exists())
+
+	def test_release_and_expiry_return_stock_once(self):
+		order = self.order()
+		reserve_stock(order, [(self.coffee, 2)])
+		self.assertEqual(release_reservations(order), 1)
+		self.assertEqual(release_reservations(order), 0)
+		self.assertEqual(self.stock(), 3)
+
+		other = self.order()
+		reserve_stock(other, [(self.coffee, 1)])
+		self.assertEqual(release_expired_reservations(timezone.now() + timedelta(hours=1)), 1)
+		self.assertEqual(self.stock(), 3)
+
+	def test_checkout_refuses_to_oversell(self):
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': self.coffee.pk, 'quantity': 4})
+		response = self.client.post(reverse('shop:checkout'), CHECKOUT_DATA)
+		self.assertContains(response, 'does not have enough stock')
+		self.assertFalse(Order.objects.exists())
+		self.assertEqual(self.stock(), 3)
+
+
+class ConcurrentCheckoutTest(TransactionTestCase):
+	"""Parallel checkouts against one product must never oversell it"""
+
+	def test_parallel_reservations_never_oversell(self):
+		product = Product.objects.create(name='Limited Roast', price=Decimal('8000.00'), stock_quantity=5)
+		orders = [
+			Order.objects.create(
+				full_name=f'Buyer {i}', email='buyer@example.com', phone='0788000000', country='Rwanda',
+				city='Kigali', zip_code='00000', total_amount=Decimal('8000.00'),
+			)
+			for i in range(12)
+		]
+		results = []
+		barrier = threading.Barrier(len(orders))
+
+		def checkout(order):
+			barrier.wait()
+			try:
+				for attempt in range(50):
+					try:
+						reserve_stock(order, [(product, 1)])
+						results.append('reserved')
+						return
+					except OperationalError:
+						# SQLite allows one writer at a time; other engines block instead
+						time.sleep(0.01)
+			except InsufficientStock:
+				results.append('sold out')
+			finally:
+				connection.close()
+
+		threads = [threading.Thread(target=checkout, args=(order,)) for order in orders]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		self.assertEqual(results.count('reserved'), 5)
+		self.assertEqual(results.count('sold out'), 7)
+		self.assertEqual(Product.objects.get(pk=product.pk).stock_quantity, 0)
+		self.assertEqual(StockReservation.objects.filter(product=product).count(), 5)
+
+
+CARD_CHECKOUT_DATA = dict(
+	CHECKOUT_DATA, payment_method='card', card_number='4242 4242 4242 4242',
+	card_name='Ama Uwase', card_expiry='12/30', card_cvv='123',
+)
+
+
+class PaymentCallbackTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.coffee = Product.objects.create(name='House Blend', price=Decimal('5000.00'), stock_quantity=5)
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': self.coffee.pk, 'quantity': 2})
+
+	def checkout(self):
+		with mock.patch('shop.payments.threading.Thread') as thread:
+			with self.captureOnCommitCallbacks() as callbacks:
+				response = self.client.post(reverse('shop:checkout'), CARD_CHECKOUT_DATA)
+			self.assertRedirects(response, reverse('shop:order_success'))
+			# The gateway is contacted after commit, off the request thread
+			thread.assert_not_called()
+			for callback in callbacks:
+				callback()
+			thread.assert_called_once()
+		return Payment.objects.get()
+
+	def callback(self, payment, status, signature=None):
+		body = json.dumps({'status': status, 'transaction_id': 'tx-1'}).encode()
+		with self.captureOnCommitCallbacks(execute=True):
+			return self.client.post(
+				reverse('shop:payment_callback', args=[payment.reference]), body,
+				content_type='application/json', HTTP_X_PAYMENT_SIGNATURE=signature or sign_callback(payment.reference, body),
+			)
+
+	def stock(self):
+		return Product.objects.get(pk=self.coffee.pk).stock_quantity
+
+	def test_checkout_leaves_payment_pending(self):
+		payment = self.checkout()
+		self.assertEqual((payment.status, payment.order.status), ('pending', 'pending'))
+		self.assertEqual(payment.details, {'card_last4': '4242', 'card_name': 'Ama Uwase'})
+		self.assertEqual(self.stock(), 3)
+		self.assertContains(self.client.get(reverse('shop:order_success')), 'waiting for your payment provider')
+
+	def test_success_callback_is_idempotent(self):
+		payment = self.checkout()
+		response = self.callback(payment, 'succeeded')
+		self.assertEqual(response.json()['changed'], True)
+		self.assertEqual(len(mail.outbox), 1)
+
+		response = self.callback(payment, 'succeeded')
+		self.assertEqual(response.status_code, 200)
+		self.assertEqual(response.json()['changed'], False)
+		self.assertEqual(len(mail.outbox), 1)
+
+		self.assertEqual(Order.objects.get().status, 'paid')
+		self.assertEqual(StockReservation.objects.get().status, 'committed')
+		self.assertEqual(self.callback(payment, 'failed').status_code, 409)
+		self.assertEqual(self.stock(), 3)
+
+	def test_failure_callback_releases_stock(self):
+		payment = self.checkout()
+		self.assertEqual(self.callback(payment, 'failed').status_code, 200)
+		self.assertEqual(Order.objects.get().status, 'failed')
+		self.assertEqual(self.stock(), 5)
+
+	def test_success_after_expiry_takes_stock_again(self):
+		payment = self.checkout()
+		self.assertEqual(release_expired_reservations(timezone.now() + timedelta(hours=1)), 1)
+		self.assertEqual(self.stock(), 5)
+		self.callback(payment, 'succeeded')
+		self.assertEqual(Order.objects.get().status, 'paid')
+		self.assertEqual(StockReservation.objects.get().status, 'committed')
+		self.assertEqual(self.stock(), 3)
+
+	def test_success_after_expiry_and_sell_out_is_not_fulfilled(self):
+		payment = self.checkout()
+		release_expired_reservations(timezone.now() + timedelta(hours=1))
+		# Another customer bought the released stock meanwhile
+		Product.objects.filter(pk=self.coffee.pk).update(stock_quantity=1)
+		self.assertEqual(self.callback(payment, 'succeeded').status_code, 200)
+
+		self.assertEqual(Payment.objects.get().status, 'succeeded')
+		self.assertEqual(Order.objects.get().status, 'refund_due')
+		self.assertEqual(StockReservation.objects.get().status, 'released')
+		self.assertEqual(self.stock(), 1)
+		self.assertEqual([message.subject for message in mail.outbox], [f'Refund needed for order #{payment.order_id}'])
+		self.assertFalse(ProductSalesDaily.objects.exists())
+
+	def test_bank_transfers_hold_stock_longer(self):
+		self.client.post(reverse('shop:checkout'), CHECKOUT_DATA)
+		self.assertGreater(StockReservation.objects.get().expires_at, timezone.now() + timedelta(hours=24))
+		self.assertEqual(release_expired_reservations(timezone.now() + timedelta(hours=1)), 0)
+
+	def test_rejects_unsigned_callbacks(self):
+		payment = self.checkout()
+		self.assertEqual(self.callback(payment, 'succeeded', signature='forged').status_code, 403)
+		self.assertEqual(Payment.objects.get().status, 'pending')
+
+	def test_rejects_callbacks_replayed_against_another_payment(self):
+		payment = self.checkout()
+		other = create_payment(payment.order, 'card', {})
+		body = json.dumps({'status': 'succeeded', 'transaction_id': 'tx-1'}).encode()
+		response = self.client.post(
+			reverse('shop:payment_callback', args=[other.reference]), body,
+			content_type='application/json', HTTP_X_PAYMENT_SIGNATURE=sign_callback(payment.reference, body),
+		)
+		self.assertEqual(response.status_code, 403)
+		self.assertEqual(set(Payment.objects.values_list('status', flat=True)), {'pending'})
+
+
+class InlineThread(threading.Thread):
+	"""Runs its target on start(), so background dispatch is deterministic in tests"""
+
+	def start(self):
+		self.run()
+
+
+@override_settings(SHOP_PAYMENT_STUB_DELAY=0)
+class StubGatewayTest(TransactionTestCase):
+	def test_stub_gateway_confirms_after_checkout(self):
+		product = Product.objects.create(name='House Blend', price=Decimal('5000.00'), stock_quantity=5)
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': product.pk, 'quantity': 1})
+		with mock.patch('shop.payments.threading.Thread', InlineThread):
+			self.client.post(reverse('shop:checkout'), CARD_CHECKOUT_DATA)
+
+		self.assertEqual(Payment.objects.get().status, 'succeeded')
+		self.assertEqual(Order.objects.get().status, 'paid')
+		self.assertEqual(StockReservation.objects.get().status, 'committed')
+
+
+class AbandonedCartSweepTest(TestCase):
+	def test_sweeps_old_carts_without_orders(self):
+		product = Product.objects.create(name='House Blend', price=Decimal('5000.00'))
+		old = timezone.now() - timedelta(days=45)
+		stale = [Cart.objects.create(session_key=f'stale{i}') for i in range(3)]
+		ordered = Cart.objects.create(session_key='ordered')
+		fresh = Cart.objects.create(session_key='fresh')
+		for cart in stale + [ordered, fresh]:
+			CartItem.objects.create(cart=cart, product=product, quantity=1)
+		Cart.objects.exclude(pk=fresh.pk).update(created_at=old)
+		Order.objects.create(
+			cart=ordered, full_name='Ama', email='ama@example.com', phone='0788000000',
+			country='Rwanda', city='Kigali', zip_code='00000', total_amount=Decimal('5000.00'),
+		)
+		Session.objects.create(session_key='expired', session_data='', expire_date=old)
+
+		out = StringIO()
+		call_command('sweep_abandoned_carts', '--chunk-size', '2', stdout=out)
+		self.assertIn('3 carts, 3 cart items, 1 expired sessions', out.getvalue())
+		self.assertEqual(set(Cart.objects.values_list('session_key', flat=True)), {'ordered', 'fresh'})
+		self.assertEqual(CartItem.objects.count(), 2)
+
+
+class AdminExportTest(TestCase):
+	def setUp(self):
+		admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass')
+		self.client.force_login(admin_user)
+		for i in range(3):
+			product = Product.objects.create(name=f'Blend {i}', price=Decimal('5000.00'))
+			order = Order.objects.create(
+				full_name='Ama', email='ama@example.com', phone='0788000000', country='Rwanda',
+				city='Kigali', zip_code='00000', total_amount=Decimal('5000.00'), status='paid',
+			)
+			order.items.create(product=product, product_name=product.name, unit_price=product.price, quantity=i + 1)
+
+	def export(self, action):
+		return self.client.post(reverse('admin:shop_product_changelist'), {
+			'action': action,
+			'_selected_action': Product.objects.values_list('pk', flat=True),
+		})
+
+	def test_exports_stream_every_format(self):
+		response = self.export('export_as_csv')
+		self.assertTrue(response.streaming)
+		rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))
+		self.assertEqual(rows[0], ['Name', 'Description', 'Price', 'Currency', 'Active', 'Total Sold'])
+		self.assertEqual(sorted(row[5] for row in rows[1:]), ['1', '2', '3'])
+
+		response = self.export('export_as_csv_gzip')
+		self.assertEqual(response['Content-Type'], 'application/gzip')
+		self.assertEqual(len(gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()), 4)
+
+		response = self.export('export_as_jsonl')
+		records = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+		self.assertEqual(sorted(record['Total Sold'] for record in records), [1, 2, 3])
+
+
+class AdminSettleOrdersTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+		self.coffee = Product.objects.create(name='House Blend', price=Decimal('5000.00'), stock_quantity=5)
+
+	def order(self):
+		# Placed before payments were recorded, so there is no Payment row
+		order = Order.objects.create(
+			full_name='Ama', email='ama@example.com', phone='0788000000', country='Rwanda',
+			city='Kigali', zip_code='00000', total_amount=Decimal('10000.00'),
+		)
+		order.items.create(product=self.coffee, product_name=self.coffee.name, unit_price=self.coffee.price, quantity=2)
+		reserve_stock(order, [(self.coffee, 2)])
+		return order
+
+	def settle(self, action, order):
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post(reverse('admin:shop_order_changelist'), {'action': action, '_selected_action': [order.pk]})
+		order.refresh_from_db()
+
+	def stock(self):
+		return Product.objects.get(pk=self.coffee.pk).stock_quantity
+
+	def test_orders_without_payment_follow_the_payment_path(self):
+		order = self.order()
+		refresh_sales_rollups()
+		ImpactCounter.objects.create(name='coffee_cups_sold')
+
+		self.settle('mark_as_paid', order)
+		self.assertEqual(order.status, 'paid')
+		self.assertEqual(StockReservation.objects.get(order=order).status, 'committed')
+		self.assertEqual(ProductSalesDaily.objects.get().units, 2)
+		self.assertEqual(ImpactCounter.objects.get().value, 2)
+
+		self.settle('mark_as_paid', order)
+		self.assertEqual(ImpactCounter.objects.get().value, 2)
+
+		self.settle('mark_as_failed', order)
+		self.assertEqual(order.status, 'failed')
+		self.assertEqual(ProductSalesDaily.objects.get().units, 0)
+		self.assertEqual(ImpactCounter.objects.get().value, 0)
+
+	def test_failing_an_order_without_payment_releases_its_stock(self):
+		order = self.order()
+		self.assertEqual(self.stock(), 3)
+		self.settle('mark_as_failed', order)
+		self.assertEqual(order.status, 'failed')
+		self.assertEqual(StockReservation.objects.get(order=order).status, 'released')
+		self.assertEqual(self.stock(), 5)
+
+
+class AdminChangelistQueryTest(TestCase):
+	def setUp(self):
+		self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+		self.category = ProductCategory.objects.create(name='Coffee')
+
+	def add_rows(self, count):
+		for i in range(count):
+			product = Product.objects.create(name=f'Blend {Product.objects.count()}', category=self.category, price=Decimal('5000.00'))
+			cart = Cart.objects.create(session_key=f'cart{product.pk}')
+			CartItem.objects.create(cart=cart, product=product, quantity=2)
+			order = Order.objects.create(
+				cart=cart, full_name='Ama', email='ama@example.com', phone='0788000000',
+				country='Rwanda', city='Kigali', zip_code='00000', total_amount=Decimal('10000.00'),
+			)
+			OrderItem.objects.create(order=order, product=product, product_name=product.name, unit_price=product.price, quantity=2)
+
+	def count_queries(self, url):
+		with CaptureQueriesContext(connection) as queries:
+			self.assertEqual(self.client.get(url).status_code, 200)
+		return len(queries)
+
+	def test_changelist_queries_do_not_grow_with_rows(self):
+		urls = [reverse(f'admin:shop_{model}_changelist') for model in ('product', 'cart', 'order')]
+		self.add_rows(2)
+		# The first request also fills the session's cart summary
+		self.client.get(urls[0])
+		few = [self.count_queries(url) for url in urls]
+		self.add_rows(10)
+		self.assertEqual([self.count_queries(url) for url in urls], few)
+
+	def test_product_sales_come_from_order_lines(self):
+		self.add_rows(1)
+		Order.objects.create(
+			full_name='Ama', email='ama@example.com', phone='0788000000', country='Rwanda',
+			city='Kigali', zip_code='00000', total_amount=Decimal('0'), status='failed',
+		).items.create(product=Product.objects.get(), product_name='Blend 0', unit_price=Decimal('5000.00'), quantity=7)
+		product = annotate_sales(Product.objects.all()).get()
+		self.assertEqual((product.quantity_sold, product.orders_count), (0, 0))
+		Order.objects.filter(status='pending').update(status='paid')
+		product = annotate_sales(Product.objects.all()).get()
+		self.assertEqual((product.quantity_sold, product.orders_count), (2, 1))
+
+	def test_cart_value_is_summed_in_the_base_currency(self):
+		ExchangeRate.objects.create(currency='USD', rate=Decimal('1300'))
+		cart = Cart.objects.create(session_key='mixed')
+		cart.items.create(product=Product.objects.create(name='Blend', price=Decimal('5000.00')), quantity=2)
+		cart.items.create(product=Product.objects.create(name='Beans', price=Decimal('4.00'), currency='USD'), quantity=1)
+		response = self.client.get(reverse('admin:shop_cart_changelist'))
+		self.assertContains(response, 'RWF 15200')
+
+
+class WishlistTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.user = get_user_model().objects.create_user('ama', 'ama@example.com', 'pass')
+		self.client.force_login(self.user)
+		self.products = [Product.objects.create(name=f'Blend {i}', price=Decimal('5000.00')) for i in range(4)]
+
+	def toggle(self, **payload):
+		return self.client.post(reverse('shop:toggle_wishlist'), json.dumps(payload), content_type='application/json')
+
+	def test_bulk_toggle(self):
+		ids = [product.pk for product in self.products]
+		response = self.toggle(add=ids[:3])
+		self.assertEqual(response.json()['added'], 3)
+		response = self.toggle(add=ids[2:], remove=ids[:1])
+		self.assertEqual((response.json()['added'], response.json()['removed']), (1, 1))
+		self.assertEqual(response.json()['in_wishlist'], ids[2:])
+		self.assertEqual(
+			set(Wishlist.objects.filter(user=self.user).values_list('product_id', flat=True)), set(ids[1:])
+		)
+		self.assertEqual(self.toggle(add=['x']).status_code, 400)
+
+	def test_catalog_membership_costs_one_query(self):
+		url = reverse('shop:product_list')
+		self.client.get(url)
+		with CaptureQueriesContext(connection) as empty:
+			self.client.get(url)
+		self.toggle(add=[product.pk for product in self.products])
+		with CaptureQueriesContext(connection) as full:
+			response = self.client.get(url)
+		self.assertEqual(len(full), len(empty))
+		self.assertContains(response, 'data-in-wishlist="true"', count=4)
+
+
+class RelatedProductsTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.coffee = ProductCategory.objects.create(name='Coffee')
+		self.gear = ProductCategory.objects.create(name='Gear')
+		self.house = Product.objects.create(name='House Blend', category=self.coffee, price=Decimal('5000.00'))
+		self.espresso = Product.objects.create(name='Espresso', category=self.coffee, price=Decimal('5500.00'))
+		self.decaf = Product.objects.create(name='Decaf', category=self.coffee, price=Decimal('20000.00'))
+		self.grinder = Product.objects.create(name='Grinder', category=self.gear, price=Decimal('40000.00'))
+
+	def buy(self, *products, status='paid'):
+		order = Order.objects.create(
+			full_name='Ama', email='ama@example.com', phone='0788000000', country='Rwanda',
+			city='Kigali', zip_code='00000', total_amount=Decimal('0'), status=status,
+		)
+		for product in products:
+			order.items.create(product=product, product_name=product.name, unit_price=product.price, quantity=1)
+
+	def related_names(self, product):
+		return [related.name for related in get_related_products(product)]
+
+	def test_rebuild_ranks_co_purchases_then_category_and_price(self):
+		self.buy(self.house, self.grinder)
+		self.buy(self.house, self.grinder)
+		self.buy(self.house, self.decaf, status='failed')
+		rebuild_related_products()
+		self.assertEqual(self.related_names(self.house), ['Grinder', 'Espresso', 'Decaf'])
+		with self.assertNumQueries(1):
+			get_related_products(self.house)
+
+	def test_changed_products_are_refreshed_by_the_command(self):
+		rebuild_related_products()
+		self.assertFalse(StaleRelatedProduct.objects.exists())
+		self.assertIn('Espresso', self.related_names(self.house))
+		self.espresso.name = 'Espresso Roast'
+		self.espresso.save()
+		self.assertFalse(StaleRelatedProduct.objects.exists())
+
+		self.espresso.is_active = False
+		self.espresso.save()
+		self.assertEqual(list(StaleRelatedProduct.objects.values_list('product_id', flat=True)), [self.espresso.pk])
+		out = StringIO()
+		call_command('refresh_related_products', stdout=out)
+		self.assertIn('of 3 products', out.getvalue())
+		self.assertFalse(StaleRelatedProduct.objects.exists())
+		self.assertEqual(self.related_names(self.house), ['Decaf'])
+
+	def test_prices_compare_in_base_currency(self):
+		set_exchange_rates({'USD': '1400'})
+		# 3.60 USD is 5040 RWF, closer to House Blend's 5000 than Espresso
+		self.decaf.price, self.decaf.currency = Decimal('3.60'), 'USD'
+		self.decaf.save()
+		rebuild_related_products()
+		scores = dict(RelatedProduct.objects.filter(product=self.house).values_list('related__name', 'score'))
+		self.assertGreater(scores['Decaf'], scores['Espresso'])
+
+
+class ProductPageCacheTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.product = Product.objects.create(name='House Blend', price=Decimal('5000.00'), stock_quantity=5)
+		self.url = reverse('shop:product_detail', args=[self.product.slug])
+
+	def test_anonymous_pages_are_served_from_cache(self):
+		self.assertContains(self.client.get(self.url), 'House Blend')
+		# Visitors without a cart need no queries at all
+		with self.assertNumQueries(0):
+			response = self.client.get(self.url)
+		self.assertContains(response, 'House Blend')
+		self.assertNotContains(response, CSRF_TOKEN_PLACEHOLDER)
+
+	def test_cached_page_keeps_per_visitor_csrf_and_cart_badge(self):
+		self.client.get(self.url)
+		visitor = Client(enforce_csrf_checks=True)
+		response = visitor.get(self.url)
+		token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+		response = visitor.post(reverse('shop:add_to_cart'), {
+			'product_id': self.product.pk, 'quantity': 2, 'csrfmiddlewaretoken': token,
+		})
+		self.assertEqual(response.status_code, 302)
+		self.assertContains(visitor.get(self.url), 'items in cart')
+
+	def test_changes_invalidate_cached_page(self):
+		self.client.get(self.url)
+		self.product.name = 'House Blend Reserve'
+		self.product.save()
+		self.assertContains(self.client.get(self.url), 'House Blend Reserve')
+
+		ProductReview.objects.create(
+			product=self.product, customer_name='Kofi', customer_email='kofi@example.com',
+			rating=5, comment='Lovely cup', is_approved=True,
+		)
+		self.assertContains(self.client.get(self.url), 'Lovely cup')
+
+		order = Order.objects.create(
+			full_name='Ama', email='ama@example.com', phone='0788000000', country='Rwanda',
+			city='Kigali', zip_code='00000', total_amount=Decimal('0'),
+		)
+		with self.captureOnCommitCallbacks(execute=True):
+			reserve_stock(order, [(self.product, 5)])
+		self.assertContains(self.client.get(self.url), 'Out of Stock')
+
+
+class CatalogImportTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.category = ProductCategory.objects.create(name='Coffee')
+		self.product = Product.objects.create(name='House Blend', price=Decimal('5000.00'))
+
+	def run_import(self, text, file_format='csv', **kwargs):
+		return import_catalog(read_rows(io.StringIO(text), file_format), **kwargs)
+
+	def test_creates_and_updates_in_bulk(self):
+		rows = ''.join(f'blend-{i},Blend {i},coffee,{4000 + i}.00\n' for i in range(20))
+		text = 'slug,name,category,price\nhouse-blend,House Blend,coffee,5500.00\n' + rows
+		with CaptureQueriesContext(connection) as queries:
+			result = self.run_import(text, chunk_size=10)
+		self.assertTrue(result.ok)
+		self.assertEqual((result.created, result.updated), (20, 1))
+		self.product.refresh_from_db()
+		self.assertEqual((self.product.price, self.product.category), (Decimal('5500.00'), self.category))
+		self.assertEqual(Product.objects.get(slug='blend-7').category, self.category)
+		# Imported products are searchable without a save() per row
+		self.assertIn('Blend 7', [p.name for p in search_products(Product.objects.all(), 'Blend 7')])
+
+		self.assertEqual(self.run_import('{"slug": "blend-3", "price": "4003.00"}\n', 'jsonl').unchanged, 1)
+		with CaptureQueriesContext(connection) as more_queries:
+			self.run_import(rows.replace(',coffee,', ',,') + rows.replace('blend-', 'roast-'), chunk_size=10)
+		# Writes grow with chunks, not rows (the rebuild afterwards is the same either way)
+		self.assertLess(len(more_queries) - len(queries), 10)
+
+	def test_invalid_rows_are_reported_and_nothing_is_written(self):
+		result = self.run_import(
+			'slug,name,category,price,currency\n'
+			'house-blend,House Blend,,6000.00,RWF\n'
+			'new-blend,New Blend,tea,abc,GBP\n'
+			'no-price,No Price,,,RWF\n'
+			'house-blend,Again,,1.00,RWF\n'
+		)
+		self.assertFalse(result.ok)
+		self.assertEqual([line for line, _ in result.errors], [3, 4, 5])
+		self.assertIn('unknown category "tea"', result.errors[0][1])
+		self.assertIn('currency', result.errors[0][1])
+		self.assertIn('duplicate slug', result.errors[2][1])
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.price, Decimal('5000.00'))
+		self.assertEqual(Product.objects.count(), 1)
+
+		result = self.run_import('name,price\nNew Blend,4500\n', dry_run=True)
+		self.assertEqual((result.ok, result.created), (True, 1))
+		self.assertFalse(Product.objects.filter(slug='new-blend').exists())
+
+	def test_unreadable_files_and_values_are_reported(self):
+		result = self.run_import('slug,name\nhouse-blend,' + 'a' * (csv.field_size_limit() + 1) + '\n')
+		self.assertIn('Invalid CSV', result.errors[0][1])
+		result = import_catalog(read_rows(io.TextIOWrapper(io.BytesIO(b'slug,name\nhouse-blend,Caf\xe9\n'), encoding='utf-8'), 'csv'))
+		self.assertIn('not UTF-8', result.errors[0][1])
+		result = self.run_import('{"slug": "house-blend", "category": 5}\n', 'jsonl')
+		self.assertEqual(result.errors, [(1, 'category: expected a category slug')])
+		self.assertEqual(Product.objects.get(pk=self.product.pk).name, 'House Blend')
+
+		with tempfile.NamedTemporaryFile('wb', suffix='.csv') as catalog:
+			catalog.write(b'slug,name\nhouse-blend,Caf\xe9\n')
+			catalog.flush()
+			with self.assertRaises(CommandError):
+				call_command('import_catalog', catalog.name, stdout=StringIO(), stderr=StringIO())
+
+	def test_only_imported_products_are_reindexed(self):
+		Product.objects.create(name='Espresso', price=Decimal('6000.00'))
+		StaleRelatedProduct.objects.all().delete()
+		with mock.patch.object(type(get_search_backend()), 'rebuild') as rebuild:
+			self.run_import('slug,name,price\nhouse-blend,Huye Blend,5000.00\nnew-roast,New Roast,4000.00\n')
+		rebuild.assert_not_called()
+		self.assertEqual([p.name for p in search_products(Product.objects.all(), 'huye')], ['Huye Blend'])
+		# The renamed product scores the same; only the new one waits for refresh_related_products
+		self.assertEqual(list(StaleRelatedProduct.objects.values_list('product__slug', flat=True)), ['new-roast'])
+
+	def test_admin_upload_and_command(self):
+		self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+		url = reverse('admin:shop_product_import')
+		self.assertContains(self.client.get(reverse('admin:shop_product_changelist')), url)
+		upload = io.BytesIO(b'slug,price\nhouse-blend,4200.00\n')
+		upload.name = 'prices.csv'
+		response = self.client.post(url, {'file': upload, 'dry_run': ''}, follow=True)
+		self.assertContains(response, 'Catalog imported: 0 created, 1 updated')
+		self.product.refresh_from_db()
+		self.assertEqual(self.product.price, Decimal('4200.00'))
+
+		out = StringIO()
+		with tempfile.NamedTemporaryFile('w', suffix='.csv') as catalog:
+			catalog.write('slug,is_active\nhouse-blend,no\n')
+			catalog.flush()
+			call_command('import_catalog', catalog.name, stdout=out)
+		self.assertIn('1 updated', out.getvalue())
+		self.assertFalse(Product.objects.get(pk=self.product.pk).is_active)
+
+
+class ExchangeRateTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.coffee = Product.objects.create(name='House Blend', price=Decimal('5000.00'))
+		self.beans = Product.objects.create(name='Green Beans', price=Decimal('3.00'), currency='USD')
+		self.mug = Product.objects.create(name='Mug', price=Decimal('8.00'), currency='EUR')
+
+	def test_loading_rates_reprices_products(self):
+		self.assertEqual(self.coffee.base_price, Decimal('5000.00'))
+		self.assertIsNone(self.beans.base_price)
+		out = StringIO()
+		call_command('load_exchange_rates', 'USD=1450', 'eur=1580.55', stdout=out)
+		self.assertIn('repriced 2 products', out.getvalue())
+		self.assertEqual(
+			dict(Product.objects.values_list('name', 'base_price')),
+			{'House Blend': Decimal('5000.00'), 'Green Beans': Decimal('4350.00'), 'Mug': Decimal('12644.40')},
+		)
+		# New rates are loaded once, then read from the per-process copy after a version check
+		to_base(Decimal('1.00'), 'USD')
+		with self.assertNumQueries(1):
+			self.assertEqual(to_base(Decimal('2.00'), 'USD'), Decimal('2900.00'))
+		# A rate stored by another process is picked up without any cache invalidation
+		ExchangeRate.objects.filter(currency='USD').update(rate=Decimal('1500'), updated_at=timezone.now())
+		self.assertEqual(to_base(Decimal('2.00'), 'USD'), Decimal('3000.00'))
+		self.beans.price = Decimal('4.00')
+		self.beans.save()
+		self.assertEqual(Product.objects.get(pk=self.beans.pk).base_price, Decimal('6000.00'))
+
+	def test_products_without_a_rate_sort_last(self):
+		set_exchange_rates({'USD': Decimal('1450')})
+		for sort in ('price', '-price'):
+			names = [p.name for p in self.client.get(reverse('shop:product_list'), {'sort': sort}).context['products']]
+			self.assertEqual(names[-1], 'Mug')
+			self.assertEqual(len(names), 3)
+
+	def test_price_sort_filter_and_cart_total_use_base_price(self):
+		set_exchange_rates({'USD': Decimal('1450'), 'EUR': Decimal('1580')})
+		response = self.client.get(reverse('shop:product_list'), {'sort': 'price'})
+		self.assertEqual([p.name for p in response.context['products']], ['Green Beans', 'House Blend', 'Mug'])
+		response = self.client.get(reverse('shop:product_list'), {'sort': '-price', 'max_price': '6000'})
+		self.assertEqual([p.name for p in response.context['products']], ['House Blend', 'Green Beans'])
+
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': self.coffee.pk, 'quantity': 1})
+		self.client.post(reverse('shop:add_to_cart'), {'product_id': self.mug.pk, 'quantity': 2})
+		response = self.client.get(reverse('shop:view_cart'))
+		self.assertEqual(response.context['total'], Decimal('30280.00'))
+		self.assertEqual(Decimal(self.client.session['shop_cart_summary']['total']), Decimal('30280'))
+		self.assertContains(response, '30280.00 RWF')
+
+	def test_admin_edits_rates_by_row(self):
+		self.client.force_login(get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pass'))
+		response = self.client.post(reverse('admin:shop_exchangerate_add'), {'currency': 'RWF', 'rate': '1'})
+		self.assertEqual(response.status_code, 200)
+		self.assertIn('currency', response.context['adminform'].form.errors)
+		self.assertFalse(ExchangeRate.objects.exists())
+
+		self.client.post(reverse('admin:shop_exchangerate_add'), {'currency': 'USD', 'rate': '1450'})
+		rate = ExchangeRate.objects.get()
+		self.assertEqual(Product.objects.get(pk=self.beans.pk).base_price, Decimal('4350.00'))
+		# Moving the row to another currency updates it and unprices the old currency
+		self.client.post(reverse('admin:shop_exchangerate_change', args=[rate.pk]), {'currency': 'EUR', 'rate': '1580'})
+		self.assertEqual(list(ExchangeRate.objects.values_list('pk', 'currency')), [(rate.pk, 'EUR')])
+		self.assertIsNone(Product.objects.get(pk=self.beans.pk).base_price)
+		self.assertEqual(Product.objects.get(pk=self.mug.pk).base_price, Decimal('12640.00'))
+
+
+class SalesRollupTest(TestCase):
+	def setUp(self):
+		self.coffee = ProductCategory.objects.create(name='Coffee')
+		self.beans = Product.objects.create(name='House Blend', category=self.coffee, price=Decimal('5000.00'))
+		self.mug = Product.objects.create(name='Mug', price=Decimal('12.00'), currency='USD')
+
+	def order(self, status, lines, day):
+		order = Order.objects.create(
+			full_name='Ama', email='ama@example.com', phone='0788000000', country='Rwanda',
+			city='Kigali', zip_code='00000', total_amount=Decimal('0'), status=status,
+		)
+		Order.objects.filter(pk=order.pk).update(created_at=timezone.make_aware(timezone.datetime(2026, 3, day, 12)))
+		for product, quantity in lines:
+			OrderItem.objects.create(
+				order=order, product=product, product_name=product.name,
+				unit_price=product.price, currency=product.currency, quantity=quantity,
+			)
+		return order
+
+	def rollup(self):
+		return sorted(
+			(str(row.date), row.product_id, row.currency, row.units, row.revenue, row.order_count)
+			for row in ProductSalesDaily.objects.all()
+		)
+
+	def test_refresh_is_incremental_and_matches_rebuild(self):
+		self.order('paid', [(self.beans, 2), (self.mug, 1)], 1)
+		self.order('failed', [(self.beans, 9)], 1)
+		pending = self.order('pending', [(self.beans, 1)], 2)
+		self.assertEqual(refresh_sales_rollups(), 1)
+		self.order('paid', [(self.beans, 1)], 1)
+		self.assertEqual(refresh_sales_rollups(), 1)
+		self.assertEqual(refresh_sales_rollups(), 0)
+
+		# Paid after the cursor passed it; callbacks never wait on the cursor lock
+		payment = create_payment(pending, 'card', {})
+		with mock.patch('shop.sales._lock_cursor') as lock_cursor:
+			apply_gateway_result(payment.reference, 'succeeded')
+		lock_cursor.assert_not_called()
+
+		expected = [
+			('2026-03-01', self.beans.pk, 'RWF', 3, Decimal('15000.00'), 2),
+			('2026-03-01', self.mug.pk, 'USD', 1, Decimal('12.00'), 1),
+			('2026-03-02', self.beans.pk, 'RWF', 1, Decimal('5000.00'), 1),
+		]
+		self.assertEqual(self.rollup(), expected)
+		self.assertCountEqual(
+			CategorySalesDaily.objects.values_list('category_id', 'units'),
+			[(None, 1), (self.coffee.pk, 1), (self.coffee.pk, 3)],
+		)
+		out = StringIO()
+		call_command('rebuild_sales_rollups', stdout=out)
+		self.assertIn('3 paid orders', out.getvalue())
+		self.assertEqual(self.rollup(), expected)
+
+	def test_staff_endpoint_reads_rollups_only(self):
+		url = reverse('shop:sales_analytics')
+		self.order('paid', [(self.beans, 2)], 1)
+		self.order('paid', [(self.beans, 1)], 20)
+		refresh_sales_rollups()
+		self.assertEqual(self.client.get(url).status_code, 302)
+
+		self.client.force_login(get_user_model().objects.create_user('staff', 'staff@example.com', 'pass', is_staff=True))
+		with CaptureQueriesContext(connection) as queries:
+			response = self.client.get(url, {'by': 'category', 'period': 'month', 'start': '2026-03-01'})
+		self.assertFalse([q['sql'] for q in queries if 'shop_order' in q['sql']])
+		self.assertEqual(response.json()['series'], [{
+			'period': '2026-03', 'id': self.coffee.pk, 'name': 'Coffee', 'currency': 'RWF',
+			'units': 3, 'revenue': '15000.00', 'orders': 2,
+		}])
+		self.assertEqual(self.client.get(url, {'period': 'year'}).status_code, 400)
+
+
+class InventoryTest(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.untracked = Product.objects.create(name='Gift Card', price=Decimal('10000.00'))
+		self.beans = Product.objects.create(name='House Blend', price=Decimal('5000.00'), stock_quantity=12)
+
+	def order(self, product, quantity, status='paid'):
+		order = Order.objects.create(
+			full_name='Ama', email='ama@example.com', phone='0788000000', country='Rwanda',
+			city='Kigali', zip_code='00000', total_amount=Decimal('0'), status=status,
+		)
+		order.items.create(product=product, product_name=product.name, unit_price=product.price, quantity=quantity)
+		return order
+
+	def test_stock_state_follows_stock_changes(self):
+		self.assertEqual((self.untracked.stock_state, self.untracked.is_in_stock), ('untracked', True))
+		self.assertContains(self.client.get(reverse('shop:product_detail', args=[self.untracked.slug])), 'Add to Cart')
+		self.assertEqual(self.beans.stock_state, 'in_stock')
+
+		order = self.order(self.beans, 3, status='pending')
+		reserve_stock(order, [(self.beans, 3)])
+		self.assertEqual(Product.objects.get(pk=self.beans.pk).stock_state, 'low')
+		reserve_stock(self.order(self.beans, 9, status='pending'), [(self.beans, 9)])
+		self.assertFalse(Product.objects.get(pk=self.beans.pk).is_in_stock)
+		release_reservations(order)
+		self.assertEqual(Product.objects.get(pk=self.beans.pk).stock_state, 'low')
+
+		response = self.client.get(reverse('shop:product_list'))
+		self.assertContains(response, 'Low Stock', count=1)
+
+	def test_snapshot_records_cover_and_emails_one_digest(self):
+		mug = Product.objects.create(name='Mug', price=Decimal('8000.00'), stock_quantity=40)
+		self.order(self.beans, 6)
+		self.order(mug, 30)
+		self.order(mug, 5, status='failed')
+		today = timezone.localdate()
+
+		out = StringIO()
+		call_command('snapshot_inventory', stdout=out)
+		self.assertIn('0 products newly need restocking', out.getvalue())
+		snapshot = InventorySnapshot.objects.get(product=mug)
+		# 30 sold in 30 days with 40 left
+		self.assertEqual((snapshot.units_sold, snapshot.sell_through, snapshot.days_of_cover), (30, Decimal('42.86'), Decimal('40.0')))
+		self.assertEqual(len(mail.outbox), 0)
+
+		Product.objects.filter(pk=mug.pk).update(stock_quantity=5)
+		self.beans.stock_quantity = 2
+		self.beans.save()
+		alerts = take_inventory_snapshot(today + timedelta(days=1))
+		self.assertCountEqual([a.product_id for a in alerts], [mug.pk, self.beans.pk])
+		self.assertEqual(len(mail.outbox), 1)
+		self.assertIn('Mug: Low Stock (5 left, 5.0 days of cover', mail.outbox[0].body)
+		self.assertEqual(InventorySnapshot.objects.filter(date=today + timedelta(days=1)).count(), 3)
+
+		# Still low the next day: no new digest
+		take_inventory_snapshot(today + timedelta(days=2))
+		self.assertEqual(len(mail.outbox), 1)
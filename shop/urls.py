@@ -5,8 +5,8 @@ app_name = 'shop'
 
 from .views import (
     product_list, product_detail, add_to_cart, view_cart, 
-    checkout, order_success, add_to_wishlist, remove_from_wishlist, 
-    view_wishlist
+    checkout, order_success, payment_callback, add_to_wishlist, remove_from_wishlist, 
+    view_wishlist, toggle_wishlist, sales_analytics
 )
 
 urlpatterns = [
@@ -16,9 +16,14 @@ urlpatterns = [
     path('cart/', view_cart, name='view_cart'),
     path('checkout/', checkout, name='checkout'),
     path('order-success/', order_success, name='order_success'),
+    path('payments/<str:reference>/callback/', payment_callback, name='payment_callback'),
     
     # Wishlist URLs
     path('wishlist/', view_wishlist, name='view_wishlist'),
     path('wishlist/add/<int:product_id>/', add_to_wishlist, name='add_to_wishlist'),
     path('wishlist/remove/<int:product_id>/', remove_from_wishlist, name='remove_from_wishlist'),
+    path('wishlist/toggle/', toggle_wishlist, name='toggle_wishlist'),
+    
+    # Staff analytics
+    path('analytics/sales/', sales_analytics, name='sales_analytics'),
 ]
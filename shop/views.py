@@ -1,15 +1,49 @@
 
 from urllib import request
 from django.shortcuts import render
-from django.core.mail import send_mail
 from django.conf import settings
-from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
-from django.db.models import Q, Count
-from .models import Product, ProductCategory, Cart, CartItem, Order
+from decimal import Decimal
+from django.db.models import Q, Count, Value
+from django.db.models.functions import Coalesce
+from core.pagination import KeysetPaginator
+from django.db import transaction
+from .models import Product, ProductCategory, Cart, CartItem, Order, OrderItem, Payment
+from .cart import add_to_session_cart, get_cart, update_quantities, refresh_cart_summary, clear_cart_summary
+from .catalog import get_category_catalog, product_page_cache_key
+from .currency import MissingExchangeRate, cart_total
+from .forms import ProductFilterForm
+from .related import get_related_products
+from .search import search_products
+from .wishlist import get_wishlist_ids, update_wishlist
+from .stock import InsufficientStock, reservation_ttl, reserve_stock
+from .payments import (
+	SIGNATURE_HEADER, InvalidPaymentDetails, InvalidTransition, apply_gateway_result,
+	create_payment, dispatch_payment, payment_details, send_order_notification, verify_callback_signature,
+)
+import json
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+
+from django.core.cache import cache
+from django.middleware.csrf import get_token
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+
+# Session key holding the reference of the last payment started at checkout
+PAYMENT_REFERENCE_SESSION_KEY = 'shop_payment_reference'
+
+# Sorts after every real base price (base_price has 12 integer digits)
+PRICE_SORT_UNKNOWN = Decimal('1000000000000')
 
+# Stands in for the CSRF token in cached product pages
+CSRF_TOKEN_PLACEHOLDER = '__shop_csrf_token__'
 
 
-from django.http import HttpResponseRedirect
+
+from django.http import HttpResponseRedirect, Http404
 from .models import Order
 
 
@@ -20,8 +54,8 @@ def product_list(request):
 	# Get all active products
 	products = Product.objects.filter(is_active=True).select_related('category')
 	
-	# Get all categories (product_count is a property on the model)
-	categories = ProductCategory.objects.filter(is_active=True)
+	# Get all categories with active product counts (cached, one grouped query)
+	categories = get_category_catalog()
 	
 	# Category filtering
 	active_category = request.GET.get('category')
@@ -31,40 +65,47 @@ def product_list(request):
 	# Search functionality
 	search_query = request.GET.get('q', '').strip()
 	if search_query:
-		products = products.filter(
-			Q(name__icontains=search_query) | 
-			Q(description__icontains=search_query)
-		)
-	
-	# Sorting
-	sort_by = request.GET.get('sort', '-created_at')
-	valid_sort_options = ['name', '-name', 'price', '-price', '-created_at', 'created_at']
-	if sort_by in valid_sort_options:
-		products = products.order_by(sort_by)
-	else:
-		products = products.order_by('-created_at')
-	
-	# Get total count before pagination
-	total_products = products.count()
-	
-	# Pagination
-	page = request.GET.get('page', 1)
-	paginator = Paginator(products, 9)  # 9 products per page (3x3 grid)
-	
-	try:
-		products_page = paginator.page(page)
-	except PageNotAnInteger:
-		products_page = paginator.page(1)
-	except EmptyPage:
-		products_page = paginator.page(paginator.num_pages)
-	
-	# Get cart count for header
-	cart_count = 0
-	session_key = request.session.session_key
-	if session_key:
-		cart = Cart.objects.filter(session_key=session_key).first()
-		if cart:
-			cart_count = sum(item.quantity for item in cart.items.all())
+		products = search_products(products, search_query)
+	
+	# Price range, compared in the base currency
+	price_filter = ProductFilterForm(request.GET)
+	if price_filter.is_valid():
+		if price_filter.cleaned_data['min_price'] is not None:
+			products = products.filter(base_price__gte=price_filter.cleaned_data['min_price'])
+		if price_filter.cleaned_data['max_price'] is not None:
+			products = products.filter(base_price__lte=price_filter.cleaned_data['max_price'])
+	
+	# Sorting (search results default to relevance order); each option maps to a keyset
+	sort_by = request.GET.get('sort', 'relevance' if search_query else '-created_at')
+	sort_keys = {
+		'name': ['name'],
+		'-name': ['-name'],
+		'price': ['price_sort'],
+		'-price': ['-price_sort'],
+		'-created_at': ['-created_at'],
+		'created_at': ['created_at'],
+		'-rating_average': ['-rating_sort', '-rating_count'],
+	}
+	if search_query:
+		sort_keys['relevance'] = ['search_rank']
+	if sort_by not in sort_keys:
+		sort_by = '-created_at'
+	if sort_by in ('price', '-price'):
+		# Products whose currency has no exchange rate sort last either way
+		unpriced = PRICE_SORT_UNKNOWN if sort_by == 'price' else Decimal('-1')
+		products = products.annotate(price_sort=Coalesce('base_price', Value(unpriced)))
+	if sort_by == '-rating_average':
+		# Unrated products sort last
+		products = products.annotate(rating_sort=Coalesce('rating_average', Value(Decimal('0'))))
+	
+	# Keyset pagination: no COUNT and no OFFSET, so deep pages cost the same as page one
+	paginator = KeysetPaginator(products, 9, sort_keys[sort_by])  # 9 products per page (3x3 grid)
+	products_page = paginator.page(request.GET.get('cursor'))
+	
+	# Query string for pagination links, without the cursor
+	pagination_params = request.GET.copy()
+	pagination_params.pop('cursor', None)
+	pagination_params.pop('page', None)
 	
 	# Get featured categories (top 3 with products)
 	featured_categories = [cat for cat in categories if cat.product_count > 0][:3]
@@ -78,9 +119,9 @@ def product_list(request):
 		'active_category': active_category,
 		'sort_by': sort_by,
 		'search_query': search_query,
-		'total_products': total_products,
-		'cart_count': cart_count,
+		'pagination_query': pagination_params.urlencode(),
 		'featured_categories': featured_categories,
+		'wishlist_ids': get_wishlist_ids(request),
 	}
 	
 	return render(request, "shop/product_list.html", context)
@@ -93,29 +134,32 @@ from django.shortcuts import redirect
 def add_to_cart(request):
 	product_id = request.POST.get("product_id")
 	quantity = int(request.POST.get("quantity", 1))
-	product = Product.objects.get(id=product_id)
-	session_key = request.session.session_key or request.session.save() or request.session.session_key
-	cart, created = Cart.objects.get_or_create(session_key=session_key)
-	item, created = CartItem.objects.get_or_create(cart=cart, product=product)
-	item.quantity += quantity
-	item.save()
+	try:
+		cart_id = add_to_session_cart(request, int(product_id), quantity)
+	except (TypeError, ValueError, Product.DoesNotExist):
+		raise Http404("Product not found")
+	refresh_cart_summary(request, cart_id)
 	return redirect("shop:view_cart")
 
 # View cart
 def view_cart(request):
-	session_key = request.session.session_key
-	cart = Cart.objects.filter(session_key=session_key).first()
-	items = cart.items.all() if cart else []
-	if request.method == "POST":
-		for item in items:
-			qty_field = f"quantity_{item.id}"
-			new_qty = request.POST.get(qty_field)
-			if new_qty:
-				item.quantity = int(new_qty)
-				item.save()
-		# Refresh items after update
-		items = cart.items.all() if cart else []
-	total = sum(item.product.price * item.quantity for item in items)
+	cart = get_cart(request)
+	if request.method == "POST" and cart:
+		# Collect every quantity_<item id> field and apply them in one batch
+		quantities = {}
+		for field, value in request.POST.items():
+			if field.startswith("quantity_") and value:
+				try:
+					quantities[int(field[len("quantity_"):])] = int(value)
+				except ValueError:
+					continue
+		update_quantities(cart.pk, quantities)
+		refresh_cart_summary(request, cart)
+	items = cart.items.select_related('product') if cart else []
+	try:
+		total = cart_total(items)
+	except MissingExchangeRate:
+		total = None
 	return render(request, "shop/cart.html", {"cart": cart, "items": items, "total": total})
 
 # Checkout view
@@ -177,164 +221,70 @@ class PaymentForm(forms.Form):
 				
 		return cleaned_data
 
-def process_payment(order, payment_data):
-	"""
-	Process payment based on the selected payment method
-	Returns True if payment is successful, False otherwise
-	"""
-	payment_method = payment_data['payment_method']
-	
-	try:
-		if payment_method == 'card':
-			# Process card payment
-			return process_card_payment(order, payment_data)
-		elif payment_method == 'mobile':
-			
-			return process_mobile_payment(order, payment_data)
-		elif payment_method == 'bank':
-			
-			return True
-	except Exception as e:
-		
-		print(f"Payment processing error: {e}")
-		return False
-	
-	return False
-
-def process_card_payment(order, payment_data):
-	"""
-	Process credit/debit card payment
-	In production, integrate with actual payment gateway like Stripe, PayPal, etc.
-	"""
-	# Mock card payment processing
-	card_number = payment_data.get('card_number', '').replace(' ', '')
-	card_name = payment_data.get('card_name')
-	card_expiry = payment_data.get('card_expiry')
-	card_cvv = payment_data.get('card_cvv')
-	
-	# Basic validation (in production, use proper payment gateway validation)
-	if len(card_number) < 13 or len(card_number) > 19:
-		return False
-	
-	if len(card_cvv) < 3 or len(card_cvv) > 4:
-		return False
-	
-	# Simulate payment gateway response
-	# In production, call actual payment gateway API
-	try:
-		from .models import MockIremboPayGateway
-		gateway = MockIremboPayGateway.objects.first()
-		if gateway:
-			return gateway.process_payment(order)
-	except:
-		pass
-	
-	# Mock successful payment for demonstration
-	return True
-
-def process_mobile_payment(order, payment_data):
-	"""
-	Process mobile money payment (MTN, Airtel)
-	In production, integrate with mobile money APIs
-	"""
-	provider = payment_data.get('mobile_provider')
-	phone_number = payment_data.get('mobile_number')
-	
-	if not provider or not phone_number:
-		return False
-	
-	# Clean phone number
-	phone_number = phone_number.replace(' ', '').replace('-', '')
-	
-	# Basic phone number validation for Rwanda
-	if not phone_number.startswith('+250') and not phone_number.startswith('250'):
-		if phone_number.startswith('07') or phone_number.startswith('78') or phone_number.startswith('79'):
-			phone_number = '+250' + phone_number[1:]
-		else:
-			return False
-	
-	# Mock mobile money processing
-	if provider == 'mtn':
-		# In production, integrate with MTN Mobile Money API
-		return mock_mtn_payment(order, phone_number)
-	elif provider == 'airtel':
-		# In production, integrate with Airtel Money API
-		return mock_airtel_payment(order, phone_number)
-	
-	return False
-
-def mock_mtn_payment(order, phone_number):
-	"""Mock MTN Mobile Money payment processing"""
-	# Simulate API call to MTN
-	# In production, use actual MTN Mobile Money API
-	return True
-
-def mock_airtel_payment(order, phone_number):
-	"""Mock Airtel Money payment processing"""
-	# Simulate API call to Airtel
-	# In production, use actual Airtel Money API
-	return True
-
 def checkout(request):
-	session_key = request.session.session_key
-	cart = Cart.objects.filter(session_key=session_key).first()
-	items = cart.items.all() if cart else []
-	total = sum(item.product.price * item.quantity for item in items)
+	cart = get_cart(request)
+	items = list(cart.items.select_related('product')) if cart else []
+	try:
+		total = cart_total(items)
+	except MissingExchangeRate as e:
+		total = None
+		rate_error = f"Products priced in {e.currency} cannot be ordered right now. Please remove them or try again later."
 	if request.method == "POST":
 		form = CheckoutForm(request.POST)
 		payment_form = PaymentForm(request.POST)
 		
+		if total is None:
+			return render(request, "shop/checkout.html", {
+				"form": form,
+				"payment_form": payment_form,
+				"items": items,
+				"total": total,
+				"payment_error": rate_error,
+			})
 		if form.is_valid() and payment_form.is_valid() and cart:
-			order = form.save(commit=False)
-			order.cart = cart
-			order.total_amount = total
-			order.status = "pending"
-			order.save()
-			
-			# Process payment based on selected method
 			payment_method = payment_form.cleaned_data['payment_method']
-			payment_success = process_payment(order, payment_form.cleaned_data)
+			try:
+				details = payment_details(payment_form.cleaned_data)
+			except InvalidPaymentDetails:
+				return render(request, "shop/checkout.html", {
+					"form": form,
+					"payment_form": payment_form,
+					"items": items,
+					"total": total,
+					"payment_error": "Payment processing failed. Please try again.",
+				})
 			
-			if payment_success:
-				order.status = "confirmed" if payment_method != 'bank' else "pending_bank_transfer"
-				order.save()
-			# Send email notification to admin
-			# Build detailed order info for email
-			order_details = [
-				f"Order #{order.id}",
-				f"Name: {order.full_name}",
-				f"Email: {order.email}",
-				f"Phone: {order.phone}",
-				f"Country: {order.country}",
-				f"City: {order.city}",
-				f"ZIP: {order.zip_code}",
-				f"Delivery Method: {order.delivery_method}",
-				"\nCart Items:",
-			]
-			for item in items:
-				order_details.append(f"- {item.product.name} ({item.quantity} x {item.product.price} {item.product.currency}) = {item.product.price * item.quantity} {item.product.currency}")
-			order_details.append(f"\nTotal: {order.total_amount} RWF")
-			order_details.append(f"Payment Method: {payment_method.upper()}")
+			# Create the order, snapshot its lines, reserve stock and open the payment together
+			try:
+				with transaction.atomic():
+					order = form.save(commit=False)
+					order.cart = cart
+					order.total_amount = total
+					order.status = "pending" if payment_method != 'bank' else "pending_bank_transfer"
+					order.save()
+					OrderItem.objects.bulk_create(
+						[OrderItem.from_cart_item(order, item) for item in items]
+					)
+					reserve_stock(order, [(item.product, item.quantity) for item in items], reservation_ttl(payment_method))
+					payment = create_payment(order, payment_method, details)
+					# The gateway is contacted after commit, off the request thread
+					dispatch_payment(payment)
+			except InsufficientStock as e:
+				return render(request, "shop/checkout.html", {
+					"form": form,
+					"payment_form": payment_form,
+					"items": items,
+					"total": total,
+					"payment_error": f"Sorry, {e.product.name} does not have enough stock left for this order.",
+				})
 			
-			# Add payment details based on method
-			if payment_method == 'card':
-				card_last4 = payment_form.cleaned_data.get('card_number', '')[-4:] if payment_form.cleaned_data.get('card_number') else 'N/A'
-				order_details.append(f"Card ending in: ****{card_last4}")
-			elif payment_method == 'mobile':
-				provider = payment_form.cleaned_data.get('mobile_provider', 'N/A')
-				phone = payment_form.cleaned_data.get('mobile_number', 'N/A')
-				order_details.append(f"Mobile Provider: {provider}")
-				order_details.append(f"Phone Number: {phone}")
-			
-			send_mail(
-				subject="New Shop Order Received",
-				message="\n".join(order_details),
-				from_email=settings.DEFAULT_FROM_EMAIL,
-				recipient_list=[settings.CONTACT_NOTIFICATION_EMAIL],
-				fail_silently=True,
-			)
+			if payment_method == 'bank':
+				# Bank transfers are fulfilled once the transfer arrives; tell the team now
+				send_order_notification(order, payment)
 			# Clear cart
 			cart.delete()
+			clear_cart_summary(request)
+			request.session[PAYMENT_REFERENCE_SESSION_KEY] = payment.reference
 			return redirect("shop:order_success")
 		else:
 			# Payment failed
@@ -358,44 +308,75 @@ def checkout(request):
 
 # Order success view
 def order_success(request):
-	return render(request, "shop/order_success.html")
+	reference = request.session.get(PAYMENT_REFERENCE_SESSION_KEY)
+	payment = Payment.objects.filter(reference=reference).first() if reference else None
+	return render(request, "shop/order_success.html", {"payment": payment})
+
+@csrf_exempt
+@require_POST
+def payment_callback(request, reference):
+	"""
+	Gateway callback reporting a payment outcome.
+	Expects a JSON body {"status": "succeeded"|"failed", "transaction_id": "..."}
+	signed together with the reference in the X-Payment-Signature header.
+	Safe to deliver more than once.
+	"""
+	if not verify_callback_signature(reference, request.body, request.META.get(SIGNATURE_HEADER, '')):
+		return JsonResponse({"error": "invalid signature"}, status=403)
+	try:
+		payload = json.loads(request.body)
+		status = payload["status"]
+	except (ValueError, TypeError, KeyError):
+		return JsonResponse({"error": "invalid payload"}, status=400)
+	if status not in ("succeeded", "failed"):
+		return JsonResponse({"error": "invalid status"}, status=400)
+	
+	try:
+		payment, changed = apply_gateway_result(reference, status, str(payload.get("transaction_id") or ""))
+	except Payment.DoesNotExist:
+		return JsonResponse({"error": "unknown payment"}, status=404)
+	except InvalidTransition as e:
+		return JsonResponse({"error": str(e), "status": e.payment.status}, status=409)
+	return JsonResponse({"reference": payment.reference, "status": payment.status, "changed": changed})
 
 
 # Product detail view
-def product_detail(request, slug):
+def render_product_body(product, request=None):
 	"""
-	Product detail page with reviews
+	Render the product page body. Without a request it is rendered for
+	anonymous visitors with a CSRF placeholder, ready to be cached.
 	"""
-	from django.shortcuts import get_object_or_404
-	from .models import ProductReview
-	
-	product = get_object_or_404(Product, slug=slug, is_active=True)
-	
-	# Get approved reviews
-	reviews = product.reviews.filter(is_approved=True).order_by('-created_at')
-	
-	# Get related products (same category)
-	related_products = Product.objects.filter(
-		category=product.category,
-		is_active=True
-	).exclude(id=product.id)[:4]
-	
-	# Get cart count
-	cart_count = 0
-	session_key = request.session.session_key
-	if session_key:
-		cart = Cart.objects.filter(session_key=session_key).first()
-		if cart:
-			cart_count = sum(item.quantity for item in cart.items.all())
-	
 	context = {
 		'product': product,
-		'reviews': reviews,
-		'related_products': related_products,
-		'cart_count': cart_count,
+		'reviews': product.reviews.filter(is_approved=True).order_by('-created_at'),
+		'related_products': get_related_products(product),
 	}
-	
-	return render(request, "shop/product_detail.html", context)
+	if request is None:
+		context['csrf_token'] = CSRF_TOKEN_PLACEHOLDER
+	else:
+		context['wishlist_ids'] = get_wishlist_ids(request)
+	return render_to_string("shop/partials/product_detail_body.html", context, request=request)
+
+def product_detail(request, slug):
+	"""
+	Product detail page with reviews.
+	Anonymous visitors get the body from the render cache, which product,
+	category, review and stock changes invalidate; the cart badge and CSRF
+	token are filled in per request.
+	"""
+	if request.user.is_authenticated:
+		product = get_object_or_404(Product.objects.select_related('category'), slug=slug, is_active=True)
+		body = render_product_body(product, request)
+	else:
+		cache_key = product_page_cache_key(slug)
+		body = cache.get(cache_key)
+		if body is None:
+			product = get_object_or_404(Product.objects.select_related('category'), slug=slug, is_active=True)
+			body = render_product_body(product)
+			cache.set(cache_key, body, getattr(settings, 'SHOP_PRODUCT_PAGE_CACHE_TIMEOUT', 60 * 10))
+		body = body.replace(CSRF_TOKEN_PLACEHOLDER, get_token(request))
+	
+	return render(request, "shop/product_detail.html", {"product_body": mark_safe(body)})
 
 
 # Wishlist views
@@ -472,6 +453,35 @@ def remove_from_wishlist(request, product_id):
 		}, status=500)
 
 
+@login_required
+@require_POST
+def toggle_wishlist(request):
+	"""
+	Add and remove several products at once.
+	Expects a JSON body {"add": [product ids], "remove": [product ids]}.
+	"""
+	try:
+		payload = json.loads(request.body or '{}')
+		add = [int(product_id) for product_id in payload.get('add', [])]
+		remove = [int(product_id) for product_id in payload.get('remove', [])]
+	except (ValueError, TypeError, AttributeError):
+		return JsonResponse({
+			'success': False,
+			'message': 'Invalid request'
+		}, status=400)
+	
+	added, removed = update_wishlist(request.user, add, remove)
+	in_wishlist = Wishlist.objects.filter(
+		user=request.user, product_id__in=add + remove
+	).values_list('product_id', flat=True)
+	return JsonResponse({
+		'success': True,
+		'added': added,
+		'removed': removed,
+		'in_wishlist': sorted(in_wishlist),
+	})
+
+
 @login_required
 def view_wishlist(request):
 	"""
@@ -479,18 +489,49 @@ def view_wishlist(request):
 	"""
 	wishlist_items = Wishlist.objects.filter(user=request.user).select_related('product')
 	
-	# Get cart count for navbar
-	cart_count = 0
-	session_key = request.session.session_key
-	if session_key:
-		cart = Cart.objects.filter(session_key=session_key).first()
-		if cart:
-			cart_count = sum(item.quantity for item in cart.items.all())
-	
 	context = {
 		'wishlist_items': wishlist_items,
-		'cart_count': cart_count,
 	}
 	
 	return render(request, 'shop/wishlist.html', context)
 
+
+
+# Sales analytics
+from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.dateparse import parse_date
+from .currency import CENT
+from .sales import ROLLUPS, sales_series
+
+
+@staff_member_required
+def sales_analytics(request):
+	"""
+	Sales series for staff charts, read from the daily rollup tables.
+	Query parameters: by=product|category, period=day|month,
+	start/end=YYYY-MM-DD and id (repeatable) to pick products or categories.
+	"""
+	by = request.GET.get('by', 'product')
+	period = request.GET.get('period', 'day')
+	if by not in ROLLUPS or period not in ('day', 'month'):
+		return JsonResponse({'error': 'invalid by or period'}, status=400)
+	try:
+		start, end = (parse_date(request.GET[name]) if request.GET.get(name) else None for name in ('start', 'end'))
+		ids = [int(value) for value in request.GET.getlist('id')]
+	except ValueError:
+		return JsonResponse({'error': 'invalid date or id'}, status=400)
+	
+	date_format = '%Y-%m' if period == 'month' else '%Y-%m-%d'
+	series = [
+		{
+			'period': row['period'].strftime(date_format),
+			'id': row['key'],
+			'name': row['name'],
+			'currency': row['currency'],
+			'units': row['units'],
+			'revenue': row['revenue'].quantize(CENT),
+			'orders': row['orders'],
+		}
+		for row in sales_series(by, period, start, end, ids)
+	]
+	return JsonResponse({'by': by, 'period': period, 'series': series})
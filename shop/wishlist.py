@@ -0,0 +1,36 @@
+from .models import Product, Wishlist
+
+
+def get_wishlist_ids(request):
+	"""
+	Return the set of product ids in the user's wishlist.
+	Loaded with one query on first use and kept on the request, so product
+	grids can test membership for every card without further queries.
+	"""
+	if not request.user.is_authenticated:
+		return frozenset()
+	if not hasattr(request, '_wishlist_ids'):
+		request._wishlist_ids = set(
+			Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True)
+		)
+	return request._wishlist_ids
+
+
+def update_wishlist(user, add=(), remove=()):
+	"""
+	Add and remove several products in one go: one INSERT for the additions
+	(existing entries are skipped) and one DELETE for the removals.
+	Only active products are added. Returns the number of products added and removed.
+	"""
+	add = set(add) - set(remove)
+	added = 0
+	if add:
+		product_ids = Product.objects.filter(pk__in=add, is_active=True).values_list('pk', flat=True)
+		existing = set(Wishlist.objects.filter(user=user, product_id__in=add).values_list('product_id', flat=True))
+		new_items = [Wishlist(user=user, product_id=product_id) for product_id in product_ids if product_id not in existing]
+		Wishlist.objects.bulk_create(new_items, ignore_conflicts=True)
+		added = len(new_items)
+	removed = 0
+	if remove:
+		removed, _ = Wishlist.objects.filter(user=user, product_id__in=set(remove)).delete()
+	return added, removed